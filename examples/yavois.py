@@ -1,5 +1,6 @@
 from trader.AlgoManager import *
 from trader.Algorithm import *
+from trader.Sweep import *
 import datetime
 import logging
 
@@ -82,6 +83,13 @@ def backtest():
 	Manager.algogui(algoback)
 
 
+def tune():
+	grid = {'rsi2thres': [0.3, 0.5, 0.7], 'takegain': [0.03, 0.05, 0.1], 'takeloss': [-0.01, -0.02, -0.05]}
+	results = sweep(Yavois, grid, start=(2019,1,1), end=(2020,1,1), capital=1000, benchmark="SPY",
+					schedule=["30 9 * * MON-FRI", "59 15 * * MON-FRI"], universe=["SVXY"])
+	print(results.sort_values('sharpe', ascending=False))
+
+
 def run():
 	manager = Manager()
 	algo = Yavois(schedule = ["30 9 * * MON-FRI", "59 15 * * MON-FRI"])
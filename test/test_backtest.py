@@ -0,0 +1,147 @@
+import unittest
+import io
+import contextlib
+import tempfile
+import shutil
+import datetime
+import numpy as np
+import pandas as pd
+from unittest.mock import patch
+from trader.Algorithm import *
+from trader.BarStore import BarStore
+from trader.Broker import SimBroker, AlpacaBroker, setbroker
+from trader.Calendar import CALENDAR
+
+
+# Buys in the morning with a stop loss and a stop gain, and sells in the afternoon
+class Swing(Algorithm):
+	def run(self):
+		if self.algodatetime().time() == datetime.time(10,0):
+			self.orderfraction("SPY", 1)
+			self.stopsell("SPY", 0.01)
+			self.stopsell("SPY", -0.01)
+		else:
+			self.orderfraction("SPY", 0)
+
+
+# Holds SPY with stops from the morning on, and QQQ from Monday to Friday
+class Rotate(Algorithm):
+	def run(self):
+		if self.algodatetime().time() == datetime.time(9,30):
+			if self.stocks.get("SPY", 0) == 0:
+				self.orderfraction("SPY", 0.5)
+				self.stopsell("SPY", 0.004)
+				self.stopsell("SPY", -0.01)
+			if self.algodatetime().weekday() == 0:
+				self.orderfraction("QQQ", 0.3)
+		elif self.algodatetime().weekday() == 4:
+			self.orderfraction("QQQ", 0)
+
+
+class BacktestTest(unittest.TestCase):
+
+	def setUp(self):
+		self.path = tempfile.mkdtemp()
+		self.store = BarStore(self.path, fetch=self.fetch)
+		self.patch = patch('trader.Algorithm.BARSTORE', self.store)
+		self.patch.start()
+		self.calendarpath = CALENDAR.path
+		CALENDAR.path = self.path
+		setbroker(SimBroker(store=self.store))
+
+	def tearDown(self):
+		self.patch.stop()
+		setbroker(AlpacaBroker())
+		CALENDAR.path = self.calendarpath
+		shutil.rmtree(self.path)
+
+	# Weekday bars of a price that swings by a few percent through the day
+	def fetch(self, stock, start, end, interval):
+		days = pd.date_range(start, end, freq='B')
+		if interval == 'day':
+			index = days.tz_localize('America/New_York')
+		else:
+			index = pd.DatetimeIndex([day + pd.Timedelta(minutes=m) for day in days for m in range(570, 961)]).tz_localize('America/New_York')
+		minutes = index.tz_localize(None).values.astype('datetime64[m]').astype(np.int64)
+		price = 100 + 3 * np.sin(minutes / 40.0) + (minutes % 7) / 10.0
+		return pd.DataFrame({'open': price, 'high': price + 0.5, 'low': price - 0.5, 'close': price, 'volume': 100.0}, index=index)
+
+	def backtest(self, engine):
+		algo = backtester(Swing(schedule=["0 10 * * *", "0 15 * * *"]), capital=1000)
+		with contextlib.redirect_stdout(io.StringIO()) as output:
+			algo.backtest(start=(2019,7,1), end=(2019,7,12), logging='minute', engine=engine)
+		return algo, output.getvalue()
+
+	def test_event_engine_same_as_loop(self):
+		loop, loopoutput = self.backtest('loop')
+		event, eventoutput = self.backtest('event')
+		assert "kicking in" in loopoutput
+		assert eventoutput == loopoutput
+		assert len(loop.chartminute) == 10 * 391
+		assert event.chartminute == loop.chartminute
+		assert event.chartminutetimes == loop.chartminutetimes
+		assert event.chartday == loop.chartday
+		assert (event.cash, event.value, event.stocks, event.prices) == (loop.cash, loop.value, loop.stocks, loop.prices)
+
+	def test_vector_engine_same_as_loop(self):
+		results = []
+		for engine in ['loop', 'vector']:
+			algo = backtester(Rotate(schedule=["30 9 * * MON-FRI", "59 15 * * MON-FRI"]), capital=1000)
+			with contextlib.redirect_stdout(io.StringIO()) as output:
+				algo.backtest(start=(2019,7,1), end=(2019,7,26), logging='day', engine=engine, universe=["SPY"])
+			results.append((algo, output.getvalue()))
+		(loop, loopoutput), (vector, vectoroutput) = results
+		assert "kicking in" in loopoutput
+		assert vectoroutput == loopoutput
+		assert len(loop.chartday) == 20
+		assert vector.chartday == loop.chartday
+		assert vector.chartdaytimes == loop.chartdaytimes
+		assert (vector.cash, vector.stocks) == (loop.cash, loop.stocks)
+
+	def test_fire_time_table(self):
+		algo = backtester(Swing(schedule=["0 10 * * MON-FRI", "*/30 12-13 * * *"]), capital=1000)
+		for day in [datetime.datetime(2019,7,5), datetime.datetime(2019,7,6)]:
+			algo.schedulefiretimes(day)
+			assert len(algo.firetimes) == (1 if day.weekday() < 5 else 0) + 4
+			for minute in range(0, 24 * 60, 7):
+				time = day + datetime.timedelta(minutes=minute)
+				assert algo.nextruntime(time) == Algorithm.nextruntime(algo, time)
+		# After the end of the table
+		assert algo.nextruntime(datetime.datetime(2019,7,6,23,59)) == datetime.datetime(2019,7,7,12,0)
+		# A backtest only expands the schedule on the days it reaches
+		algo = backtester(Swing(schedule="* * * * *"), capital=1000)
+		with patch.object(Backtester, 'schedulefiretimes', autospec=True, side_effect=Backtester.schedulefiretimes) as expand:
+			with contextlib.redirect_stdout(io.StringIO()):
+				algo.backtest(start=(2019,7,1), end=(2019,7,3), logging='minute')
+		assert [call.args[1] for call in expand.call_args_list] == [datetime.datetime(2019,7,d) for d in range(1,4)]
+		assert len(algo.firetimes) == 24 * 60
+
+	def test_history_cursor(self):
+		algo = backtester(Swing(schedule=["0 10 * * *"]), capital=1000)
+		algo.datetime = datetime.datetime(2019,7,10,12,0)
+		close = algo.history("SPY", length=5, interval='minute')
+		with patch('trader.Algorithm.nearestidx', side_effect=nearestidx) as search:
+			high = algo.history("SPY", length=3, datatype='high', interval='minute')
+			bars = algo.history("SPY", length=2, datatype=None, interval='minute')
+			assert search.call_count == 0 # The bar at this time was already found
+			algo.datetime = datetime.datetime(2019,7,10,12,5)
+			later = algo.history("SPY", length=10, interval='minute')
+			assert search.call_count == 1
+		assert close.index[-1] == bars.index[-1] == pd.Timestamp('2019-07-10 12:00', tz='America/New_York')
+		assert (high.to_numpy() == close.to_numpy()[-3:] + 0.5).all()
+		assert later.index[-1] == close.index[-1] + pd.Timedelta(minutes=5)
+		assert np.shares_memory(close.to_numpy(), later.to_numpy()) # Slices of the same cached column
+
+	def test_history_array(self):
+		algo = backtester(Swing(schedule=["0 10 * * *"]), capital=1000)
+		algo.datetime = datetime.datetime(2019,7,10,12,0)
+		for interval in ['day', 'minute']:
+			for datatype in ['close', 'high']:
+				values = algo.historyarray("SPY", length=4, datatype=datatype, interval=interval)
+				assert values.dtype == np.float64
+				assert (values == algo.history("SPY", length=4, datatype=datatype, interval=interval).to_numpy()).all()
+				assert algo.bar("SPY", datatype, interval=interval) == values[-1]
+		assert isinstance(algo.quote("SPY"), float)
+		assert algo.quote("SPY") == algo.bar("SPY", interval='day')
+		algo.logging = 'minute'
+		assert algo.quote("SPY") == algo.bar("SPY", interval='minute')
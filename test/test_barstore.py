@@ -0,0 +1,54 @@
+import unittest
+import tempfile
+import shutil
+import datetime
+import numpy as np
+import pandas as pd
+from trader.BarStore import BarStore
+
+
+class BarStoreTest(unittest.TestCase):
+
+	def setUp(self):
+		self.path = tempfile.mkdtemp()
+		self.fetches = []
+		self.store = BarStore(self.path, fetch=self.fetch)
+
+	def tearDown(self):
+		shutil.rmtree(self.path)
+
+	# Weekday bars where the close is the day of the month
+	def fetch(self, stock, start, end, interval):
+		self.fetches.append((stock, start, end, interval))
+		index = pd.date_range(start, end, freq='B', tz='America/New_York')
+		close = np.array([date.day for date in index], dtype=np.float64)
+		return pd.DataFrame({'open': close, 'high': close+1, 'low': close-1, 'close': close, 'volume': 100.0}, index=index)
+
+	def test_history(self):
+		hist = self.store.history("SPY", datetime.date(2019,1,1), datetime.date(2019,1,31))
+		assert len(hist) == 23
+		assert hist.index[0].date() == datetime.date(2019,1,1)
+		assert hist.index[-1].date() == datetime.date(2019,1,31)
+		assert (hist['close'].values == [date.day for date in hist.index]).all()
+
+	def test_fetches_only_missing_ranges(self):
+		self.store.history("SPY", datetime.date(2019,1,1), datetime.date(2019,1,31))
+		self.store.history("SPY", datetime.date(2019,1,15), datetime.date(2019,2,28))
+		assert self.fetches[1][1:3] == (datetime.date(2019,2,1), datetime.date(2019,2,28))
+		hist = self.store.history("SPY", datetime.date(2019,1,10), datetime.date(2019,2,10))
+		assert len(self.fetches) == 2
+		assert hist.index[0].date() == datetime.date(2019,1,10)
+		assert hist.index[-1].date() == datetime.date(2019,2,8)
+
+	def test_persists_between_stores(self):
+		self.store.history("SPY", datetime.date(2019,1,1), datetime.date(2019,3,1))
+		store = BarStore(self.path, fetch=self.fetch)
+		hist = store.history("SPY", datetime.date(2019,2,1), datetime.date(2019,2,28))
+		assert len(self.fetches) == 1
+		assert len(hist) == 20
+
+	def test_symbols_and_intervals_are_separate(self):
+		self.store.history("SPY", datetime.date(2019,1,1), datetime.date(2019,1,31))
+		self.store.history("AAPL", datetime.date(2019,1,1), datetime.date(2019,1,31))
+		self.store.history("SPY", datetime.date(2019,1,1), datetime.date(2019,1,31), interval='minute')
+		assert len(self.fetches) == 3
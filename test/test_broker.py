@@ -0,0 +1,83 @@
+import unittest
+import tempfile
+import shutil
+import datetime
+import numpy as np
+import pandas as pd
+from unittest.mock import patch
+from trader.BarStore import BarStore
+from trader.Broker import Broker, SimBroker
+from trader.Orders import FillTracker
+from trader.Clock import SimClock, Clock, setclock, getclock
+
+
+class SimBrokerTest(unittest.TestCase):
+
+	def setUp(self):
+		self.path = tempfile.mkdtemp()
+		self.now = datetime.datetime(2019,7,2,10,0)
+		self.patch = patch('trader.Broker.getnow', lambda: self.now)
+		self.patch.start()
+		self.broker = SimBroker(cash=1000.0, store=BarStore(self.path, fetch=self.fetch))
+		self.tracker = FillTracker()
+		self.broker.tradestream(self.tracker).start()
+
+	def tearDown(self):
+		self.patch.stop()
+		shutil.rmtree(self.path)
+
+	# Minute bars from 9:30 to 16:00 where the close is the minute of the day
+	def fetch(self, stock, start, end, interval):
+		days = pd.date_range(start, end, freq='B')
+		index = pd.DatetimeIndex([day + pd.Timedelta(minutes=m) for day in days for m in range(570, 960)]).tz_localize('America/New_York')
+		close = np.array([t.hour * 60 + t.minute for t in index], dtype=np.float64)
+		return pd.DataFrame({'open': close, 'high': close, 'low': close, 'close': close, 'volume': 100.0}, index=index)
+
+	def test_price_of_last_finished_bar(self):
+		assert self.broker.lastprice("SPY") == 599.0
+		self.now = datetime.datetime(2019,7,2,10,0,30)
+		assert self.broker.lastprice("SPY") == 599.0
+		assert len(self.broker.bars("SPY", datetime.date(2019,7,2), datetime.date(2019,7,2), 'minute')) == 30
+
+	def test_fills_with_slippage(self):
+		self.broker.slippage = 0.01
+		order = self.broker.submit("SPY", 1, 'buy')
+		fill = self.tracker.wait(order.id, timeout=1)
+		assert fill.status == 'filled'
+		assert fill.filledqty == 1
+		assert abs(fill.filledprice - 599.0 * 1.01) < 1e-9
+		assert self.broker.positions() == {"SPY": 1}
+		assert abs(self.broker.cash - (1000.0 - 599.0 * 1.01)) < 1e-9
+		assert self.broker.submit("SPY", 2, 'sell').status == 'rejected'
+		assert self.broker.submit("SPY", 2, 'buy').status == 'rejected'
+
+	def test_latency(self):
+		self.broker.latency = 0.05
+		order = self.broker.submit("SPY", 1, 'buy')
+		assert self.tracker.wait(order.id, timeout=0.01) is None
+		assert self.tracker.wait(order.id, timeout=1).status == 'filled'
+
+	def test_latency_in_simulated_time(self):
+		setclock(SimClock(self.now, fastforward=True))
+		self.addCleanup(setclock, Clock())
+		with patch('trader.Broker.getnow', lambda: getclock().now()):
+			self.broker.latency = 90
+			order = self.broker.submit("SPY", 1, 'buy')
+			assert self.tracker.wait(order.id, timeout=60) is None
+			assert getclock().now() == datetime.datetime(2019,7,2,10,1)
+			fill = self.tracker.wait(order.id, timeout=60)
+			# Filled at the price when the latency had passed
+			assert getclock().now() == datetime.datetime(2019,7,2,10,1,30)
+			assert fill.status == 'filled' and fill.filledprice == 600.0
+
+	def test_limit_orders_expire(self):
+		assert self.broker.submit("SPY", 1, 'buy', ordertype='limit', limit=598.0).status == 'expired'
+		assert self.broker.submit("SPY", 1, 'buy', ordertype='limit', limit=600.0).status == 'filled'
+
+	def test_broker_is_abstract(self):
+		# A broker that doesn't implement every method can't be made
+		class PriceBroker(Broker):
+			def lastprice(self, stock):
+				return 1.0
+		with self.assertRaises(TypeError):
+			PriceBroker()
@@ -0,0 +1,44 @@
+import unittest
+import tempfile
+import shutil
+import datetime
+from trader.Calendar import TradingCalendar
+
+
+class TradingCalendarTest(unittest.TestCase):
+
+	def setUp(self):
+		self.path = tempfile.mkdtemp()
+		self.fetches = []
+		self.calendar = TradingCalendar(self.path, fetch=self.fetch)
+
+	def tearDown(self):
+		shutil.rmtree(self.path)
+
+	# Weekdays, except for July 4th
+	def fetch(self, start, end):
+		self.fetches.append((start, end))
+		days = [start + datetime.timedelta(days=i) for i in range((end-start).days+1)]
+		return [day for day in days if day.weekday() < 5 and (day.month, day.day) != (7, 4)]
+
+	def test_between(self):
+		days = self.calendar.between(datetime.date(2019,7,1), datetime.date(2019,7,8))
+		assert days == [datetime.datetime(2019,7,d) for d in [1,2,3,5,8]]
+
+	def test_before_and_after(self):
+		assert self.calendar.before(1, datetime.date(2019,7,8)) == datetime.datetime(2019,7,5)
+		assert self.calendar.before(2, datetime.date(2019,7,7)) == datetime.datetime(2019,7,2)
+		assert self.calendar.after(datetime.date(2019,7,3), 1) == datetime.datetime(2019,7,5)
+		assert self.calendar.after(datetime.date(2019,7,6), 0) == datetime.datetime(2019,7,8)
+		assert self.calendar.before(1000, datetime.date(2019,7,8)) == datetime.datetime(2015,9,1)
+		assert self.calendar.istradingday(datetime.date(2019,7,5))
+		assert not self.calendar.istradingday(datetime.date(2019,7,4))
+
+	def test_downloads_once(self):
+		self.calendar.between(datetime.date(2019,7,1), datetime.date(2019,7,8))
+		self.calendar.before(20, datetime.date(2019,3,1))
+		calendar = TradingCalendar(self.path, fetch=self.fetch)
+		assert calendar.istradingday(datetime.date(2019,7,5))
+		assert len(self.fetches) == 1
+		calendar.before(20, datetime.date(1990,1,1))
+		assert len(self.fetches) == 2
@@ -0,0 +1,59 @@
+import unittest
+import os
+import pickle
+import tempfile
+import shutil
+import datetime
+import numpy as np
+from trader.Chart import *
+
+
+class ColumnTest(unittest.TestCase):
+
+	def setUp(self):
+		self.path = tempfile.mkdtemp()
+		self.times = [datetime.datetime(2019,7,1,9,30) + datetime.timedelta(minutes=i) for i in range(1000)]
+
+	def tearDown(self):
+		shutil.rmtree(self.path)
+
+	def test_list_interface(self):
+		column = Column()
+		for i in range(1000):
+			column.append(i / 2)
+		assert len(column) == 1000
+		assert column[0] == 0.0 and column[-1] == 499.5
+		assert column[-3:] == [498.5, 499.0, 499.5]
+		assert column == [i / 2 for i in range(1000)]
+		assert np.asarray(column).dtype == np.float64
+		with self.assertRaises(IndexError):
+			column[1000]
+		column.clear()
+		assert len(column) == 0 and list(column) == []
+
+	def test_times(self):
+		column = TimeColumn(self.times[:10])
+		column.extend(self.times[10:])
+		assert list(column) == self.times
+		assert column[5] == self.times[5]
+		assert column.index()[-1] == self.times[-1]
+		assert np.asarray(column).dtype == np.dtype('datetime64[ns]')
+
+	def test_view_is_not_a_copy(self):
+		column = Column(range(10))
+		view = np.asarray(column)
+		column.data[0] = 5
+		assert view[0] == 5
+
+	def test_file(self):
+		path = os.path.join(self.path, 'chart')
+		column = Column(path=path)
+		column.extend(range(100))
+		assert os.path.getsize(path) >= 100 * 8
+		assert column == list(range(100))
+
+	def test_pickle(self):
+		column = pickle.loads(pickle.dumps(TimeColumn(self.times)))
+		assert list(column) == self.times
+		column.append(self.times[0])
+		assert len(column) == len(self.times) + 1
@@ -0,0 +1,74 @@
+import unittest
+import numpy as np
+import pandas as pd
+from ta import trend, momentum, volatility
+from trader.Indicators import *
+
+
+class IndicatorTest(unittest.TestCase):
+
+	def setUp(self):
+		rng = np.random.RandomState(0)
+		self.close = pd.Series(100 + np.cumsum(rng.normal(size=300)))
+		self.high = self.close + rng.rand(300)
+		self.low = self.close - rng.rand(300)
+
+	# Feeds the columns to the indicator one bar at a time, checking that peek agrees with update
+	def stream(self, indicator, *columns):
+		values = []
+		for i in range(len(columns[0])):
+			bar = [column.iloc[i] for column in columns]
+			peeked = indicator.peek(*bar)
+			values.append(indicator.update(*bar))
+			assert np.allclose(peeked, values[-1], equal_nan=True)
+		return np.array(values)
+
+	def assertSame(self, streamed, expected):
+		assert np.allclose(streamed, np.asarray(expected, dtype=np.float64), equal_nan=True, atol=1e-9)
+
+	def test_macd(self):
+		self.assertSame(self.stream(MACD(12,26,9), self.close), trend.macd_diff(self.close, n_fast=12, n_slow=26, n_sign=9))
+
+	def test_rsi(self):
+		self.assertSame(self.stream(RSI(14), self.close), momentum.rsi(self.close, n=14))
+		self.assertSame(self.stream(RSI(2), self.close), momentum.rsi(self.close, n=2))
+
+	def test_bollinger(self):
+		upper = volatility.bollinger_hband(self.close, 20, 2)
+		lower = volatility.bollinger_lband(self.close, 20, 2)
+		self.assertSame(self.stream(Bollinger(20,2), self.close), (self.close - (upper+lower)/2) / ((upper-lower)/2))
+
+	def test_ma(self):
+		self.assertSame(self.stream(MA(12,0), self.close), volatility.bollinger_mavg(self.close, n=12))
+		self.assertSame(self.stream(MA(12,1), self.close), trend.ema_indicator(self.close, n=12))
+
+	def test_stoch(self):
+		self.assertSame(self.stream(Stoch(14), self.high, self.low, self.close), momentum.stoch(self.high, self.low, self.close, n=14))
+
+	def test_stream_pending_bar(self):
+		times = pd.date_range('2019-01-01', periods=300, freq='D', tz='America/New_York')
+		stream = IndicatorStream(RSI(14))
+		stream.add(times[:100], [self.close.values[:100]])
+		# The newest bar changes before the next bar arrives
+		stream.add(times[98:100], [np.array([self.close.values[98], 50.0])])
+		stream.add(times[98:], [self.close.values[98:]])
+		values = stream.last(250)
+		assert len(values) == 250
+		assert (values.index == times[-250:]).all()
+		self.assertSame(values, momentum.rsi(self.close, n=14)[-250:])
+
+	# The tables compute the same values as the streaming indicators, on all of the columns at once
+	def test_tables(self):
+		frames = {'close': pd.DataFrame({'A': self.close, 'B': self.close[::-1].values}),
+				  'high': pd.DataFrame({'A': self.high, 'B': self.high[::-1].values}),
+				  'low': pd.DataFrame({'A': self.low, 'B': self.low[::-1].values})}
+		for column in ['A', 'B']:
+			close, high, low = (frames[name][column] for name in ['close', 'high', 'low'])
+			self.assertSame(macdtable(frames.get)[column], self.stream(MACD(12,26,9), close))
+			self.assertSame(rsitable(frames.get, window=2)[column], (self.stream(RSI(2), close) - 50) / 50)
+			self.assertSame(bollingertable(frames.get)[column], self.stream(Bollinger(20,2), close))
+			self.assertSame(matable(frames.get, mawindow=5, matype=1)[column], self.stream(MA(5,1), close))
+			self.assertSame(stochtable(frames.get)[column], (self.stream(Stoch(14), high, low, close) - 50) / 50)
+		# matype isn't taken where it would be ignored
+		with self.assertRaises(TypeError):
+			bollingertable(frames.get, matype=0)
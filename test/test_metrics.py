@@ -0,0 +1,50 @@
+import unittest
+import numpy as np
+import pandas as pd
+from empyrical import max_drawdown, alpha_beta, annual_volatility, sharpe_ratio
+from trader.Metrics import *
+
+
+class RiskMetricsTest(unittest.TestCase):
+
+	def setUp(self):
+		rng = np.random.RandomState(0)
+		self.benchmark = pd.Series(rng.normal(0.0005, 0.01, size=300))
+		self.returns = 0.5 * self.benchmark + pd.Series(rng.normal(0.0003, 0.01, size=300))
+		self.values = 1000 * np.concatenate([[1], np.cumprod(1 + self.returns)])
+
+	def assertClose(self, value, expected):
+		assert np.isclose(value, expected, rtol=1e-7, atol=1e-10), (value, expected)
+
+	def test_same_as_empyrical(self):
+		metrics = RiskMetrics()
+		for i, value in enumerate(self.values):
+			metrics.update(value, self.benchmark[i-1] if i > 0 else None)
+			if i >= 10:
+				returns, benchmark = self.returns[:i], self.benchmark[:i]
+				alpha, beta = alpha_beta(returns, benchmark)
+				self.assertClose(metrics.alphabeta()[0], alpha)
+				self.assertClose(metrics.alphabeta()[1], beta)
+				self.assertClose(metrics.sharpe(), sharpe_ratio(returns))
+				self.assertClose(metrics.volatility(), annual_volatility(returns))
+				self.assertClose(metrics.maxdrawdown(), max_drawdown(returns))
+		assert metrics.maxdrawdown() < 0
+
+	def test_rolling_window(self):
+		metrics = RiskMetrics(window=50)
+		for i, value in enumerate(self.values):
+			metrics.update(value, self.benchmark[i-1] if i > 0 else None)
+		returns, benchmark = self.returns[-50:], self.benchmark[-50:]
+		self.assertClose(metrics.alphabeta()[1], alpha_beta(returns, benchmark)[1])
+		self.assertClose(metrics.sharpe(), sharpe_ratio(returns))
+		self.assertClose(metrics.volatility(), annual_volatility(returns))
+		self.assertClose(metrics.maxdrawdown(), max_drawdown(returns))
+
+	def test_days_without_benchmark(self):
+		metrics = RiskMetrics()
+		for i, value in enumerate(self.values):
+			metrics.update(value, self.benchmark[i-1] if i % 2 == 0 and i > 0 else None)
+		known = self.benchmark.index % 2 == 1
+		alpha, beta = alpha_beta(self.returns[known], self.benchmark[known])
+		self.assertClose(metrics.alphabeta()[1], beta)
+		self.assertClose(metrics.sharpe(), sharpe_ratio(self.returns))
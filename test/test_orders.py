@@ -0,0 +1,150 @@
+import unittest
+import asyncio
+import threading
+import time
+import types
+import itertools
+from unittest.mock import patch
+from trader.Algorithm import Algorithm
+from trader.Orders import FillTracker, LocalTradeStream, AlpacaTradeStream, Fill
+
+
+class FillTrackerTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tracker = FillTracker()
+		self.stream = LocalTradeStream(self.tracker)
+		self.tracker.start()
+
+	# Fills the order from another thread after delay seconds
+	def later(self, delay, func, *args, **kwargs):
+		thread = threading.Timer(delay, func, args, kwargs)
+		thread.start()
+		return thread
+
+	def test_wakes_on_fill(self):
+		self.later(0.05, self.stream.fill, "a", 10, 100.0)
+		start = time.monotonic()
+		fill = self.tracker.wait("a", timeout=5)
+		assert time.monotonic() - start < 1
+		assert fill.status == 'filled'
+		assert fill.filledqty == 10
+		assert fill.filledprice == 100.0
+
+	def test_partial_fill(self):
+		self.later(0.05, self.stream.fill, "a", 4, 100.0, partial=True)
+		fill = self.tracker.wait("a", timeout=5, partial=True)
+		assert fill.status == 'partially_filled'
+		assert fill.filledqty == 4
+		assert not fill.isdone()
+
+	def test_timeout(self):
+		self.stream.fill("b", 10, 100.0)
+		start = time.monotonic()
+		assert self.tracker.wait("a", timeout=0.1) is None
+		assert time.monotonic() - start >= 0.1
+
+	def test_cancel(self):
+		self.stream.fill("a", 4, 100.0, partial=True)
+		self.later(0.05, self.stream.cancel, "a")
+		fill = self.tracker.wait("a", timeout=5)
+		assert fill.status == 'canceled'
+		assert fill.filledqty == 4
+		assert fill.isdone()
+
+
+	def test_polls_orders_the_stream_missed(self):
+		polls = []
+		def poll(orderid):
+			polls.append(orderid)
+			if len(polls) == 2:
+				self.tracker.update(Fill(orderid, 'filled', 10, 100.0))
+		self.stream.poll = poll
+		self.tracker.streampollinterval = 0.1
+		start = time.monotonic()
+		# Polled right away, and again after streampollinterval even though the stream is connected
+		fill = self.tracker.wait("a", timeout=5)
+		assert time.monotonic() - start < 1
+		assert fill.status == 'filled' and polls == ["a", "a"]
+
+	def test_connected_when_subscribed(self):
+		tracker = FillTracker()
+		stream = AlpacaTradeStream(tracker)
+		def run(conn):
+			assert not tracker.connected # Connecting isn't enough
+			asyncio.run(conn._trading_ws._dispatch({'stream': 'authorization', 'data': {'status': 'authorized'}}))
+			assert not tracker.connected
+			asyncio.run(conn._trading_ws._dispatch({'stream': 'listening', 'data': {'streams': ['trade_updates']}}))
+			assert tracker.connected
+			self.ran = True
+		with patch('trader.Orders.alpacakeys', lambda: ("id", "key")), patch('alpaca_trade_api.Stream.run', run):
+			stream.run()
+		assert self.ran and not tracker.connected # Disconnected when the stream stops
+
+
+class OrderAsyncTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tracker = FillTracker()
+		self.stream = LocalTradeStream(self.tracker)
+		self.tracker.start()
+		self.ids = itertools.count()
+		self.orders = {}
+		self.prices = {"A": 10.0, "B": 20.0, "C": 50.0, "D": 25.0}
+		self.algo = Algorithm()
+		self.algo.quote = lambda stock: self.prices[stock]
+		self.algo.quotes = lambda stocks: {stock: self.prices[stock] for stock in stocks}
+		self.algo.stocks = {"A": 100, "B": 50}
+		self.algo.cash = 0.0
+		self.algo.value = 2000.0
+		self.patches = [patch('trader.Algorithm.FILLS', self.tracker),
+						patch('trader.Algorithm.buy', self.submit),
+						patch('trader.Algorithm.sell', self.submit)]
+		for p in self.patches:
+			p.start()
+
+	def tearDown(self):
+		for p in self.patches:
+			p.stop()
+
+	# Every order fills after 0.2 seconds
+	def submit(self, stock, amount, **kwargs):
+		orderid = str(next(self.ids))
+		self.orders[orderid] = (stock, amount)
+		threading.Timer(0.2, self.stream.fill, (orderid, amount, self.prices[stock])).start()
+		return types.SimpleNamespace(id=orderid)
+
+	def test_orders_fill_concurrently(self):
+		start = time.monotonic()
+		futures = [self.algo.order_async("A", -100), self.algo.order_async("B", -50)]
+		assert [future.result() for future in futures] == [-100, -50]
+		assert time.monotonic() - start < 0.35
+		assert self.algo.cash == 2000.0
+		assert self.algo.stocks == {"A": 0, "B": 0}
+
+	def test_reserves_shares(self):
+		future = self.algo.order_async("A", -100)
+		assert self.algo.order_async("A", -1).result() == 0
+		future.result()
+		assert self.algo.pendingstocks == {}
+
+	def test_rebalance(self):
+		start = time.monotonic()
+		filled = self.algo.rebalance_to({"C": 0.5, "D": 0.5})
+		# The buys wait for the sells
+		assert time.monotonic() - start < 0.55
+		assert filled == {"A": -100, "B": -50, "C": 20, "D": 40}
+		assert self.algo.cash == 0.0
+		assert self.algo.pendingcash == 0.0
+
+	def test_updatetick_during_fill(self):
+		# An order fills (adding a stock) while updatetick is fetching the quotes
+		def quotes(stocks):
+			prices = {stock: self.prices[stock] for stock in stocks}
+			self.algo.order_async("C", 10, cost=0.0).result()
+			return prices
+		self.algo.quotes = quotes
+		self.algo.updatetick()
+		assert self.algo.value == 2000.0
+		assert self.algo.prices == {"A": 10.0, "B": 20.0}
+		assert self.algo.stocks["C"] == 10
@@ -1,54 +1,73 @@
-# https://fgimian.github.io/blog/2014/04/10/using-the-python-mock-library-to-fake-regular-functions-during-tests/
-# https://stackoverflow.com/questions/4481954/trying-to-mock-datetime-date-today-but-not-working
 import unittest
 from unittest.mock import patch
-from time import sleep as pause
 import datetime
-import threading
-from trader.AlgoManager import *
+import tempfile
+import shutil
+import time
 from trader.Algorithm import *
+from trader.AlgoManager import *
+from trader.Clock import SimClock, setclock, Clock
+from trader.Broker import SimBroker, AlpacaBroker, setbroker
+from trader.BarStore import BarStore
+from trader.Calendar import CALENDAR
 
 
+# Runs the live loop of the Manager in simulated time, with a SimBroker and no network
+class RunnerTests(unittest.TestCase):
 
-class SpoofTime(datetime.datetime):
-
-    spoofed_date = datetime.datetime(2019,9,10,8,30)
-
-    @staticmethod
-    def increment_date():
-        while True:
-            pause(0.1)
-            SpoofTime.spoofed_date += datetime.timedelta(minutes=1)
-
-    @staticmethod
-    def now(timezone=None):
-        return SpoofTime.spoofed_date
-
-
-def sleep_stub(n):
-    pause(0.025)
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.calendarpath = CALENDAR.path
+        CALENDAR.path = self.path
+        setbroker(SimBroker(store=BarStore(self.path)))
+        self.runs = []
 
+    def tearDown(self):
+        setclock(Clock())
+        setbroker(AlpacaBroker())
+        CALENDAR.path = self.calendarpath
+        shutil.rmtree(self.path)
 
+    def record(self, algo):
+        self.runs.append((algo.__class__.__name__, getdatetime()))
 
-class RunnerTests(unittest.TestCase):
+    def manager(self, start, algos):
+        setclock(SimClock(start, fastforward=True))
+        manager = Manager()
+        for algo in algos:
+            manager.add(algo, allocation=1/len(algos))
+        manager.running = True
+        return manager
 
-    def setUp(self):
-        datetime.datetime = SpoofTime
-        time.sleep = sleep_stub
-        self.date_thread = threading.Thread(target=SpoofTime.increment_date)
-        self.date_thread.start()
-
-    @patch('time.sleep', side_effect=sleep_stub)
-    @patch.object(Algorithm, 'run')
-    def test_runner(self, runspoof, sleepspoof):
-        # Start Runner
+    @patch.object(Algorithm, 'riskmetrics')
+    def test_runner(self, riskmetrics):
         algo = Algorithm(schedule="30 9 * * *")
-        manager = Manager()
-        manager.add(algo, allocation=1)
-        manager.start()
-        while datetime.datetime.now().time() < datetime.time(9,30):
-            assert not runspoof.called
-            pause(0.1)
-        pause(1)
-        runspoof.assert_called_once()
-        manager.stop()
+        algo.run = lambda: self.record(algo)
+        manager = self.manager(datetime.datetime(2019,9,10,8,30), [algo])
+        manager.run(until=datetime.datetime(2019,9,10,9,45))
+        assert self.runs == [("Algorithm", datetime.datetime(2019,9,10,9,30))]
+        assert len(manager.chartminute) == 16
+
+    @patch.object(Algorithm, 'riskmetrics')
+    def test_week(self, riskmetrics):
+        class Opening(Algorithm):
+            pass
+        class Hourly(Algorithm):
+            pass
+        class Closing(Algorithm):
+            pass
+        algos = [Opening(schedule="30 9 * * *"), Hourly(schedule="0 10-15 * * *"), Closing(schedule="55 15 * * *")]
+        for algo in algos:
+            algo.run = (lambda algo: lambda: self.record(algo))(algo)
+        manager = self.manager(datetime.datetime(2019,9,9,0,0), algos)
+        start = time.monotonic()
+        manager.run(until=datetime.datetime(2019,9,15,0,0))
+        assert time.monotonic() - start < 30
+        # Monday to Friday
+        assert len(self.runs) == 5 * (1 + 6 + 1)
+        assert all(runtime.weekday() < 5 for name, runtime in self.runs)
+        assert [runtime for name, runtime in self.runs if name == "Closing"] == \
+               [datetime.datetime(2019,9,d,15,55) for d in range(9,14)]
+        assert manager.maxlag == 0
+        assert len(manager.chartday) == 5
+        assert len(algos[0].chartminute) == 391
@@ -0,0 +1,25 @@
+import unittest
+from trader.Setup import Lazy
+
+
+class LazyTest(unittest.TestCase):
+
+	def setUp(self):
+		self.made = 0
+
+	def make(self):
+		self.made += 1
+		return {"Email Address": "a@b.com"}
+
+	def test_created_on_first_use(self):
+		creds = Lazy(self.make)
+		assert self.made == 0
+		assert creds["Email Address"] == "a@b.com"
+		assert "Email Address" in creds
+		assert list(creds.keys()) == ["Email Address"]
+		assert self.made == 1
+
+	def test_setattr_goes_to_object(self):
+		obj = Lazy(lambda: type('Obj', (object,), {})())
+		obj.value = 3
+		assert obj.get().value == 3
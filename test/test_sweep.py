@@ -0,0 +1,71 @@
+import unittest
+import io
+import contextlib
+import tempfile
+import shutil
+import datetime
+import numpy as np
+import pandas as pd
+from unittest.mock import patch
+from trader.Algorithm import *
+from trader.Sweep import *
+from trader.BarStore import BarStore
+from trader.Broker import SimBroker, AlpacaBroker, setbroker
+from trader.Calendar import CALENDAR
+
+
+# Buys when the price is below its moving average and sells when it is above
+class MeanReversion(Algorithm):
+	def initialize(self):
+		self.window = 5
+		self.fraction = 1
+
+	def run(self):
+		prices = self.history("SPY", length=self.window)
+		if prices.iloc[-1] < prices.mean():
+			self.orderfraction("SPY", self.fraction)
+		else:
+			self.orderfraction("SPY", 0)
+
+
+class SweepTest(unittest.TestCase):
+
+	def setUp(self):
+		self.path = tempfile.mkdtemp()
+		self.store = BarStore(self.path, fetch=self.fetch)
+		self.patches = [patch('trader.Algorithm.BARSTORE', self.store), patch('trader.Sweep.BARSTORE', self.store)]
+		for p in self.patches:
+			p.start()
+		self.calendarpath = CALENDAR.path
+		CALENDAR.path = self.path
+		setbroker(SimBroker(store=self.store))
+
+	def tearDown(self):
+		for p in self.patches:
+			p.stop()
+		setbroker(AlpacaBroker())
+		CALENDAR.path = self.calendarpath
+		shutil.rmtree(self.path)
+
+	# Weekday bars of a price that swings by a few percent
+	def fetch(self, stock, start, end, interval):
+		index = pd.date_range(start, end, freq='B', tz='America/New_York')
+		days = np.array([date.toordinal() for date in index], dtype=np.float64)
+		price = 100 + 5 * np.sin(days / 3.0)
+		return pd.DataFrame({'open': price, 'high': price + 1, 'low': price - 1, 'close': price, 'volume': 100.0}, index=index)
+
+	def test_same_as_backtests(self):
+		grid = {'window': [3, 10, 40], 'fraction': [0.5, 1]}
+		# No warmup, so the workers download the bars before the backtest themselves (at the same time)
+		results = sweep(MeanReversion, grid, start=(2019,3,1), end=(2019,4,30), capital=1000,
+						schedule="0 10 * * MON-FRI", universe=["SPY"], processes=3, warmup=0)
+		assert list(results.columns) == ['window', 'fraction'] + sweepmetrics
+		assert len(results) == 6
+		for row in results.itertuples():
+			algo = MeanReversion("0 10 * * MON-FRI")
+			algo.window, algo.fraction = row.window, row.fraction
+			algoback = backtester(algo, capital=1000)
+			with contextlib.redirect_stdout(io.StringIO()):
+				algoback.backtest(start=(2019,3,1), end=(2019,4,30))
+			assert row.value == algoback.value
+			assert row.sharpe == algoback.sharpe
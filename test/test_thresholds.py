@@ -0,0 +1,45 @@
+import unittest
+import numpy as np
+from trader.Thresholds import *
+
+
+class ThresholdTableTest(unittest.TestCase):
+
+	def setUp(self):
+		self.table = ThresholdTable()
+		self.stoplosses = self.table.kind('stoplosses')
+		self.stopgains = self.table.kind('stopgains')
+		self.limitlow = self.table.kind('limitlow')
+		self.limithigh = self.table.kind('limithigh')
+
+	def test_dict_interface(self):
+		self.stoplosses["SPY"] = (95.0, 0)
+		self.stopgains["SPY"] = (105.0, 0.5)
+		assert self.stoplosses["SPY"] == (95.0, 0.0)
+		assert "SPY" in self.stoplosses and "SPY" not in self.limitlow
+		assert "SPY" in self.table and "QQQ" not in self.table
+		assert dict(self.stopgains) == {"SPY": (105.0, 0.5)}
+		assert self.stoplosses.pop("SPY") == (95.0, 0.0)
+		assert self.stoplosses.pop("SPY", None) is None
+		assert len(self.stoplosses) == 0 and len(self.stopgains) == 1
+		with self.assertRaises(KeyError):
+			del self.limithigh["SPY"]
+
+	def test_first_kind_that_is_crossed(self):
+		self.stoplosses["A"] = (95.0, 0)
+		self.limitlow["A"] = (96.0, 1)
+		self.limithigh["B"] = (110.0, 1)
+		self.stopgains["C"] = (105.0, 0)
+		triggered = self.table.triggered(["A", "B", "C", "D"], low=[94.0, 100.0, 100.0, 1.0], high=[100.0, 111.0, 104.0, 1.0])
+		assert triggered == [("A", 0), ("B", 3)]
+		# Stop losses and stop gains only apply to held stocks
+		triggered = self.table.triggered(["A", "B"], low=[94.0, 100.0], high=[100.0, 111.0], held=[False, False])
+		assert triggered == [("A", 2), ("B", 3)]
+
+	def test_many_stocks(self):
+		stocks = ["S%d" % i for i in range(500)]
+		for i, stock in enumerate(stocks):
+			self.stoplosses[stock] = (float(i), 0)
+		prices = np.full(500, 250.0)
+		triggered = self.table.triggered(stocks, prices, prices)
+		assert [stock for stock, kind in triggered] == stocks[250:]
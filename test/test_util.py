@@ -0,0 +1,94 @@
+import unittest
+import datetime
+import time
+import threading
+import numpy as np
+import pandas as pd
+from trader.Util import *
+
+
+class NearestIdxTest(unittest.TestCase):
+
+	def setUp(self):
+		index = pd.date_range(datetime.datetime(2019,1,2,9,30), periods=391*3, freq='min', tz='America/New_York')
+		self.hist = pd.Series(np.arange(len(index), dtype=np.float64), index=index)
+		self.dateidx = dateidxarray(self.hist)
+		self.dates = dateidxs(self.hist)
+
+	def test_matches_list_search(self):
+		for minutes in [0, 1, 390, 391, 500, 1172, 2000]:
+			time = datetime.datetime(2019,1,2,9,30) + datetime.timedelta(minutes=minutes, seconds=30)
+			assert nearestidx(time, self.dateidx) == nearestidx(time, self.dates)
+
+	def test_cursor(self):
+		lastidx = 0
+		for minutes in range(0, 391*3, 7):
+			time = datetime.datetime(2019,1,2,9,30) + datetime.timedelta(minutes=minutes)
+			lastidx = nearestidx(time, self.dateidx, lastchecked=lastidx)
+			assert lastidx == min(minutes, len(self.dates)-1)
+		# Moving back in time falls back to the binary search
+		assert nearestidx(datetime.datetime(2019,1,2,9,35), self.dateidx, lastchecked=lastidx) == 5
+
+	def test_before_data(self):
+		assert nearestidx(datetime.datetime(2019,1,1), self.dateidx) is None
+
+	def test_datetolength(self):
+		assert datetolength(self.dates[391], self.hist) == 391*2
+		assert datetolength(self.dates[391], self.dateidx, 500) == 110
+
+
+class QuoteCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.requests = []
+		self.cache = QuoteCache(ttl=60, fetch=self.fetch)
+
+	def fetch(self, stock):
+		self.requests.append(stock)
+		time.sleep(0.1)
+		return float(len(stock))
+
+	def test_reuses_prices(self):
+		assert self.cache.get("SPY") == 3.0
+		assert self.cache.getmany(["SPY", "AAPL"]) == {"SPY": 3.0, "AAPL": 4.0}
+		assert sorted(self.requests) == ["AAPL", "SPY"]
+		self.cache.ttl = 0
+		self.cache.get("SPY")
+		assert len(self.requests) == 3
+
+	def test_coalesces_requests(self):
+		threads = [threading.Thread(target=self.cache.get, args=("SPY",)) for i in range(5)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		assert self.requests == ["SPY"]
+
+	def test_errors_reach_every_caller(self):
+		started = threading.Event()
+		release = threading.Event()
+		def fail(stock):
+			self.requests.append(stock)
+			started.set()
+			release.wait(5)
+			raise RuntimeError("network error")
+		self.cache.fetch = fail
+		errors = []
+		def get():
+			try:
+				self.cache.get("SPY")
+			except RuntimeError as err:
+				errors.append(err)
+		threads = [threading.Thread(target=get) for i in range(5)]
+		threads[0].start()
+		started.wait(5)
+		# The others start while the first request is in flight, so they wait for it
+		for thread in threads[1:]:
+			thread.start()
+		time.sleep(0.1)
+		release.set()
+		for thread in threads:
+			thread.join()
+		assert self.requests == ["SPY"]
+		assert len(errors) == 5 and all(str(err) == "network error" for err in errors)
+		assert len(self.cache.requests) == 0
@@ -3,6 +3,7 @@ from tkinter import *
 import matplotlib
 matplotlib.use('TkAgg')
 import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import datetime
 from pandas.plotting import register_matplotlib_converters; register_matplotlib_converters()
@@ -10,7 +11,8 @@ import atexit
 
 
 class Gui(Frame):
-	def __init__(self, algorithm=None, root=None):
+	# refresh: seconds between the snapshots of the algo's state (see SnapshotProducer)
+	def __init__(self, algorithm=None, root=None, refresh=1.0):
 
 		self.algo = algorithm
 
@@ -35,6 +37,7 @@ class Gui(Frame):
 		self.attributes = None
 		self.stocks = None
 		self.stats = None
+		self.producer = None
 		self.plotres = StringVar();
 		if isinstance(self.algo, Backtester) or self.algo.logging == 'day':
 			self.plotres.set('day')
@@ -43,6 +46,8 @@ class Gui(Frame):
 		self.plotres.trace("u", self.update(False))
 		# Layout
 		self.layout(self)
+		self.producer = SnapshotProducer(self.algo, self.stats, self.stocks, self.attributes, interval=refresh)
+		self.producer.start()
 		self.afterid = None
 		self.update()
 		# Close
@@ -51,6 +56,7 @@ class Gui(Frame):
 	def close(self):
 		try:
 			self.windowisopen = False
+			self.producer.stop()
 			self.after_cancel(self.afterid)
 			self.window.destroy()
 			self.quit()
@@ -60,19 +66,15 @@ class Gui(Frame):
 	def update(self,after=True):
 		if not self.windowisopen:
 			return
+		snapshot = self.producer.latest if self.producer is not None else None
+		if self.producer is not None:
+			self.producer.resolution = self.plotres.get()
 		if self.graph is not None:
-			self.graph.clear()
-			if self.plotres.get() == 'minute':
-				self.graph.plot(self.algo.chartminutetimes, self.algo.chartminute)
-			elif self.plotres.get() == 'day':
-				self.graph.plot(self.algo.chartdaytimes, self.algo.chartday)
-			self.graph.plotbenchmark(self.algo,self.plotres.get())
-		if self.attributes is not None:
-			self.attributes.update()
-		if self.stocks is not None:
-			self.stocks.update()
-		if self.stats is not None:
-			self.stats.update()
+			self.graph.refresh(self.algo, self.plotres.get(), snapshot)
+		if snapshot is not None:
+			self.stats.show(snapshot.stats)
+			self.stocks.show(snapshot.stocks)
+			self.attributes.show(snapshot.attributes)
 		if after:
 			self.afterid = self.after(250, self.update)
 
@@ -123,122 +125,276 @@ class Gui(Frame):
 		self.stats.pack(fill=BOTH, expand=True)
 
 
-class Stats(Text):
-	def __init__(self, master, source, bg='sea green'):
-		Text.__init__(self, master, bg=bg, wrap=WORD)
-		self.source = source
-		self.update()
+# State of an algo that the text widgets show, gathered by a SnapshotProducer
+# benchmarks: {stock: curve} of the chart with the (resolution, first time) in chart
+class Snapshot(NamedTuple):
+	stats: str
+	stocks: str
+	attributes: str
+	chart: Optional[Tuple[str,datetime.datetime]] = None
+	benchmarks: Dict[str,np.ndarray] = {}
 
-	def update(self):
-		self.config(state=NORMAL)
-		self.delete(1.0, END)
-		if isinstance(self.source, Backtester):
-			self.insert(END, 'Date: ' + self.source.algodatetime().strftime("%Y-%m-%d %H:%M:%S") + '\n')
-		else:
-			self.insert(END, 'Date: ' + datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") + '\n')
-		self.insert(END, 'Return: ' + str(round(self.source.value / self.source.startingcapital - 1,
-												2) if self.source.startingcapital != 0 else 0) + '\n')
-		self.insert(END, 'Total Value: $' + str(self.source.value) + '\n')
-		self.insert(END, 'Cash: $' + str(self.source.cash) + '\n')
-		self.insert(END, 'Alpha: ' + str(self.source.alpha) + '\n')
-		self.insert(END, 'Beta: ' + str(self.source.beta) + '\n')
-		self.insert(END, 'Sharpe: ' + str(self.source.sharpe) + '\n')
-		self.insert(END, 'Volatility: ' + str(self.source.volatility) + '\n')
-		self.insert(END, 'Max Drawdown: ' + str(self.source.maxdrawdown) + '\n')
-		self.config(state=DISABLED)
 
+# Gathers a Snapshot of an algo every interval seconds in a background thread, so that building the text and
+# fetching the benchmark bars doesn't freeze the Tk thread. The Tk thread only shows the latest one. It only reads
+# the algo's attributes: its data methods (quote, history...) move state that the algo's own thread uses.
+class SnapshotProducer(object):
+
+	def __init__(self, algo, stats, stocks, attributes, interval:float=1.0):
+		self.algo = algo
+		self.stats = stats
+		self.stocks = stocks
+		self.attributes = attributes
+		self.interval = interval
+		self.latest:Optional[Snapshot] = None
+		self.resolution:str = 'day' # Resolution of the chart that the benchmarks are for (set by the Tk thread)
+		self.benchmarks:Dict[str,Benchmark] = {}
+		self.stopped = threading.Event()
+		self.thread = threading.Thread(target=self.run, daemon=True)
+
+	def start(self):
+		self.thread.start()
+
+	def stop(self):
+		self.stopped.set()
 
-class Stocks(Text):
+	def run(self):
+		while not self.stopped.is_set():
+			try:
+				chart, benchmarks = self.benchmarkcurves()
+				self.latest = Snapshot(stats=self.stats.text(), stocks=self.stocks.text(), attributes=self.attributes.text(),
+									   chart=chart, benchmarks=benchmarks)
+			except Exception as e:
+				logging.error("Error in AlgoGUI snapshot: %s", e)
+			self.stopped.wait(self.interval)
+
+	# Returns the (resolution, first time) of the algo's chart and the benchmark curves for it, in the order of algo.benchmark
+	def benchmarkcurves(self) -> Tuple[Optional[Tuple[str,datetime.datetime]],Dict[str,np.ndarray]]:
+		resolution = self.resolution
+		times = self.algo.chartdaytimes if resolution == 'day' else self.algo.chartminutetimes
+		values = self.algo.chartday if resolution == 'day' else self.algo.chartminute
+		npoints = min(len(times), len(values))
+		if self.algo.benchmark is None or npoints == 0:
+			return None, {}
+		start = times[0]
+		stocks = [self.algo.benchmark] if type(self.algo.benchmark) == str else list(self.algo.benchmark)
+		curves = {}
+		for stock in stocks:
+			curve = self.benchmarks.get(stock)
+			if curve is None or curve.resolution != resolution or curve.start != start:
+				curve = Benchmark(stock, resolution, start)
+				self.benchmarks[stock] = curve
+			curves[stock] = curve.extend(self.algo, npoints).copy()
+		return (resolution, start), curves
+
+
+# Text widget that shows the state of an algo
+# text() builds the text from the source (it doesn't touch Tk, so it can run in the background)
+class Panel(Text):
 	def __init__(self, master, source, bg='sea green'):
 		Text.__init__(self, master, bg=bg, wrap=WORD)
 		self.source = source
-		self.update()
+		self.shown:Optional[str] = None
+		self.config(state=DISABLED)
 
-	def update(self):
+	def text(self) -> str:
+		return ''
+
+	# Replaces the text that is shown (if it changed)
+	def show(self, text:str):
+		if text == self.shown:
+			return
 		self.config(state=NORMAL)
 		self.delete(1.0, END)
-		for stock, amount in self.source.stocks.items():
-			if isinstance(self.source, Backtester):
-				self.insert(END, str(stock) + ':  ' + str(int(amount)) + '  $' + str(
-					self.source.history(stock, interval=self.source.logging)[0].item()) + '\n')
-			else:
-				self.insert(END, str(stock) + ':  ' + str(int(amount)) + '  $' + str(self.source.quote(stock)) + '\n')
+		self.insert(END, text)
 		self.config(state=DISABLED)
+		self.shown = text
+
+	def update(self):
+		self.show(self.text())
 
 
-class Attributes(Text):
+class Stats(Panel):
+	def text(self):
+		text = ''
+		if isinstance(self.source, Backtester):
+			text += 'Date: ' + self.source.algodatetime().strftime("%Y-%m-%d %H:%M:%S") + '\n'
+		else:
+			text += 'Date: ' + datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") + '\n'
+		text += 'Return: ' + str(round(self.source.value / self.source.startingcapital - 1,
+									   2) if self.source.startingcapital != 0 else 0) + '\n'
+		text += 'Total Value: $' + str(self.source.value) + '\n'
+		text += 'Cash: $' + str(self.source.cash) + '\n'
+		text += 'Alpha: ' + str(self.source.alpha) + '\n'
+		text += 'Beta: ' + str(self.source.beta) + '\n'
+		text += 'Sharpe: ' + str(self.source.sharpe) + '\n'
+		text += 'Volatility: ' + str(self.source.volatility) + '\n'
+		text += 'Max Drawdown: ' + str(self.source.maxdrawdown) + '\n'
+		return text
+
+
+class Stocks(Panel):
+	def text(self):
+		text = ''
+		stocks = dict(self.source.stocks)
+		prices = dict(self.source.prices) # The prices that the algo last valued its stocks at
+		for stock, amount in stocks.items():
+			text += str(stock) + ':  ' + str(int(amount)) + '  $' + str(prices.get(stock)) + '\n'
+		return text
+
+
+class Attributes(Panel):
 	dontshow = set(
 		['logging', 'chartday', 'chartdaytimes', 'chartminute', 'running', 'benchmark', \
 		 'chartminutetimes', 'cache', 'startingcapital', 'cash', 'value', 'stocks', 'times', 'datetime', 'openorders', \
-		 'stoplosses', 'stopgains', 'limithigh', 'limitlow', 'alpha', 'beta', 'maxdrawdown', 'volatility', 'sharpe','exptime'])
+		 'thresholds', 'stoplosses', 'stopgains', 'limithigh', 'limitlow', 'alpha', 'beta', 'maxdrawdown', 'volatility', 'sharpe','exptime','metrics','firetimes','firewindow','prices'])
 
-	def __init__(self, master, source, bg='sea green'):
-		Text.__init__(self, master, bg=bg, wrap=WORD)
-		self.source = source
-		self.update()
-
-	def update(self):
-		self.config(state=NORMAL)
-		self.delete(1.0, END)
+	def text(self):
+		text = ''
 		if type(self.source) == list:
-			for item in source:
-				self.insert(END, str(item))
+			for item in self.source:
+				text += str(item)
 		elif isinstance(self.source, Algorithm):
-			for name, value in self.source.__dict__.items():
+			for name, value in list(self.source.__dict__.items()):
 				if name not in Attributes.dontshow:
-					self.insert(END, (" " + str(name) + ": " + str(value)) + "\n")
-		self.config(state=DISABLED)
+					text += " " + str(name) + ": " + str(value) + "\n"
+		return text
 
 class Graph(FigureCanvasTkAgg):
+
+	benchmarkcolors = ['r','g','m','y']
+	maxfills = 32 # number of fill pieces before they are merged into one
+
 	def __init__(self, master=None):
 		plt.xkcd()
 		self.fig = plt.figure(figsize=(12, 6), dpi=100)
 		self.mainplot = self.fig.add_subplot(1,1,1)
 		FigureCanvasTkAgg.__init__(self, self.fig, master=master)
 		self.mpl_connect('key_press_event', self.keypress)
+		self.clear()
 		self.draw()
 
 	def keypress(self, event):
 		pass
 
+	# Removes everything from the plot (the next refresh plots the whole chart again)
 	def clear(self):
 		self.mainplot.cla()
+		self.mainplot.xaxis_date()
+		self.resolution = None
+		self.first = None # first time of the plotted chart
+		self.length = 0 # number of plotted points
+		self.x = np.zeros(64) # plotted times (as matplotlib date numbers) in the first self.length entries
+		self.y = np.zeros(64)
+		self.line = None
+		self.fills = []
+		self.benchmarklines = {}
+		self.snapshot = None # Snapshot whose benchmarks are plotted
 
-	# TODO: Check that benchmark datetime lines up with chardaytimes
-	def plotbenchmark(self, algo, resolution):
-		benchmarkcolors = ['r','g','m','y']
-		if algo.benchmark is not None:
-			benchmarks = algo.benchmark[:]
-			if type(algo.benchmark) == str:
-				benchmarks = [benchmarks]
-			for i, stock in enumerate(benchmarks[::-1]):
-				times = algo.chartdaytimes if resolution == 'day' else algo.chartminutetimes
-				if len(times) > 0:
-					benchmark = algo.history(stock, interval=resolution, length=times[0], datatype='open')
-					if len(times) == len(benchmark) + 1: # correction if backtest goes an extra day
-						times = times[:-1]
-					elif len(times) + 1 == len(benchmark): # TODO: investigate why this happens
-						benchmark = benchmark[:-1]
-					benchmark = [value * algo.startingcapital / benchmark[0] for value in benchmark]
-					color = (benchmarkcolors[i] + '--') if i < len(benchmarkcolors) else None
-					self.plot(times, benchmark, color=color, fill=False)
-					self.draw()
-
-	def plot(self, x, y, color='b-', fill=True):
+	# Brings the plot up to date with the chart of an algo, and the benchmarks of a Snapshot (computed by the SnapshotProducer).
+	# Only the points that were added since the last refresh are converted and filled, and nothing is drawn if nothing changed.
+	def refresh(self, algo, resolution, snapshot:Optional[Snapshot]=None):
+		times = algo.chartdaytimes if resolution == 'day' else algo.chartminutetimes
+		values = algo.chartday if resolution == 'day' else algo.chartminute
+		length = min(len(times), len(values))
+		# Start over if the resolution changed or the chart was replaced (chartminute restarts every day)
+		if resolution != self.resolution or length < self.length or (length > 0 and times[0] != self.first):
+			self.clear()
+			self.resolution = resolution
+		newbenchmarks = snapshot is not None and snapshot is not self.snapshot and snapshot.chart == (self.resolution, times[0] if length > 0 else None)
+		if length == self.length and not newbenchmarks:
+			return
 		try:
-			if len(y) != 0:
-				self.mainplot.plot_date(x, y, color)
-				if fill:
-					self.mainplot.fill_between(x, y, y2=y[0], color=color[0], alpha=0.2)
-				self.fig.autofmt_xdate()
-				self.draw()
+			if length > self.length:
+				start = max(self.length - 1, 0) # the new piece of the fill joins the last plotted point
+				self.x = extend(self.x, self.length, mdates.date2num(np.asarray(times)[self.length:length]))
+				self.y = extend(self.y, self.length, np.asarray(values, dtype=np.float64)[self.length:length])
+				self.length = length
+				self.first = times[0]
+				x, y = self.x[:length], self.y[:length]
+				if self.line is None:
+					self.line, = self.mainplot.plot(x, y, 'b-')
+				else:
+					self.line.set_data(x, y)
+				self.fills.append(self.mainplot.fill_between(x[start:], y[start:], y2=y[0], color='b', alpha=0.2, linewidth=0))
+				if len(self.fills) > Graph.maxfills:
+					for fill in self.fills:
+						fill.remove()
+					self.fills = [self.mainplot.fill_between(x, y, y2=y[0], color='b', alpha=0.2, linewidth=0)]
+			if newbenchmarks:
+				self.plotbenchmark(snapshot)
+			self.mainplot.relim()
+			self.mainplot.autoscale_view()
+			self.fig.autofmt_xdate()
+			self.draw_idle()
 		except Exception as e:
 			logging.error("Error in AlgoGUI plot: %s", e)
 
+	# Plots the benchmark curves of a Snapshot (up to the plotted length of the chart)
+	def plotbenchmark(self, snapshot:Snapshot):
+		self.snapshot = snapshot
+		for i, (stock, benchmark) in enumerate(list(snapshot.benchmarks.items())[::-1]):
+			benchmark = benchmark[:self.length]
+			if len(benchmark) == 0:
+				continue
+			x = self.x[:len(benchmark)]
+			if stock in self.benchmarklines:
+				self.benchmarklines[stock].set_data(x, benchmark)
+			else:
+				color = (Graph.benchmarkcolors[i] + '--') if i < len(Graph.benchmarkcolors) else '--'
+				self.benchmarklines[stock], = self.mainplot.plot(x, benchmark, color)
+
 	def widget(self):
 		return self.get_tk_widget()
 
 
+# Benchmark curve of a chart, scaled to start at the starting capital
+# The whole history is fetched once, then only the bars after the last one are fetched as the chart gets new points.
+# TODO: Check that benchmark datetime lines up with chardaytimes
+class Benchmark(object):
+
+	def __init__(self, stock:str, resolution:str, start:datetime.datetime):
+		self.stock = stock
+		self.resolution = resolution
+		self.start = start # first time of the chart
+		self.values = np.zeros(64) # scaled benchmark in the first self.length entries
+		self.length = 0
+		self.scale:Optional[float] = None
+		self.lasttime = None # time of the last bar in values
+
+	# Returns the curve for a chart with npoints points (in the SnapshotProducer's thread, since it can download bars)
+	# The bars are read from BARSTORE rather than with algo.history, which moves the bar cursors of a running backtest
+	def extend(self, algo, npoints:int) -> np.ndarray:
+		if npoints > self.length:
+			now = algo.algodatetime()
+			first = self.start if self.lasttime is None else self.lasttime
+			hist = BARSTORE.history(self.stock, first, now, interval=self.resolution)['open']
+			times = hist.index.tz_localize(None)
+			if self.lasttime is None:
+				hist = hist[(times >= datetime.datetime.combine(self.start.date(), datetime.time(0,0))) & (times <= now)]
+				if len(hist) > 0:
+					self.scale = algo.startingcapital / hist.iloc[0]
+			else:
+				hist = hist[(times > self.lasttime) & (times <= now)]
+			# The backtest can go one point further than the bars (or the other way around)
+			hist = hist[:npoints-self.length]
+			if len(hist) > 0:
+				self.values = extend(self.values, self.length, np.asarray(hist, dtype=np.float64) * self.scale)
+				self.length += len(hist)
+				self.lasttime = hist.index[-1].tz_localize(None).to_pydatetime()
+		return self.values[:min(self.length, npoints)]
+
+
+# Copies values into buffer starting at index length, and returns the buffer (a bigger one if it didn't fit)
+def extend(buffer:np.ndarray, length:int, values:np.ndarray) -> np.ndarray:
+	if length + len(values) > len(buffer):
+		bigger = np.zeros(max(2 * len(buffer), length + len(values)))
+		bigger[:length] = buffer[:length]
+		buffer = bigger
+	buffer[length:length+len(values)] = values
+	return buffer
+
+
 class Spacer(Frame):
 	def __init__(self, master, width=0, height=0):
 		Frame.__init__(self, master, bg=master["background"], width=width, height=height)
@@ -5,36 +5,53 @@ import code
 import logging
 import traceback
 import atexit
-import trader.AlgoGUI as Alg
-import trader.ManagerGUI as Man
+import heapq
+import threading
+import concurrent.futures
 from trader.Setup import *
 from trader.Util import *
 from trader.Algorithm import *
 
 debuglogger = logging.getLogger("debuglogger")
 debuglogger.setLevel(logging.DEBUG)
-fh = logging.FileHandler('debug.log')
-fmt = logging.Formatter('%(levelname)-7s: %(asctime)-s | %(message)s')
-fh.setFormatter(fmt)
-fh.setLevel(logging.DEBUG)
-debuglogger.addHandler(fh)
+
+# Writes debuglogger to debug.log (only the first call does anything)
+def setupdebuglog():
+	if len(debuglogger.handlers) > 0:
+		return
+	fh = logging.FileHandler('debug.log')
+	fmt = logging.Formatter('%(levelname)-7s: %(asctime)-s | %(message)s')
+	fh.setFormatter(fmt)
+	fh.setLevel(logging.DEBUG)
+	debuglogger.addHandler(fh)
 
 class Manager:
 	def __init__(self):
-
+		setuplogging()
+		setupdebuglog()
 		# Variables that the user can change
 		self.running = False
 		self.algo_alloc = {}
 		# Private variables
 		self.graphing = False
+		self.wakeup = threading.Event() # Wakes up the run loop when it is stopped or an algorithm is added
+		self.workers = concurrent.futures.ThreadPoolExecutor(max_workers=4) # Threads that run the algorithms
+		self.maxsleep = 60 # Max number of seconds between checks of the clock (in case it jumps)
+		self.events = [] # Heap of (time, priority, counter, algo). algo is None for the minute update
+		self.counter = 0
+		self.scheduled = set() # Algorithms that have an event in the heap
+		self.runs = {} # {algo: future of its last run}
+		self.lastday = None
+		self.dispatched = 0 # Number of events that have been handled
+		self.maxlag = 0.0 # Max seconds between the time of an event and when it was handled
 		self.portfolio = portfoliodata()
 		# Variables that change automatically
 		self.value = self.portfolio["value"]
 		self.cash = self.portfolio["cash"]
-		self.chartminute = []
-		self.chartminutetimes = []
-		self.chartday = []
-		self.chartdaytimes = []
+		self.chartminute = Column()
+		self.chartminutetimes = TimeColumn()
+		self.chartday = Column()
+		self.chartdaytimes = TimeColumn()
 		self.stocks = {}
 		self.updatemin()
 		debuglogger.debug('Starting AlgoManager')
@@ -46,6 +63,7 @@ class Manager:
 	# Allocation is the decimal proportion of the total portfolio to use for the algorithm.
 	def add(self, algorithm, allocation=1):
 		self.algo_alloc[algorithm] = allocation
+		self.wakeup.set()
 	# Removes an algorithm from the manager
 	def remove(self, algorithm):
 		del self.algo_alloc[algorithm]
@@ -62,6 +80,7 @@ class Manager:
 
 	def stop(self):
 		self.running = False
+		self.wakeup.set()
 
 	# Redistributes the capital among the algorithms according to the
 	# specified allocations in self.algo_alloc.
@@ -119,8 +138,9 @@ class Manager:
 			algo.stocks[stocks] = (self.stocks[stocks] - self.numstockinalgos(stocks, algo))
 		# Update the algo's value
 		value = 0
+		prices = quotes(algo.stocks)
 		for stock, amount in algo.stocks.items():
-			value += price(stock) * amount
+			value += prices[stock] * amount
 		algo.value = value + algo.cash
 	# Helper function for assignstocks.
 	# Gets the total number of a given stock in all algos (except given algo, if given)
@@ -144,6 +164,7 @@ class Manager:
 
 	# Opens GUI of all algorithms in the manager
 	def gui(self,thread=True):
+		import trader.ManagerGUI as Man
 		desktoptrader = Man.Gui(self)
 		if thread:
 			guithread = threading.Thread(target=desktoptrader.mainloop)
@@ -155,6 +176,7 @@ class Manager:
 	# Opens the GUI to visualize the Algorithm's performance (also works with Backtests)
 	@staticmethod
 	def algogui(algo,thread=False):
+		import trader.AlgoGUI as Alg
 		desktoptrader = Alg.Gui(algo)
 		if thread:
 			guithread = threading.Thread(target=desktoptrader.mainloop)
@@ -197,6 +219,8 @@ class Manager:
 		del varsdict["chartminute"]
 		del varsdict["graphing"]
 		del varsdict["running"]
+		for key in ["wakeup", "workers", "maxsleep", "events", "counter", "scheduled", "runs", "lastday", "dispatched", "maxlag"]:
+			del varsdict[key]
 		return dict2string(varsdict)
 
 
@@ -229,58 +253,112 @@ class Manager:
 	# Private Method
 	# Called at the start of every day
 	def updateday(self):
-		self.chartminute = []
-		self.chartminutetimes = []
+		self.chartminute = Column()
+		self.chartminutetimes = TimeColumn()
 		self.chartday.append(self.value)
 		self.chartdaytimes.append(getdatetime())
 
 
 	# Private Method
-	# Updates the data in each algorithm continuously
+	# Updates the data in each algorithm every minute while the market is open
 	# Runs each algorithm at the right time of day
-	def run(self):
-		lasttime = None
-		lastday = None
-		# function that returns a boolean for if the given day is a trading day
-		tradingday = lambda currentday: datetimeequals(tradingdays(start=currentday,end=currentday+datetime.timedelta(days=1))[0].date(), currentday)
-		# boolean trading day flag
-		istradingday = tradingday(getdatetime().date())
+	# The next time of every event is kept in a heap, and the thread sleeps until the first one
+	# Times come from the Clock that is being used (see setclock), so it can run in simulated time
+	# until: stop after this time (runs until stop() is called if None)
+	def run(self, until=None):
+		self.events = []
+		self.scheduled = set()
+		self.schedule(self.nextupdatetime(getdatetime()))
 		# Main Loop
 		while self.running:
-			time.sleep(15)
 			try:
-				# Get time and day
-				currenttime = getdatetime().time().replace(second=0, microsecond=0)
-				currentday = getdatetime().date()
-				debuglogger.debug('time: %s, day: %s', currenttime, currentday)
-				if currentday != lastday:
-					istradingday = tradingday(currentday)
-					lastday = currentday
-				# If trading is open
-				debuglogger.debug('istradingday: %s, newtime: %s, lateenough: %s, earlyenough: %s', istradingday, not datetimeequals(currenttime, lasttime), currenttime >= datetime.time(9,30), currenttime <= datetime.time(16,0))
-				if (istradingday) and (not datetimeequals(currenttime, lasttime)) and (currenttime >= datetime.time(9,30)) and (currenttime <= datetime.time(16,0)):
-					lasttime = currenttime
-					# Update minute
-					for algo in self.algo_alloc:
-						algo.updatemin()
-					self.updatemin()
-					# Update day
-					if currentday != lastday:
-						self.updateday()
-						for algo in self.algo_alloc:
-							algo.updateday()
-						logging.debug('New day. Variables: %s', self)
-					# Run algorithms
-					for algo in self.algo_alloc:
-						currdatetime = datetime.datetime.combine(currentday,currenttime)
-						debuglogger.debug('algo %s: nextruntime=%s, currenttime=%s, (running=%s)', algo.__class__.__name__, algo.nextruntime(currdatetime), currdatetime, datetimeequals(algo.nextruntime(currdatetime), currdatetime))
-						if datetimeequals(algo.nextruntime(currdatetime), currdatetime):
-							algothread = threading.Thread(target=algo.runalgo)
-							algothread.start()
-							debuglogger.debug('Running algo %s. Variables: %s', algo.__class__.__name__, algo)
+				# Schedule algorithms that were added
+				for algo in list(self.algo_alloc):
+					if algo not in self.scheduled:
+						self.scheduled.add(algo)
+						self.schedule(algo.nextruntime(getdatetime()), algo)
+				eventtime = self.events[0][0]
+				if until is not None and eventtime > until:
+					break
+				# Sleep until the next event
+				clock = getclock()
+				wait = (eventtime - clock.now()).total_seconds()
+				if wait > 0:
+					# When fast forwarding, the runs that have started finish before the time moves
+					if clock.fastforward:
+						concurrent.futures.wait(list(self.runs.values()))
+					clock.wait(self.wakeup, min(wait, self.maxsleep))
+					self.wakeup.clear()
+					continue
+				self.dispatched += 1
+				self.maxlag = max(self.maxlag, -wait)
+				eventtime, priority, counter, algo = heapq.heappop(self.events)
+				if algo is None:
+					self.schedule(self.nextupdatetime(eventtime))
+					self.update(eventtime)
+				elif algo in self.algo_alloc:
+					self.schedule(algo.nextruntime(eventtime + datetime.timedelta(seconds=1)), algo)
+					self.runalgo(algo, eventtime)
+				else:
+					self.scheduled.discard(algo)
 			except Exception as err:
 				exc_type, exc_obj, exc_tb = sys.exc_info()
 				fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
 				stacktrace = traceback.format_tb(exc_tb)
 				logging.error('%s %s in file %s:\n'.join(stacktrace), exc_type.__name__, err, fname)
 
+
+	# Private Method
+	# Adds an event to the heap (the minute update if algo is None, otherwise a run of algo)
+	def schedule(self, eventtime, algo=None):
+		self.counter += 1
+		heapq.heappush(self.events, (eventtime, 0 if algo is None else 1, self.counter, algo))
+
+
+	# Private Method
+	# Returns the next minute after currtime when the market might be open (skips nights)
+	def nextupdatetime(self, currtime):
+		nexttime = (currtime + datetime.timedelta(minutes=1)).replace(second=0, microsecond=0)
+		if nexttime.time() < datetime.time(9,30):
+			nexttime = datetime.datetime.combine(nexttime.date(), datetime.time(9,30))
+		elif nexttime.time() > datetime.time(16,0):
+			nexttime = datetime.datetime.combine(nexttime.date() + datetime.timedelta(days=1), datetime.time(9,30))
+		return nexttime
+
+
+	# Private Method
+	# Returns True if the market is open at the given time
+	def marketopen(self, currtime):
+		return CALENDAR.istradingday(currtime) and (currtime.time() >= datetime.time(9,30)) and (currtime.time() <= datetime.time(16,0))
+
+
+	# Private Method
+	# Updates the data in the manager and the algorithms for the given minute
+	def update(self, currtime):
+		debuglogger.debug('update: %s', currtime)
+		if not self.marketopen(currtime):
+			return
+		# Update day
+		if currtime.date() != self.lastday:
+			self.lastday = currtime.date()
+			self.updateday()
+			for algo in self.algo_alloc:
+				algo.updateday()
+			logging.debug('New day. Variables: %s', self)
+		# Update minute
+		for algo in self.algo_alloc:
+			algo.updatemin()
+		self.updatemin()
+
+
+	# Private Method
+	# Runs an algorithm in the worker threads (unless its last run hasn't finished yet)
+	def runalgo(self, algo, currtime):
+		if not self.marketopen(currtime):
+			return
+		lastrun = self.runs.get(algo)
+		if lastrun is not None and not lastrun.done():
+			debuglogger.debug('Skipping algo %s at %s: the last run is still going', algo.__class__.__name__, currtime)
+			return
+		self.runs[algo] = self.workers.submit(algo.runalgo)
+		debuglogger.debug('Running algo %s. Variables: %s', algo.__class__.__name__, algo)
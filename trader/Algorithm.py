@@ -4,12 +4,12 @@ import datetime
 from pytz import timezone
 import time
 import threading # Runs Backtest in a Thread
+import concurrent.futures
 import pandas as pd
 import numpy as np
-from empyrical import max_drawdown, alpha_beta, annual_volatility, sharpe_ratio # Risk Metrics
 import math
+import bisect
 import smtplib # Emailing
-from ta import trend, volatility, momentum # Technical Indicators
 import logging
 from apscheduler.schedulers.blocking import BaseScheduler
 from apscheduler.schedulers.blocking import BlockingScheduler
@@ -20,6 +20,14 @@ from apscheduler.triggers.base import BaseTrigger
 from typing import *
 from trader.Setup import *
 from trader.Util import *
+from trader.Orders import *
+from trader.BarStore import *
+from trader.BarPanel import *
+from trader.BarCursor import *
+from trader.Indicators import *
+from trader.Metrics import *
+from trader.Chart import *
+from trader.Thresholds import *
 
 
 class Algorithm(object):
@@ -31,21 +39,27 @@ class Algorithm(object):
 		self.value:float = 0.0
 		self.cash:float = 0.0
 		self.stocks:Dict[str,int] = {}
-		self.chartminute:List[float] = []
-		self.chartminutetimes:List[datetime.datetime] = []
-		self.chartday:List[float] = []
-		self.chartdaytimes:List[datetime.datetime] = []
+		self.prices:Dict[str,float] = {} # Prices of the stocks when value was last updated (read by the GUI instead of quoting from its threads)
+		self.pendingcash:float = 0.0 # Cash reserved by buy orders that haven't filled yet
+		self.pendingstocks:Dict[str,int] = {} # Shares reserved by sell orders that haven't filled yet
+		self.orderlock = threading.Lock()
+		self.chartminute:Column = Column()
+		self.chartminutetimes:TimeColumn = TimeColumn()
+		self.chartday:Column = Column()
+		self.chartdaytimes:TimeColumn = TimeColumn()
 		self.running:bool = True
 		self.cache:Dict[Tuple,Any] = {}
-		self.stoplosses:Dict[str,Tuple[float,float]] = {}
-		self.stopgains:Dict[str,Tuple[float,float]] = {}
-		self.limitlow:Dict[str,Tuple[float,float]] = {}
-		self.limithigh:Dict[str,Tuple[float,float]] = {}
+		self.thresholds:ThresholdTable = ThresholdTable() # Levels of the stop and limit orders below
+		self.stoplosses:Thresholds = self.thresholds.kind('stoplosses') # {stock: (price, fraction)}
+		self.stopgains:Thresholds = self.thresholds.kind('stopgains')
+		self.limitlow:Thresholds = self.thresholds.kind('limitlow')
+		self.limithigh:Thresholds = self.thresholds.kind('limithigh')
 		self.alpha:Optional[float] = None
 		self.beta:Optional[float] = None
 		self.volatility:Optional[float] = None
 		self.sharpe:Optional[float] = None
 		self.maxdrawdown:Optional[float] = None
+		self.metrics:RiskMetrics = RiskMetrics() # Accumulates the risk metrics of chartday
 		self.benchmark:Union[str,List[str]] = 'SPY'
 		# User initialization
 		self.initialize()
@@ -84,12 +98,17 @@ class Algorithm(object):
 
 	# Update function called every second
 	def updatetick(self):
+		# Copy the holdings, since orders can fill (in ORDERPOOL) while the quotes are fetched
+		with self.orderlock:
+			self.cash = round(self.cash,2)
+			stocks = dict(self.stocks)
+			cash = self.cash
 		stockvalue = 0
-		for stock, amount in list(self.stocks.items()):
-			stockvalue += self.quote(stock) * amount
-		self.value = self.cash + stockvalue
-		self.value = round(self.value,2)
-		self.cash = round(self.cash,2)
+		prices = self.quotes(stocks)
+		for stock, amount in stocks.items():
+			stockvalue += prices[stock] * amount
+		self.prices = {stock: prices[stock] for stock in stocks}
+		self.value = round(cash + stockvalue,2)
 
 	# Update function called every minute
 	def updatemin(self):
@@ -100,8 +119,8 @@ class Algorithm(object):
 
 	# Update function called every day
 	def updateday(self):
-		self.chartminute = []
-		self.chartminutetimes = []
+		self.chartminute = Column()
+		self.chartminutetimes = TimeColumn()
 		self.chartday.append(self.value)
 		self.chartdaytimes.append(self.algodatetime())
 		self.riskmetrics()
@@ -118,53 +137,52 @@ class Algorithm(object):
 		return datetime.datetime.combine(nextruntime.date(),nextruntime.time()) # purely so object is SpoofTime in tests
 
 	# Checks and executes limit/stop orders
-	def checkthreshold(self, stock:str):
-		# Buy/Sell all shares of the stock if its price has crossed the threshold
-		price = self.quote(stock)
-		if (stock in self.stocks) and (stock in self.stoplosses) and (price <= self.stoplosses[stock][0]):
-			print("Stoploss for " + stock + " kicking in.")
-			del self.stoplosses[stock]
-			self.orderfraction(stock,self.stoplosses[stock][1],verbose=True)
-		elif (stock in self.stocks) and (stock in self.stopgains) and (price >= self.stopgains[stock][0]):
-			print("Stopgain for " + stock + " kicking in.")
-			del self.stopgains[stock]
-			self.orderfraction(stock,self.stopgains[stock][1],verbose=True)
-		elif (stock in self.limitlow) and (price <= self.limitlow[stock][0]):
-			print("Limit order " + stock + " activated.")
-			del self.limitlow[stock]
-			self.orderfraction(stock,self.limitlow[stock][1],verbose=True)
-		elif (stock in self.limithigh) and (price >= self.limithigh[stock][0]):
-			print("Limit order " + stock + " activated.")
-			del self.limithigh[stock]
-			self.orderfraction(stock,self.limithigh[stock][1],verbose=True)
-		# Remove a stock once it is sold
-		if (stock in self.stoplosses) and (self.stocks.get(stock,0) == 0):
-			del self.stoplosses[stock]
-		if stock in self.stopgains and (self.stocks.get(stock,0) == 0):
-			del self.stopgains[stock]
+	# price: current price of the stock (fetched if not given)
+	def checkthreshold(self, stock:str, price:Optional[float]=None):
+		if price is None:
+			price = self.quote(stock)
+		self.executethresholds([stock], [price])
 
 	def checkthresholds(self):
-		for stock in self.stocks:
-			self.checkthreshold(stock)
+		stocks = [stock for stock in self.stocks if stock in self.thresholds]
+		prices = self.quotes(stocks)
+		self.executethresholds(stocks, [prices[stock] for stock in stocks])
+
+	# Buys/Sells the stocks whose prices have crossed a threshold (all of the thresholds are checked at once)
+	def executethresholds(self, stocks:List[str], prices:List[float]):
+		messages = ["Stoploss for %s kicking in.", "Stopgain for %s kicking in.", "Limit order %s activated.", "Limit order %s activated."]
+		held = [stock in self.stocks for stock in stocks]
+		for stock, kind in self.thresholds.triggered(stocks, prices, prices, held=held):
+			print(messages[kind] % stock)
+			self.orderfraction(stock,getattr(self, KINDS[kind][0]).pop(stock)[1],verbose=True)
+		# Remove a stock once it is sold
+		for stock in stocks:
+			if self.stocks.get(stock,0) == 0:
+				self.stoplosses.pop(stock, None)
+				self.stopgains.pop(stock, None)
 
+	# Adds the days of chartday since the last call to the risk metrics
 	def riskmetrics(self):
 		try:
-			if len(self.chartday) < 2:
+			if len(self.chartday) < self.metrics.count: # The chart was reset
+				self.metrics = RiskMetrics()
+			new = len(self.chartday) - self.metrics.count
+			if new == 0:
 				return
 			benchmark = self.benchmark if type(self.benchmark)==str else 'SPY'
-			changes = self.fractionchange(self.chartday)
-			idx = [pd.Timestamp(date.date()) for date in self.chartdaytimes[1:]]
-			changes.index = idx
-			if len(changes) > 0:
-				benchmarkchanges = self.fractionchange(benchmark, length=len(changes))
-				idx = [date.tz_convert(None).date() for date in benchmarkchanges.index]
-				benchmarkchanges.index = idx
-				self.alpha, self.beta = alpha_beta(changes, benchmarkchanges)
+			benchmarkchanges = {}
+			if len(self.chartday) >= 2:
+				changes = self.fractionchange(benchmark, length=min(new, len(self.chartday)-1))
+				benchmarkchanges = {date.tz_convert(None).date(): change for date, change in changes.items()}
+			for value, time in zip(self.chartday[-new:], self.chartdaytimes[-new:]):
+				self.metrics.update(value, benchmarkchanges.get(time.date()))
+			if len(self.chartday) >= 2:
+				self.alpha, self.beta = self.metrics.alphabeta()
 				self.alpha = round(self.alpha,3)
 				self.beta = round(self.beta,3)
-				self.sharpe = round(sharpe_ratio(changes),3)
-				self.volatility = round(annual_volatility(changes),3)
-				self.maxdrawdown = round(max_drawdown(changes),3)
+				self.sharpe = round(self.metrics.sharpe(),3)
+				self.volatility = round(self.metrics.volatility(),3)
+				self.maxdrawdown = round(self.metrics.maxdrawdown(),3)
 		except Exception as err:
 			logging.error("Error in Algorithm riskmetrics: %s", err)
 
@@ -179,8 +197,8 @@ class Algorithm(object):
 			self.cash = cash if (cash is not None) else self.value
 			self.value = self.cash
 			self.stocks = {}
-			self.chartminute = []
-			self.chartday = []
+			self.chartminute = Column()
+			self.chartday = Column()
 			self.running = False
 
 
@@ -190,8 +208,8 @@ class Algorithm(object):
 			self.value = self.startingcapital
 			self.cash = self.startingcapital
 			self.stocks = {}
-			self.chartminute = []
-			self.chartday = []
+			self.chartminute = Column()
+			self.chartday = Column()
 			self.running = True
 
 
@@ -222,50 +240,92 @@ class Algorithm(object):
 	# stock: stock symbol (string)
 	# amount: number of shares of that stock to order (+ for buy, - for sell)
 	# verbose: prints out order
+	# Blocks until the order fills (for up to 5 minutes)
+	# Returns: number of shares that were filled (+ for buy, - for sell)
 	def order(self, stock:str, amount:int, ordertype:str="market", stop:Optional[float]=None, 
-					limit:Optional[float]=None, verbose:bool=False, notify_address:Optional[str]=None):
-		# Guard condition for sell
-		if amount < 0 and (-amount > self.stocks.get(stock,0)):
-			print(("Warning: attempting to sell more shares (" + str(amount) + ") than are owned (" + str(
-				self.stocks.get(stock,0)) + ") of " + stock))
-			return
-		cost = self.quote(stock)
-		# Guard condition for buy
-		if cost * amount > self.cash:
-			print(("Warning: not enough cash ($" + str(self.cash) + ") in algorithm to buy " + str(
-				amount) + " shares of " + stock))
-			return
-		# Do nothing if amount is 0
-		if amount == 0:
-			return
-		# Place order, block until filled, update amount and cash
-		currentcash = portfoliodata()["cash"]
-		currentamount = positions().get(stock,0)
-		newamount = currentamount
-		if self.running:
-			# Send order  
+					limit:Optional[float]=None, verbose:bool=False, notify_address:Optional[str]=None) -> int:
+		return self.order_async(stock, amount, ordertype=ordertype, stop=stop, limit=limit, 
+								verbose=verbose, notify_address=notify_address).result()
+
+
+	# Same as order, but doesn't wait for the order to fill
+	# The cash of a buy (or the shares of a sell) are reserved until it fills, so many orders can be sent at once
+	# cost: price to check the order against (uses the current price if None)
+	# Returns: future of the number of shares that were filled (+ for buy, - for sell)
+	def order_async(self, stock:str, amount:int, ordertype:str="market", stop:Optional[float]=None, 
+						  limit:Optional[float]=None, verbose:bool=False, notify_address:Optional[str]=None,
+						  cost:Optional[float]=None) -> concurrent.futures.Future:
+		if cost is None:
+			cost = self.quote(stock)
+		with self.orderlock:
+			# Guard condition for sell
+			if amount < 0 and (-amount > self.stocks.get(stock,0) - self.pendingstocks.get(stock,0)):
+				print(("Warning: attempting to sell more shares (" + str(amount) + ") than are owned (" + str(
+					self.stocks.get(stock,0)) + ") of " + stock))
+				return donefuture(0)
+			# Guard condition for buy
+			if cost * amount > self.cash - self.pendingcash:
+				print(("Warning: not enough cash ($" + str(self.cash) + ") in algorithm to buy " + str(
+					amount) + " shares of " + stock))
+				return donefuture(0)
+			# Do nothing if amount is 0
+			if amount == 0:
+				return donefuture(0)
+			# Paper trade
+			if not self.running:
+				self.cash -= cost * amount
+				self.stocks[stock] = self.stocks.get(stock,0) + amount
+				self.ordermessage(stock, amount, cost, verbose, notify_address)
+				return donefuture(amount)
+			self.reserve(stock, amount, cost)
+		# Send order
+		try:
 			if amount > 0:
-				buy(stock, amount, ordertype=ordertype, stop=stop, limit=limit)
-			elif amount < 0:
-				sell(stock, abs(amount), ordertype=ordertype, stop=stop, limit=limit)
-			# Block for 5 minutes. If order still hasn't filled, continue.
-			for i in range(273):
-				newamount = positions().get(stock,0)
-				if newamount != currentamount:
-					break
-				else:
-					time.sleep(0.5*(i ** 0.5))
-			# If order didn't go through, return.
-			if (newamount - currentamount) == 0:
-				print("Order for " + str(amount) + " shares of " + stock + " did not fill in time. Continuing.")
-				return
-			# Update algo
-			newcash = portfoliodata()["cash"]
-			self.cash -= (currentcash - newcash)
-			self.stocks[stock] = self.stocks.get(stock,0) + (newamount - currentamount)
+				order = buy(stock, amount, ordertype=ordertype, stop=stop, limit=limit, block=False)
+			else:
+				order = sell(stock, abs(amount), ordertype=ordertype, stop=stop, limit=limit, block=False)
+		except Exception:
+			with self.orderlock:
+				self.reserve(stock, amount, cost, release=True)
+			raise
+		return ORDERPOOL.submit(self.fillorder, order.id, stock, amount, cost, verbose, notify_address)
+
+
+	# Waits for an order to fill, then updates amount and cash (runs in ORDERPOOL)
+	def fillorder(self, orderid:str, stock:str, amount:int, cost:float, verbose:bool, notify_address:Optional[str]) -> int:
+		# Block until the trade update stream reports the fill, for up to 5 minutes. If order still hasn't filled, continue.
+		fill = FILLS.wait(orderid, timeout=300)
+		filled = 0
+		price = cost
+		if fill is not None and fill.filledqty > 0:
+			filled = int(fill.filledqty) if amount > 0 else -int(fill.filledqty)
+			price = fill.filledprice if fill.filledprice is not None else cost
+		# Update algo
+		with self.orderlock:
+			self.reserve(stock, amount, cost, release=True)
+			self.cash -= price * filled
+			self.stocks[stock] = self.stocks.get(stock,0) + filled
+		# If order didn't go through, return.
+		if filled == 0:
+			print("Order for " + str(amount) + " shares of " + stock + " did not fill in time. Continuing.")
+			return 0
+		self.ordermessage(stock, filled, price, verbose, notify_address)
+		return filled
+
+
+	# Reserves (or releases) the cash of a buy or the shares of a sell
+	def reserve(self, stock:str, amount:int, cost:float, release:bool=False):
+		sign = -1 if release else 1
+		if amount > 0:
+			self.pendingcash += sign * cost * amount
 		else:
-			self.cash -= cost * amount
-			self.stocks[stock] = self.stocks.get(stock,0) + amount
+			self.pendingstocks[stock] = self.pendingstocks.get(stock,0) - sign * amount
+			if self.pendingstocks[stock] <= 0:
+				del self.pendingstocks[stock]
+
+
+	# Prints and sends the notification of an order that went through
+	def ordermessage(self, stock:str, amount:int, cost:float, verbose:bool=False, notify_address:Optional[str]=None):
 		# Send Notification
 		if notify_address != None:
 			if amount >= 0:
@@ -282,29 +342,72 @@ class Algorithm(object):
 				print( "Selling " + str(-amount) + " shares of " + stock + " at $" + str(round(cost,2)))
 
 
-	# Buy or sell to reach a target fraction of the algorithm's total allocation
-	# verbose = True to print out whenever an order is made
-	# notify = "example@gmail.com" to send notification when an order is made (if True, it sends to yourself)
-	def orderfraction(self, stock:str, fraction:float, verbose:bool=False, notify_address:Optional[str]=None):
-		cost = self.quote(stock)
-		currentfraction = 0.0
-		if stock in self.stocks:
-			currentfraction = self.stocks[stock] * cost / self.value
+	# Returns the number of shares to buy (+) or sell (-) to reach a target fraction of the algorithm's total allocation
+	# cash: cash available for a buy (default is all of the algorithm's cash)
+	def fractionamount(self, stock:str, fraction:float, cost:float, cash:Optional[float]=None) -> int:
+		currentfraction = self.stocks.get(stock,0) * cost / self.value
 		fractiondiff = fraction - currentfraction
 		if fractiondiff < 0:
 			# Min of (# required to reach target fraction) and (# of that stock owned)
-			amount = min( round(-fractiondiff * self.value / cost), self.stocks.get(stock,0) )
-			return self.order(stock, -amount, verbose=verbose, notify_address=notify_address)
+			return -min( round(-fractiondiff * self.value / cost), self.stocks.get(stock,0) )
 		else:
 			# Min of (# required to reach target fraction) and (# that you can buy with your available cash)
-			amount = min( math.floor(fractiondiff * self.value / cost), math.floor(self.cash / cost) )
-			return self.order(stock, amount, verbose=verbose, notify_address=notify_address)
+			cash = self.cash if cash is None else cash
+			return min( math.floor(fractiondiff * self.value / cost), math.floor(cash / cost) )
+
+
+	# Buy or sell to reach a target fraction of the algorithm's total allocation
+	# verbose = True to print out whenever an order is made
+	# notify = "example@gmail.com" to send notification when an order is made (if True, it sends to yourself)
+	def orderfraction(self, stock:str, fraction:float, verbose:bool=False, notify_address:Optional[str]=None) -> int:
+		return self.orderfraction_async(stock, fraction, verbose=verbose, notify_address=notify_address).result()
+
+
+	# Same as orderfraction, but doesn't wait for the order to fill
+	# Returns: future of the number of shares that were filled (+ for buy, - for sell)
+	def orderfraction_async(self, stock:str, fraction:float, verbose:bool=False, 
+								  notify_address:Optional[str]=None) -> concurrent.futures.Future:
+		cost = self.quote(stock)
+		amount = self.fractionamount(stock, fraction, cost, cash=self.cash - self.pendingcash)
+		return self.order_async(stock, amount, verbose=verbose, notify_address=notify_address, cost=cost)
+
+
+	# Buys and sells to reach target fractions of the algorithm's total allocation for many stocks at once
+	# weights: {stock: fraction}. Held stocks that aren't in weights are sold.
+	# The sells are sent together with the buys that the available cash can pay for.
+	# The other buys are sent once the sells have filled. Then it waits for all of the orders.
+	# Returns: {stock: number of shares that were filled (+ for buy, - for sell)}
+	def rebalance_to(self, weights:Dict[str,float], verbose:bool=False, notify_address:Optional[str]=None) -> Dict[str,int]:
+		targets = dict(weights)
+		for stock, amount in self.stocks.items():
+			if amount != 0:
+				targets.setdefault(stock, 0)
+		prices = self.quotes(list(targets))
+		amounts = {stock: self.fractionamount(stock, targets[stock], prices[stock], cash=self.value) for stock in targets}
+		futures:Dict[str,concurrent.futures.Future] = {}
+		for stock, amount in amounts.items():
+			if amount < 0:
+				futures[stock] = self.order_async(stock, amount, verbose=verbose, notify_address=notify_address, cost=prices[stock])
+		cash = self.cash - self.pendingcash
+		waiting = []
+		for stock, amount in amounts.items():
+			if amount > 0 and amount * prices[stock] <= cash:
+				cash -= amount * prices[stock]
+				futures[stock] = self.order_async(stock, amount, verbose=verbose, notify_address=notify_address, cost=prices[stock])
+			elif amount > 0:
+				waiting.append(stock)
+		# Buys that need the cash from the sells
+		if len(waiting) > 0:
+			concurrent.futures.wait(list(futures.values()))
+			for stock in waiting:
+				amount = min(amounts[stock], math.floor((self.cash - self.pendingcash) / prices[stock]))
+				futures[stock] = self.order_async(stock, amount, verbose=verbose, notify_address=notify_address, cost=prices[stock])
+		return {stock: (future.result() or 0) for stock, future in futures.items()}
 
 
 	# Sells all held stocks
-	def sellall(self, verbose:bool=False, notify_address:Optional[str]=None):
-		for stock in self.stocks:
-			self.orderfraction(stock, 0, verbose=verbose, notify_address=None)
+	def sellall(self, verbose:bool=False, notify_address:Optional[str]=None) -> Dict[str,int]:
+		return self.rebalance_to({}, verbose=verbose, notify_address=None)
 
 
 	### HISTORY AND INDICATORS ###
@@ -316,49 +419,46 @@ class Algorithm(object):
 		return price(stock)
 
 
+	# Uses BROKER to get the current prices of many stocks at once
+	# stocks: list of stock symbols
+	# Returns: dict of {symbol: price}
+	def quotes(self, stocks:Iterable[str]) -> Dict[str,float]:
+		return quotes(stocks)
+
+
 	# Use Alpha Vantage to get the historical price data of a stock
 	# stock: stock symbol (string)
 	# interval: time interval between data points 'day','minute'
 	# length: number of data points (default is only the last)
-	# datatype: 'close','open','volume' (default close)
+	# datatype: 'close','open','volume' (default close), or None for all of them (as a DataFrame)
 	def history(self, stock:str, length:Union[int,Date]=1, datatype:str='close', interval:str='day'):
-		hist = None
-		while hist is None:
-			try:	
-				# Data from Alpaca
-				if BROKER == 'alpaca':
-					end = getdatetime().date() + datetime.timedelta(days=2)
-					# Find start date
-					if not isdate(length):
-						length = cast(int, length)
-						start = tradingdays(start=length, end=self.algodatetime()).date()
-					else:
-						start = cast(datetime.date, length)
-					if interval == 'minute':
-						length = 0 # return data from the beginning of the first day
-						start = start - datetime.timedelta(days=1)
-					limit = 2500 if interval=='day' else 10
-					frames = []
-					totaltime = (end-start).days
-					lastsegstart = start
-					for k in range(totaltime // limit):
-						tempstart = start + datetime.timedelta(days=limit*k+1)
-						tempend = start + datetime.timedelta(days=limit*(k+1))
-						lastsegstart = tempend + datetime.timedelta(days=1)
-						frames.append(API.polygon.historic_agg(interval, stock, _from=tempstart.strftime("%Y-%m-%d"), to=tempend.strftime("%Y-%m-%d")).df)
-					frames.append(API.polygon.historic_agg(interval, stock, _from=lastsegstart.strftime("%Y-%m-%d"), to=end.strftime("%Y-%m-%d")).df)
-					hist = pd.concat(frames)
-			# Keep trying if there is a network error
-			except ValueError as err:
-				logging.warning("Trying to fetch historical data: %s", err)
-				time.sleep(5)
+		# Find start date
+		if not isdate(length):
+			length = cast(int, length)
+			start = tradingdays(start=length, end=self.algodatetime()).date()
+		else:
+			start = cast(datetime.date, length)
+		if interval == 'minute':
+			length = 0 # return data from the beginning of the first day
+			start = start - datetime.timedelta(days=1)
+		hist = BARSTORE.history(stock, start, getdatetime().date(), interval=interval)
 		# Convert length to int
 		if isdate(length):
-			length = datetolength(length,hist[datatype])
+			length = datetolength(length,hist)
 		if length is None:
 			length = len(hist)
 		# Return desired length
-		return hist[datatype][-length:]
+		return (hist if datatype is None else hist[datatype])[-length:]
+
+
+	# Like history, but returns a float64 array of the values of datatype
+	def historyarray(self, stock:str, length:Union[int,Date]=1, datatype:str='close', interval:str='day') -> np.ndarray:
+		return np.asarray(self.history(stock, length=length, datatype=datatype, interval=interval), dtype=np.float64)
+
+
+	# Returns the datatype of the latest bar of a stock
+	def bar(self, stock:str, datatype:str='close', interval:str='day') -> float:
+		return float(self.historyarray(stock, datatype=datatype, interval=interval)[-1])
 
 
 	# macd line: 12 day MA - 26 day MA
@@ -370,9 +470,9 @@ class Algorithm(object):
 		if isdate(length):
 			length = len(tradingdays(length, self.algodatetime()))
 		assert isinstance(length, int)
-		hist = self.history(stock,interval=interval,length=length+slowmawindow+signalmawindow,datatype=datatype)
-		md = trend.macd_diff(hist, n_fast=fastmawindow, n_slow=slowmawindow, n_sign=signalmawindow, fillna=False)
-		return md[-length:]
+		key = ('macd', stock, interval, datatype, fastmawindow, slowmawindow, signalmawindow)
+		return self.streamindicator(key, lambda: MACD(fastmawindow, slowmawindow, signalmawindow), stock, length,
+									warmup=slowmawindow+signalmawindow, datatypes=[datatype], interval=interval)
 
 
 	# Returns the number of standard deviations that the price is from the moving average
@@ -384,13 +484,9 @@ class Algorithm(object):
 		if isdate(length):
 			length = len(tradingdays(length, self.algodatetime()))
 		assert isinstance(length, int)
-		hist = self.history(stock,interval=interval,length=length+mawindow,datatype=datatype)
-		upper = volatility.bollinger_hband(hist,mawindow,ndev,fillna=False)
-		lower = volatility.bollinger_lband(hist,mawindow,ndev,fillna=False)
-		middle = (upper + lower) / 2
-		dev = (upper - lower) / 2
-		bb = (hist - middle) / dev
-		return bb[-length:]
+		key = ('bollinger', stock, interval, datatype, mawindow, ndev)
+		return self.streamindicator(key, lambda: Bollinger(mawindow, ndev), stock, length,
+									warmup=mawindow, datatypes=[datatype], interval=interval)
 
 
 	# Shows market trends by looking at the average gain and loss in the window.
@@ -400,11 +496,10 @@ class Algorithm(object):
 		if isdate(length):
 			length = len(tradingdays(length, self.algodatetime()))
 		assert isinstance(length, int)
-		hist = self.history(stock,interval=interval,length=length+window+1,datatype=datatype)
-		r = momentum.rsi(pd.Series(np.array(hist)),n=window,fillna=False)
-		r = (r - 50) / 50
-		r.index = hist.index
-		return r[-length:]
+		key = ('rsi', stock, interval, datatype, window)
+		r = self.streamindicator(key, lambda: RSI(window), stock, length,
+								 warmup=window+1, datatypes=[datatype], interval=interval)
+		return (r - 50) / 50
 
 
 	# Moving Average. matype = 0 means simple, matype = 1 means exponential
@@ -414,9 +509,11 @@ class Algorithm(object):
 			length = len(tradingdays(length, self.algodatetime()))
 		assert isinstance(length, int)
 		if isinstance(stock,str):
-			hist = self.history(stock,interval=interval,length=length+mawindow,datatype=datatype)
-		else:
-			hist = stock
+			key = ('ma', stock, interval, datatype, mawindow, matype)
+			return self.streamindicator(key, lambda: MA(mawindow, matype), stock, length,
+										warmup=mawindow, datatypes=[datatype], interval=interval)
+		hist = stock
+		from ta import trend, volatility # Technical Indicators (slow to import)
 		if matype == 0:
 			ma = volatility.bollinger_mavg(hist,n=mawindow,fillna=False)
 		elif matype == 1:
@@ -431,12 +528,64 @@ class Algorithm(object):
 		if isdate(length):
 			length = len(tradingdays(length, self.algodatetime()))
 		assert isinstance(length, int)
-		high = self.history(stock,interval=interval,length=length+window,datatype="high")
-		low = self.history(stock,interval=interval,length=length+window,datatype="low")
-		close = self.history(stock,interval=interval,length=length+window,datatype="close")
-		s = momentum.stoch(high=high,low=low,close=close,n=window,fillna=False)
-		s = (s - 50) / 50
-		return s[-length:]
+		key = ('stoch', stock, interval, window)
+		s = self.streamindicator(key, lambda: Stoch(window), stock, length,
+								 warmup=window, datatypes=['high','low','close'], interval=interval)
+		return (s - 50) / 50
+
+
+	# Returns the last length values of a streaming indicator (from trader.Indicators)
+	# The indicator is kept in self.cache under key, and only the bars since its last update are fetched,
+	# so the cost of each call doesn't depend on the lookback. It is restarted (using warmup extra bars)
+	# if more values are requested than it has or if the algorithm's time moved backward.
+	def streamindicator(self, key:Tuple, make:Callable[[],Any], stock:str, length:int, warmup:int,
+								datatypes:Sequence[str]=('close',), interval:str='day') -> pd.Series:
+		stream = self.cache.get(key)
+		hists = None
+		if stream is not None and stream.lasttime() is not None:
+			lasttime = stream.lasttime().tz_localize(None).to_pydatetime() if stream.lasttime().tzinfo is not None else stream.lasttime()
+			hists = [self.history(stock, interval=interval, length=lasttime, datatype=datatype) for datatype in datatypes]
+			if len(hists[0]) == 0 or hists[0].index[-1] < stream.newesttime() or hists[0].index[0] > stream.lasttime():
+				stream = None
+		if stream is None or len(stream) < length:
+			stream = IndicatorStream(make(), name=key[0])
+			hists = [self.history(stock, interval=interval, length=length+warmup, datatype=datatype) for datatype in datatypes]
+			self.cache[key] = stream
+		stream.add(hists[0].index, [np.asarray(hist, dtype=np.float64) for hist in hists])
+		return stream.last(length)
+
+
+	# Computes many indicators of many stocks at once
+	# specs: names of the indicator methods ('macd', 'bollinger', 'rsi', 'ma', 'stoch', 'fractionchange'),
+	#        or (name, {parameter: value}) with the parameters of the method, e.g. ['macd', ('rsi', {'window': 2})]
+	#        (macd and bollinger don't take matype, which their methods ignore)
+	# The history of each stock is fetched once, and each indicator is computed on a (times x stocks) table at once.
+	# If stocks don't have bars at the same times, the rows are the union of their times (with NaN where a stock has no bar).
+	# Returns DataFrame of the last length times, with a column for each (spec, stock) (named like 'rsi(window=2)' if it has parameters)
+	#         or if asarray, an array of shape (specs, stocks, times)
+	def indicators(self, stocks:Sequence[str], specs:Sequence[Union[str,Tuple[str,Dict[str,Any]]]], length:Union[int,Date]=1,
+						 interval:str='day', asarray:bool=False):
+		if isdate(length):
+			length = len(tradingdays(length, self.algodatetime()))
+		assert isinstance(length, int)
+		specs = [(spec, {}) if isinstance(spec, str) else spec for spec in specs]
+		warmup = max([TABLES[name][1](**params) for name, params in specs] + [0])
+		hists = {stock: self.history(stock, interval=interval, length=length+warmup, datatype=None) for stock in stocks}
+		fields:Dict[str,pd.DataFrame] = {}
+		def field(name:str) -> pd.DataFrame:
+			if name not in fields:
+				fields[name] = pd.concat({stock: hist[name] for stock, hist in hists.items()}, axis=1).astype(np.float64)
+			return fields[name]
+		tables = {}
+		for name, params in specs:
+			label = name if len(params) == 0 else '%s(%s)' % (name, ','.join('%s=%s' % item for item in params.items()))
+			# Each indicator starts as many bars back as its own method does when it is first called, so the values are
+			# the same as a freshly warmed-up call (a streaming indicator that has run for longer can differ slightly)
+			start = length + TABLES[name][1](**params)
+			tables[label] = TABLES[name][0](lambda name: field(name)[-start:], **params)[-length:]
+		if asarray:
+			return np.stack([table[list(stocks)].to_numpy().T for table in tables.values()])
+		return pd.concat(tables, axis=1)
 
 
 	# Returns the fraction change
@@ -492,7 +641,7 @@ class Algorithm(object):
 			recipient = CREDS['Email Address']
 		# Send current state of algorithm by default
 		if len(message) == 0:
-			exclude = {"times","chartminute","chartminutetimes","chartday","chartdaytimes","cache","stoplosses","stopgains","limitlow","limithigh"}
+			exclude = {"times","chartminute","chartminutetimes","chartday","chartdaytimes","cache","thresholds","stoplosses","stopgains","limitlow","limithigh"}
 			messagedict = {key: value for (key,value) in self.__dict__.items() if key not in exclude}
 		if type(message) == dict:
 			message = dict2string(messagedict)
@@ -532,6 +681,13 @@ class Algorithm(object):
 
 
 class Backtester(Algorithm):
+
+	# Threshold dicts in the order they are checked: (name, datatype that triggers it, message)
+	thresholdtypes = [('stoplosses', 'low', "Stoploss for %s kicking in at $%s"),
+					  ('stopgains', 'high', "Stopgain for %s kicking in at $%s"),
+					  ('limitlow', 'low', "Limit order %s activated at $%s"),
+					  ('limithigh', 'high', "Limit order %s activated at $%s")]
+
 	def __init__(self, capital:float=10000.0, benchmark:Union[str,List[str]]='SPY', logging:str='day'):
 		super(Backtester, self).__init__()
 		# Constants
@@ -541,11 +697,17 @@ class Backtester(Algorithm):
 		self.exptime:int = 450
 		# Variables that change automatically
 		self.datetime:Optional[datetime.datetime] = None
+		self.enddate:Optional[Date] = None
+		self.panel:Optional[BarPanel] = None # Aligned daily bars used by the vector engine
+		self.dayidx:int = 0
+		self.firetimes:np.ndarray = np.array([], dtype='datetime64[us]') # Fire times of the schedule on the current day of the backtest (see schedulefiretimes)
+		self.firewindow:Optional[Tuple[BaseTrigger,datetime.datetime,datetime.datetime]] = None # (trigger, start, end) of firetimes
 		self.alpha:Optional[float] = None
 		self.beta:Optional[float] = None
 		self.volatility:Optional[float] = None
 		self.sharpe:Optional[float] = None
 		self.maxdrawdown:Optional[float] = None
+		self.metrics:RiskMetrics = RiskMetrics()
 		# Variables that the user can change
 		self.benchmark:Union[str,List[str]] = benchmark
 
@@ -554,31 +716,42 @@ class Backtester(Algorithm):
 	# Times can be in the form of datetime objects or tuples (day,month,year)
 	def start(self, start:Union[Date,Tuple[int,int,int],str]=datetime.datetime.today().date()-datetime.timedelta(days=90),
 					end:Union[Date,Tuple[int,int,int],str]=datetime.datetime.today().date(), 
-					logging:str='day'):
-		backtestthread = threading.Thread(target=self.backtest, args=(start, end, logging))
+					logging:str='day', engine:str='loop', universe:Optional[List[str]]=None):
+		backtestthread = threading.Thread(target=self.backtest, args=(start, end, logging, engine, universe))
 		backtestthread.start()
 
 
 	# Starts the backtest
+	# engine: 'loop' fetches each price from the cached history, 'vector' preloads the daily bars of
+	#         the universe into arrays and evaluates prices, portfolio value and thresholds with them (logging='day' only),
+	#         'event' only stops at the minutes where the algorithm runs or a threshold is crossed (logging='minute' only)
+	# universe: stocks to preload for the vector engine (other stocks are loaded when they are first used)
 	def backtest(self, start:Union[Date,Sequence[int],str]=datetime.datetime.today().date()-datetime.timedelta(days=90),
 					   end:Union[Date,Sequence[int],str]=datetime.datetime.today().date(), 
-					   logging:str='day'):
-		if isinstance(start, str):
-			start = tuple([int(x) for x in start.split("-")])
-		if isinstance(end,str):
-			end = tuple([int(x) for x in end.split("-")])
-		if isinstance(start,list) or isinstance(start,tuple):
-			start = datetime.datetime(start[0], start[1], start[2], 0, 0)
-		if isinstance(end,list) or isinstance(end,tuple):
-			end = datetime.datetime(end[0], end[1], end[2], 23, 59)
-		start = cast(Date, start)
-		end = cast(Date, end)
+					   logging:str='day', engine:str='loop', universe:Optional[List[str]]=None):
+		if engine == 'vector' and logging != 'day':
+			raise ValueError("The vector engine only supports logging='day'")
+		if engine == 'event' and logging != 'minute':
+			raise ValueError("The event engine only supports logging='minute'")
+		start = parsedate(start)
+		end = parsedate(end, datetime.time(23,59))
 		days = tradingdays(start=start, end=end)
 		self.logging = logging
+		self.enddate = end
 		self.datetime = cast(Optional[datetime.datetime], start)
+		self.panel = None
+		self.dayidx = 0
+		if engine == 'vector':
+			self.panel = BarPanel(days, list(universe or []) + list(self.stocks))
 		self.update()
-		for day in days:
-			if self.logging == 'minute':
+		for dayidx, day in enumerate(days):
+			self.dayidx = dayidx
+			self.schedulefiretimes(day)
+			if self.logging == 'minute' and engine == 'event':
+				self.backtestevents(day)
+				# Log algorithm cash and value
+				self.updateday()
+			elif self.logging == 'minute':
 				for minute in range(391):
 					# Set datetime of algorithm
 					self.datetime = datetime.datetime.combine(day, datetime.time(9, 30)) + datetime.timedelta(minutes=minute)
@@ -624,6 +797,76 @@ class Backtester(Algorithm):
 		self.riskmetrics()
 
 
+	# Runs a day of a minute backtest, stopping only at the minutes where something can happen (engine='event'):
+	# when the algorithm is scheduled to run, and when the price of a held stock crosses one of its thresholds.
+	# The values of the minutes in between are computed from the prices at once. The results are the same as the loop.
+	def backtestevents(self, day:datetime.datetime):
+		times = [datetime.datetime.combine(day, datetime.time(9, 30)) + datetime.timedelta(minutes=minute) for minute in range(391)]
+		cutoff = bisect.bisect_left(times, getdatetime()) # Minutes in the future are not run
+		prices:Dict[str,Optional[np.ndarray]] = {}
+		minute = 0
+		while minute < cutoff:
+			self.datetime = times[minute]
+			if self.algodatetime() == self.nextruntime():
+				# Update algorithm cash and value
+				self.update()
+				# Run algorithm
+				self.run()
+			# Log algorithm cash and value
+			self.updatemin()
+			# Check limit order thresholds
+			self.checkthresholds()
+			minute += 1
+			if minute >= cutoff:
+				break
+			# Skip to the next minute where something can happen
+			nextrun = self.nextruntime(times[minute])
+			end = min(cutoff, bisect.bisect_left(times, nextrun))
+			stockvalue = np.zeros(end - minute)
+			for stock, amount in list(self.stocks.items()):
+				if amount == 0:
+					continue
+				if stock not in prices:
+					prices[stock] = self.minuteprices(stock, times)
+				if prices[stock] is None:
+					end = minute
+					break
+				stockprices = prices[stock][minute:end]
+				for name, datatype, message in Backtester.thresholdtypes:
+					thresholds = getattr(self, name)
+					if stock in thresholds:
+						hit = np.nonzero(stockprices <= thresholds[stock][0] if datatype == 'low' else stockprices >= thresholds[stock][0])[0]
+						if len(hit) > 0:
+							end = min(end, minute + int(hit[0]))
+				stockvalue = stockvalue + stockprices * amount
+			if end > minute:
+				values = [round(value, 2) for value in (self.cash + stockvalue[:end-minute]).tolist()]
+				self.chartminute.extend(values)
+				self.chartminutetimes.extend(times[minute:end])
+				self.value = values[-1]
+				self.prices = {stock: float(prices[stock][end-1]) for stock, amount in self.stocks.items() if amount != 0}
+				minute = end
+
+
+	# Prices that quote() gives for a stock at each of the minutes of a day (None if there are minutes without a bar)
+	def minuteprices(self, stock:str, times:List[datetime.datetime]) -> Optional[np.ndarray]:
+		current = self.datetime
+		try:
+			self.datetime = times[0]
+			opening = self.quote(stock)
+			self.datetime = times[-2]
+			closing = self.quote(stock)
+			self.datetime = times[-3]
+			cursor = self.barcursor(stock, 1, 'minute')[0]
+			idx = np.searchsorted(cursor.dateidx, np.array([datetoint(time) for time in times[1:-2]]), side='right') - 1
+			if (idx < 0).any():
+				return None
+			closes = cursor.column('close')[idx]
+			return np.concatenate([[opening], closes, [closing, closing]])
+		finally:
+			self.datetime = current
+
+
 	def updatemin(self):
 		self.update()
 		self.chartminute.append(self.value)
@@ -637,12 +880,25 @@ class Backtester(Algorithm):
 
 
 	def update(self):
+		if self.panel is not None:
+			for stock, amount in list(self.stocks.items()):
+				if amount == 0:
+					del self.stocks[stock]
+			stocks = list(self.stocks)
+			prices = self.panel.get(self.quotefield(), stocks, self.dayidx)
+			amounts = np.array([self.stocks[stock] for stock in stocks], dtype=np.float64)
+			self.prices = dict(zip(stocks, prices.tolist()))
+			self.value = round(self.cash + float(np.dot(prices, amounts)), 2)
+			return
 		stockvalue = 0
+		quotes = {}
 		for stock, amount in list(self.stocks.items()):
 			if amount == 0:
 				del self.stocks[stock]
 			else:
-				stockvalue += self.quote(stock) * amount
+				quotes[stock] = self.quote(stock)
+				stockvalue += quotes[stock] * amount
+		self.prices = quotes
 		self.value = self.cash + stockvalue
 		self.value = round(self.value, 2)
 
@@ -653,115 +909,150 @@ class Backtester(Algorithm):
 		return self.datetime
 
 
+	# Looks up the next fire time in firetimes (the schedule's trigger is only evaluated outside of the backtest)
+	def nextruntime(self, currtime:Optional[datetime.datetime]=None) -> datetime.datetime:
+		if currtime is None:
+			currtime = self.algodatetime()
+		if self.firewindow is not None:
+			trigger, start, end = self.firewindow
+			if trigger is self.scheduleTrigger and start <= currtime <= end:
+				idx = int(np.searchsorted(self.firetimes, np.datetime64(currtime, 'us'), side='left'))
+				if idx < len(self.firetimes):
+					return self.firetimes[idx].item()
+		return Algorithm.nextruntime(self, currtime)
+
+
+	# Expands the schedule into the sorted array of its fire times on a day (as the backtest reaches each trading day,
+	# so a long backtest with a frequent schedule never holds or computes more than a day of them)
+	def schedulefiretimes(self, day:Date):
+		start = datetime.datetime.combine(todate(day), datetime.time(0,0))
+		end = start + datetime.timedelta(days=1) - datetime.timedelta(microseconds=1)
+		self.firewindow = None
+		firetimes = []
+		time = self.nextruntime(start)
+		while time <= end:
+			firetimes.append(time)
+			time = self.nextruntime(time + datetime.timedelta(seconds=1))
+		self.firetimes = np.array(firetimes, dtype='datetime64[us]')
+		self.firewindow = (self.scheduleTrigger, start, end)
+
+
 	def checkthreshold(self, stock:str):
-		# Enforce Thresholds
-		if self.logging == 'minute': # Check if the current price activates a threshold
-			price = self.quote(stock)
-			if (stock in self.stocks) and (stock in self.stoplosses) and (price <= self.stoplosses[stock][0]):
-				print("Stoploss for " + stock + " kicking in at $" + str(round(self.stoplosses[stock][0],2)))
-				self.orderfraction(stock,self.stoplosses[stock][1],verbose=True)
-				del self.stoplosses[stock]
-			elif (stock in self.stocks) and (stock in self.stopgains) and (price >= self.stopgains[stock][0]):
-				print("Stopgain for " + stock + " kicking in at $" + str(round(self.stopgains[stock][0],2)))
-				self.orderfraction(stock,self.stopgains[stock][1],verbose=True)
-				del self.stopgains[stock]
-			elif (stock in self.limitlow) and (price <= self.limitlow[stock][0]):
-				print("Limit order " + stock + " activated at $" + str(round(self.limitlow[stock][0],2)))
-				self.orderfraction(stock,self.limitlow[stock][1],verbose=True)
-				del self.limitlow[stock]
-			elif (stock in self.limithigh) and (price >= self.limithigh[stock][0]):
-				print("Limit order " + stock + " activated at $" + str(round(self.limithigh[stock][0],2)))
-				self.orderfraction(stock,self.limithigh[stock][1],verbose=True)
-				del self.limithigh[stock]
-		else: # Check if the day's low or high activates a threshold
-			if (stock in self.stocks) and (stock in self.stoplosses) and (self.history(stock,datatype='low')[0] <= self.stoplosses[stock][0]):
-				print("Stoploss for " + stock + " kicking in at $" + str(round(self.stoplosses[stock][0],2)))
-				self.orderfraction(stock, self.stoplosses[stock][1], cost=self.stoplosses[stock][0], verbose=True)
-				del self.stoplosses[stock]
-			elif (stock in self.stocks) and (stock in self.stopgains) and (self.history(stock,datatype='high')[0] >= self.stopgains[stock][0]):
-				print("Stopgain for " + stock + " kicking in at $" + str(round(self.stopgains[stock][0],2)))
-				self.orderfraction(stock, self.stopgains[stock][1], cost=self.stopgains[stock][0], verbose=True)
-				del self.stopgains[stock]
-			elif (stock in self.limitlow) and (self.history(stock,datatype='low')[0] <= self.limitlow[stock][0]):
-				print("Limit order " + stock + " activated at $" + str(round(self.limitlow[stock][0],2)))
-				self.orderfraction(stock, self.limitlow[stock][1], cost=self.limitlow[stock][0], verbose=True)
-				del self.limitlow[stock]
-			elif (stock in self.limithigh) and (self.history(stock,datatype='high')[0] >= self.limithigh[stock][0]):
-				print("Limit order " + stock + " activated at $" + str(round(self.limithigh[stock][0],2)))
-				self.orderfraction(stock, self.limithigh[stock][1], cost=self.limithigh[stock][0], verbose=True)
-				del self.limithigh[stock]
+		self.checkthresholds([stock])
 
 
-	def checkthresholds(self):
-		for stock in self.stocks:
-			self.checkthreshold(stock)
+	# Checks the thresholds of all of the held stocks at once, against the current price (logging='minute')
+	# or against the day's low and high (logging='day')
+	def checkthresholds(self, stocks:Optional[List[str]]=None):
+		stocks = [stock for stock in (self.stocks if stocks is None else stocks) if stock in self.thresholds]
+		if len(stocks) == 0:
+			return
+		if self.logging == 'minute':
+			prices = self.quotes(stocks)
+			low = high = [prices[stock] for stock in stocks]
+		elif self.panel is not None:
+			low = self.panel.get('low', stocks, self.dayidx)
+			high = self.panel.get('high', stocks, self.dayidx)
+		else:
+			low = [self.bar(stock, 'low') for stock in stocks]
+			high = [self.bar(stock, 'high') for stock in stocks]
+		held = [stock in self.stocks for stock in stocks]
+		for stock, kind in self.thresholds.triggered(stocks, low, high, held=held):
+			name, datatype, message = Backtester.thresholdtypes[kind]
+			thresholds = getattr(self, name)
+			print(message % (stock, round(thresholds[stock][0],2)))
+			# In day mode, the order is at the threshold
+			cost = thresholds[stock][0] if self.logging == 'day' else None
+			self.orderfraction(stock, thresholds[stock][1], cost=cost, verbose=True)
+			del thresholds[stock]
+
+
+	# The bar datatype that quote() uses at the current time of day
+	def quotefield(self) -> str:
+		if self.algodatetime().time() <= datetime.time(9,30,0,0):
+			return 'open'
+		return 'close'
+
+
+	def quotes(self, stocks:Iterable[str]) -> Dict[str,float]:
+		stocks = list(dict.fromkeys(stocks))
+		if self.panel is not None:
+			return dict(zip(stocks, self.panel.get(self.quotefield(), stocks, self.dayidx).tolist()))
+		return {stock: self.quote(stock) for stock in stocks}
 
 
 	def quote(self, stock:str):
+		if self.panel is not None:
+			return self.panel.price(stock, self.quotefield(), self.dayidx)
 		if self.algodatetime().time() <= datetime.time(9,30,0,0):
-			return self.history(stock, interval='day', datatype='open')[0].item()
+			return self.bar(stock, 'open', interval='day')
 		elif self.algodatetime().time() >= datetime.time(15,59,0,0):
-			return self.history(stock, interval='day', datatype='close')[0].item()
-		return self.history(stock, interval=self.logging, datatype='close')[0].item()
+			return self.bar(stock, 'close', interval='day')
+		return self.bar(stock, 'close', interval=self.logging)
 
 
 	def history(self, stock:str, length:Union[int,Date]=1, datatype:str='close', interval:str='day'):
+		cursor, length = self.barcursor(stock, length, interval)
+		return cursor.slice(datatype, length)
+
+
+	# Like history, but returns a float64 array (a view of the cached bars, so it shouldn't be modified)
+	def historyarray(self, stock:str, length:Union[int,Date]=1, datatype:str='close', interval:str='day') -> np.ndarray:
+		cursor, length = self.barcursor(stock, length, interval)
+		return cursor.column(datatype)[cursor.idx-length+1 : cursor.idx+1]
+
+
+	# Returns the datatype of the bar of a stock at the current time of the backtest
+	def bar(self, stock:str, datatype:str='close', interval:str='day') -> float:
+		cursor = self.barcursor(stock, 1, interval)[0]
+		return float(cursor.column(datatype)[cursor.idx])
+
+
+	# Returns the BarCursor of a stock's bars at an interval, moved to the current time of the backtest, and length as a number of bars
+	# The bars are cached in a BarCursor for each (stock, interval). The staleness check and the search for
+	# the current bar are only done once per time of the backtest, so calls in the same step share them.
+	def barcursor(self, stock:str, length:Union[int,Date], interval:str) -> Tuple[BarCursor,int]:
 		key = (stock, interval)
-		cache = self.cache.get(key)
-		if cache is not None:
-			hist, dateidx, lastidx, time = cache 
-		if cache is None or (interval=='day' and (getdatetime()-time).days > 0) or (interval=='minute' and (getdatetime()-time).seconds > 120):
-			hist = None
-			while hist is None:
-				try:
-					if BROKER == 'alpaca': # Data from Alpaca
-						nextra = 100 if interval=='day' else 5 # Number of extra samples before the desired range
-						end = getdatetime().date() + datetime.timedelta(days=2)
-						# Find start date
-						if not isdate(length):
-							length = cast(int, length)
-							start = tradingdays(start=length+nextra, end=self.algodatetime()).date()
-						else:
-							start = cast(datetime.date, length)
-						if interval == 'minute':
-							length = datetime.datetime.combine(start, datetime.time(0,0,0))
-							start = start - datetime.timedelta(days=1)
-						limit = 2500 if interval=='day' else 10
-						frames = []
-						totaltime = (end-start).days
-						lastsegstart = start
-						for k in range(totaltime // limit):
-							tempstart = start + datetime.timedelta(days=limit*k+1)
-							tempend = start + datetime.timedelta(days=limit*(k+1))
-							lastsegstart = tempend + datetime.timedelta(days=1)
-							frames.append(API.polygon.historic_agg(interval, stock, _from=tempstart.strftime("%Y-%m-%d"), to=tempend.strftime("%Y-%m-%d")).df)
-						frames.append(API.polygon.historic_agg(interval, stock, _from=lastsegstart.strftime("%Y-%m-%d"), to=end.strftime("%Y-%m-%d")).df)
-						hist = pd.concat(frames)
-				# Pause and try again if there is an error
-				except ValueError as err:
-					logging.warning('Trying to fetch historical backtest data: %s', err)
-					time.sleep(5)
+		cursor = self.cache.get(key)
+		time = self.algodatetime()
+		if cursor is None or (cursor.time != time and ((interval=='day' and (getdatetime()-cursor.loaded).days > 0) or 
+													   (interval=='minute' and (getdatetime()-cursor.loaded).seconds > 120))):
+			nextra = 100 if interval=='day' else 5 # Number of extra samples before the desired range
+			# Find start date
+			if not isdate(length):
+				length = cast(int, length)
+				start = tradingdays(start=length+nextra, end=time).date()
+			else:
+				start = cast(datetime.date, length)
+			if interval == 'minute':
+				if isdate(length): # From the start of the day (an int length stays a number of bars)
+					length = datetime.datetime.combine(start, datetime.time(0,0,0))
+				start = start - datetime.timedelta(days=1)
+			# Data up to the end of the backtest is already stored after the first run
+			end = getdatetime().date()
+			if self.enddate is not None:
+				end = min(end, todate(self.enddate))
+			hist = BARSTORE.history(stock, start, end, interval=interval)
 			# Save To Cache
-			dateidx = dateidxs(hist)
-			lastidx = nearestidx(self.algodatetime(), dateidx)
-			self.cache[key] = [hist, dateidx, lastidx, getdatetime()]
+			cursor = BarCursor(hist, dateidxarray(hist), getdatetime())
+			self.cache[key] = cursor
 		# Look for current datetime in cached data
 		try:
-			idx = nearestidx(self.algodatetime(), dateidx, lastchecked=lastidx)
+			if cursor.time != time:
+				cursor.move(time, nearestidx(time, cursor.dateidx, lastchecked=cursor.idx))
+			idx = cursor.idx
 			if isdate(length):
 				length = cast(Date, length)
-				length = datetolength(length,dateidx,idx)
+				length = datetolength(length,cursor.dateidx,idx)
 			# Convert length to int
 			if length is None:
-				length = len(hist)
+				length = len(cursor.hist)
 			if idx-length+1 < 0:
 				logging.error('Not enough historical data')
 		except: # Happens if we request data farther back than before
 			del self.cache[key]
-			return self.history(stock, interval=interval, length=length, datatype=datatype)
-		self.cache[key][2] = idx
-		
-		return hist[datatype][idx-length+1 : idx+1]
+			return self.barcursor(stock, length, interval)
+		return cursor, length
 		
 
 	def order(self, stock:str, amount:int, ordertype:str="market",
@@ -792,6 +1083,7 @@ class Backtester(Algorithm):
 					print( "Buying " + str(amount) + " shares of " + stock + " at $" + str(round(cost,2)))
 				else:
 					print( "Selling " + str(-amount) + " shares of " + stock + " at $" + str(round(cost,2)))
+			return amount
 		# Simulate stop and limit orders
 		elif ordertype == 'stop' or ordertype == 'limit':
 			if limit is None and stop is None:
@@ -808,23 +1100,26 @@ class Backtester(Algorithm):
 		# TODO: Test stop/limit orders in backtest.
 
 
+	# Orders execute immediately in a backtest, so the future is already done
+	def order_async(self, stock:str, amount:int, ordertype:str="market",
+						  stop:Optional[float]=None, limit:Optional[float]=None, verbose:bool=False,
+						  notify_address:Optional[str]=None, cost:Optional[float]=None) -> concurrent.futures.Future:
+		return donefuture(self.order(stock, amount, ordertype=ordertype, stop=stop, limit=limit,
+									 verbose=verbose, notify_address=notify_address, cost=cost))
+
+
 	def orderfraction(self, stock, fraction, ordertype="market", stop=None, limit=None, verbose=False, notify_address=None, cost=None):
 		if cost is None:
 			cost = self.quote(stock)
-		currentfraction = self.stocks.get(stock,0) * cost / self.value
-		fractiondiff = fraction - currentfraction
-		if fractiondiff < 0:
-			# Min of (# required to reach target fraction) and (# of that stock owned)
-			amount = min( round(-fractiondiff * self.value / cost), self.stocks.get(stock,0) )
-			return self.order(stock=stock, amount=-amount, \
-							  ordertype=ordertype, stop=stop, limit=limit, \
-							  verbose=verbose, notify_address=notify_address, cost=cost)
-		else:
-			# Min of (# required to reach target fraction) and (# that you can buy with your available cash)
-			amount = min( math.floor(fractiondiff * self.value / cost), math.floor(self.cash / cost) )
-			return self.order(stock=stock, amount=amount, \
-							  ordertype=ordertype, stop=stop, limit=limit, \
-							  verbose=verbose, notify_address=notify_address, cost=cost)
+		amount = self.fractionamount(stock, fraction, cost)
+		return self.order(stock=stock, amount=amount, \
+						  ordertype=ordertype, stop=stop, limit=limit, \
+						  verbose=verbose, notify_address=notify_address, cost=cost)
+
+
+	def orderfraction_async(self, stock:str, fraction:float, verbose:bool=False, 
+								  notify_address:Optional[str]=None) -> concurrent.futures.Future:
+		return donefuture(self.orderfraction(stock, fraction, verbose=verbose, notify_address=notify_address))
 
 
 # Converts an Algorithm to a BacktestAlgorithm, allowing you to backtest it
@@ -832,7 +1127,11 @@ def backtester(algo:Algorithm, capital:Optional[float]=None, benchmark:Optional[
 	# Convert
 	BacktestAlgorithm = type('BacktestAlgorithm', (Backtester,), dict((algo.__class__).__dict__))
 	algoback = BacktestAlgorithm()
+	defaults = algoback.__dict__
 	algoback.__dict__ = algo.__dict__
+	# Add the Backtester variables that the Algorithm doesn't have
+	for key, value in defaults.items():
+		algoback.__dict__.setdefault(key, value)
 	# Set Capital
 	if capital is None:
 		if algoback.value == 0:
@@ -0,0 +1,43 @@
+import datetime
+import numpy as np
+import pandas as pd
+from typing import *
+
+
+# The cached bars of a stock at one interval in a backtest, and the index of the bar at the backtest's current time
+# The index is searched for once per time of the backtest, so all of the history calls in a step
+# (different datatypes and lengths, from quote, thresholds, indicators...) share it, and each column
+# is kept as one float64 array (and one Series) that the calls take slices of without copying.
+class BarCursor(object):
+
+	def __init__(self, hist:pd.DataFrame, dateidx:np.ndarray, loaded:datetime.datetime):
+		self.hist:pd.DataFrame = hist
+		self.dateidx:np.ndarray = dateidx # Times of the bars (from dateidxarray)
+		self.loaded:datetime.datetime = loaded # When the bars were loaded (to check if they are stale)
+		self.time:Optional[datetime.datetime] = None # Backtest time that idx was found for
+		self.idx:Optional[int] = None # Index of the last bar at or before time
+		self.arrays:Dict[str,np.ndarray] = {}
+		self.series:Dict[str,pd.Series] = {}
+
+
+	# Moves the cursor to the bar with index idx at a time of the backtest
+	def move(self, time:datetime.datetime, idx:Optional[int]):
+		self.time = time
+		self.idx = idx
+
+
+	# Returns the values of a column of the bars as a float64 array
+	def column(self, datatype:str) -> np.ndarray:
+		if datatype not in self.arrays:
+			self.arrays[datatype] = np.asarray(self.hist[datatype], dtype=np.float64)
+		return self.arrays[datatype]
+
+
+	# Returns the last length bars up to the cursor of a column (or all of the columns if datatype is None)
+	# as a Series (or DataFrame), which is a view of the cached bars
+	def slice(self, datatype:Optional[str], length:int) -> Union[pd.Series,pd.DataFrame]:
+		if datatype is None:
+			return self.hist[self.idx-length+1 : self.idx+1]
+		if datatype not in self.series:
+			self.series[datatype] = self.hist[datatype]
+		return self.series[datatype][self.idx-length+1 : self.idx+1]
@@ -0,0 +1,62 @@
+import datetime
+import numpy as np
+from typing import *
+from trader.Setup import *
+from trader.BarStore import *
+
+
+# Daily open/high/low/close for a universe of stocks, aligned to a list of trading days
+# Each field is a (stocks x days) float64 array. If a stock has no bar on a day,
+# the last bar before it is used (NaN if there is none).
+class BarPanel(object):
+
+	fields = ['open','high','low','close']
+
+	def __init__(self, days:Sequence[Date], stocks:Iterable[str]=(), store:Optional[BarStore]=None):
+		self.days:List[datetime.date] = [todate(day) for day in days]
+		self.store:BarStore = store if store is not None else BARSTORE
+		self.symbols:Dict[str,int] = {}
+		self.data:Dict[str,np.ndarray] = {field: np.zeros((0,len(self.days))) for field in BarPanel.fields}
+		self.add(stocks)
+
+
+	# Loads stocks that aren't in the panel yet
+	def add(self, stocks:Iterable[str]):
+		newstocks = []
+		for stock in stocks:
+			if stock not in self.symbols and stock not in newstocks:
+				newstocks.append(stock)
+		if len(newstocks) == 0 or len(self.days) == 0:
+			return
+		dayordinals = np.array([day.toordinal() for day in self.days])
+		rows:Dict[str,List[np.ndarray]] = {field: [] for field in BarPanel.fields}
+		for stock in newstocks:
+			hist = self.store.history(stock, self.days[0] - datetime.timedelta(days=10), self.days[-1], interval='day')
+			barordinals = np.array([date.toordinal() for date in hist.index.date], dtype=np.int64)
+			# Index of the last bar on or before each day
+			idx = np.searchsorted(barordinals, dayordinals, side='right') - 1
+			for field in BarPanel.fields:
+				values = np.asarray(hist[field], dtype=np.float64)
+				row = np.full(len(self.days), np.nan)
+				row[idx >= 0] = values[idx[idx >= 0]]
+				rows[field].append(row)
+			self.symbols[stock] = len(self.symbols)
+		for field in BarPanel.fields:
+			self.data[field] = np.vstack([self.data[field]] + rows[field])
+
+
+	# Returns the row indexes of the given stocks (loading any that are missing)
+	def rows(self, stocks:Sequence[str]) -> np.ndarray:
+		self.add(stocks)
+		return np.array([self.symbols[stock] for stock in stocks], dtype=np.int64)
+
+
+	# Returns an array of the field for each of the given stocks on the day with index dayidx
+	def get(self, field:str, stocks:Sequence[str], dayidx:int) -> np.ndarray:
+		rows = self.rows(stocks) # Before self.data[field], which loading the missing stocks replaces
+		return self.data[field][rows, dayidx]
+
+
+	# Returns the field for a single stock on the day with index dayidx
+	def price(self, stock:str, field:str, dayidx:int) -> float:
+		return float(self.get(field, [stock], dayidx)[0])
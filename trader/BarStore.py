@@ -0,0 +1,222 @@
+import os
+import datetime
+import threading
+import contextlib
+import numpy as np
+import pandas as pd
+from typing import *
+from trader.Setup import *
+try:
+	import fcntl # Locks the stored files between processes (not available on Windows)
+except ImportError:
+	fcntl = None
+
+TIMEZONE = 'America/New_York' # Timezone of the bar timestamps returned by the BROKER
+
+
+# Local store of historical bars, keyed by symbol and interval
+# Each (symbol, interval) is saved as one .npy file per column (int64 epoch timestamps, float64 prices),
+# which are memory-mapped when read. The date ranges that have already been downloaded are saved
+# alongside them, so only the missing date ranges are ever requested from the BROKER.
+# Processes that share the files (e.g. the workers of a sweep) hold a file lock on the folder of a symbol:
+# an exclusive one to download and save bars, and a shared one to open the files, so they never open
+# columns from different saves.
+class BarStore(object):
+
+	columns = ['open','high','low','close','volume']
+
+	def __init__(self, path:Optional[str]=None, fetch:Optional[Callable[[str,Date,Date,str],pd.DataFrame]]=None):
+		self.path:str = path if path is not None else os.path.join(DATADIR, 'bars')
+		self.fetch = fetch # function(stock, start, end, interval) -> DataFrame (defaults to Util.bars)
+		self.lock = threading.RLock()
+		self.arrays:Dict[Tuple[str,str],Dict[str,np.ndarray]] = {}
+		self.locked:Set[Tuple[str,str]] = set() # (stock, interval) that this process holds the exclusive file lock of
+
+
+	### PUBLIC METHODS ###
+
+
+	# Returns a DataFrame of bars from the start date to the end date (inclusive)
+	# Only the date ranges that aren't already stored are downloaded
+	def history(self, stock:str, start:Date, end:Date, interval:str='day') -> pd.DataFrame:
+		start, end = todate(start), todate(end)
+		self.update(stock, start, end, interval)
+		arrays = self.load(stock, interval)
+		times = arrays['time']
+		lo = np.searchsorted(times, daystart(start), side='left')
+		hi = np.searchsorted(times, daystart(end + datetime.timedelta(days=1)), side='left')
+		index = pd.to_datetime(times[lo:hi], utc=True).tz_convert(TIMEZONE)
+		return pd.DataFrame({col: arrays[col][lo:hi] for col in BarStore.columns}, index=index)
+
+
+	# Downloads and saves any bars from the start date to the end date (inclusive) that aren't stored yet
+	def update(self, stock:str, start:Date, end:Date, interval:str='day'):
+		start, end = todate(start), todate(end)
+		with self.lock:
+			gaps = self.missing(stock, start, end, interval)
+			if len(gaps) == 0:
+				return
+			with self.filelock(stock, interval, exclusive=True):
+				# Another process may have saved the bars since they were loaded
+				self.arrays.pop((stock, interval), None)
+				gaps = self.missing(stock, start, end, interval)
+				if len(gaps) == 0:
+					return
+				frames = [self.download(stock, gapstart, gapend, interval) for (gapstart, gapend) in gaps]
+				# Days before today are complete, so they never need to be downloaded again
+				today = currentdate().toordinal()
+				ranges = [(gapstart.toordinal(), min(gapend.toordinal(), today-1)) for (gapstart, gapend) in gaps]
+				ranges = [(lo, hi) for (lo, hi) in ranges if lo <= hi]
+				self.save(stock, interval, frames, ranges)
+
+
+	# Returns a list of (start, end) date ranges (inclusive) that aren't stored yet
+	def missing(self, stock:str, start:Date, end:Date, interval:str='day') -> List[Tuple[datetime.date,datetime.date]]:
+		first, last = todate(start).toordinal(), todate(end).toordinal()
+		gaps = []
+		cursor = first
+		for lo, hi in self.load(stock, interval)['ranges']:
+			if hi < cursor:
+				continue
+			if lo > last:
+				break
+			if lo > cursor:
+				gaps.append((cursor, lo-1))
+			cursor = max(cursor, hi+1)
+		if cursor <= last:
+			gaps.append((cursor, last))
+		return [(datetime.date.fromordinal(int(lo)), datetime.date.fromordinal(int(hi))) for (lo, hi) in gaps]
+
+
+	# Returns the stored arrays for a symbol and interval: 'time' (int64 ns since epoch, UTC),
+	# one float64 array per column, and 'ranges' (inclusive date ordinals that have been downloaded)
+	def load(self, stock:str, interval:str='day') -> Dict[str,np.ndarray]:
+		key = (stock, interval)
+		arrays = self.arrays.get(key)
+		if arrays is not None:
+			return arrays
+		with self.lock, self.filelock(stock, interval, exclusive=False):
+			folder = self.folder(stock, interval)
+			arrays = {}
+			if os.path.exists(os.path.join(folder, 'ranges.npy')):
+				for name in ['time', 'ranges'] + BarStore.columns:
+					arrays[name] = np.load(os.path.join(folder, name + '.npy'), mmap_mode='r')
+			else:
+				arrays['time'] = np.zeros(0, dtype=np.int64)
+				arrays['ranges'] = np.zeros((0,2), dtype=np.int64)
+				for col in BarStore.columns:
+					arrays[col] = np.zeros(0, dtype=np.float64)
+			self.arrays[key] = arrays
+			return arrays
+
+
+	### PRIVATE METHODS ###
+
+
+	# Merges new bars and downloaded date ranges into the stored files
+	def save(self, stock:str, interval:str, frames:List[pd.DataFrame], ranges:List[Tuple[int,int]]):
+		old = self.load(stock, interval)
+		times = [old['time']] + [frametimes(frame) for frame in frames]
+		cols = {col: [old[col]] + [framecolumn(frame, col) for frame in frames] for col in BarStore.columns}
+		times = np.concatenate(times)
+		# Newer downloads replace older bars with the same timestamp
+		order = np.argsort(times, kind='stable')
+		times = times[order]
+		keep = np.ones(len(times), dtype=bool)
+		keep[:-1] = times[1:] != times[:-1]
+		arrays = {'time': times[keep]}
+		for col in BarStore.columns:
+			arrays[col] = np.concatenate(cols[col])[order][keep]
+		arrays['ranges'] = mergeranges(np.concatenate([old['ranges'], np.array(ranges, dtype=np.int64).reshape(-1,2)]))
+		# Write to temporary files and swap them in, so readers never see a partial file
+		folder = self.folder(stock, interval)
+		os.makedirs(folder, exist_ok=True)
+		for name, array in arrays.items():
+			tmppath = os.path.join(folder, '%s.%d.tmp.npy' % (name, os.getpid()))
+			np.save(tmppath, array)
+			os.replace(tmppath, os.path.join(folder, name + '.npy'))
+		self.arrays.pop((stock, interval), None)
+
+
+	# Holds the file lock of a symbol and interval between processes (shared to read the files, exclusive to write them)
+	# The memory maps that are opened while it is held stay consistent after it is released, because saves replace the files.
+	@contextlib.contextmanager
+	def filelock(self, stock:str, interval:str, exclusive:bool):
+		key = (stock, interval)
+		folder = self.folder(stock, interval)
+		# Nothing to read yet, or this process is the one writing
+		if fcntl is None or key in self.locked or (not exclusive and not os.path.isdir(folder)):
+			yield
+			return
+		os.makedirs(folder, exist_ok=True)
+		with open(os.path.join(folder, 'lock'), 'a') as lockfile:
+			fcntl.flock(lockfile, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+			if exclusive:
+				self.locked.add(key)
+			try:
+				yield
+			finally:
+				self.locked.discard(key)
+				fcntl.flock(lockfile, fcntl.LOCK_UN)
+
+
+	def download(self, stock:str, start:datetime.date, end:datetime.date, interval:str) -> pd.DataFrame:
+		if self.fetch is not None:
+			return self.fetch(stock, start, end, interval)
+		from trader.Util import bars
+		return bars(stock, start, end, interval)
+
+
+	def folder(self, stock:str, interval:str) -> str:
+		return os.path.join(self.path, interval, stock.upper())
+
+
+
+# Converts a datetime or date to a date
+def todate(date:Date) -> datetime.date:
+	if isinstance(date, datetime.datetime):
+		return date.date()
+	return date
+
+
+# Returns the current date in the US/Eastern timezone
+def currentdate() -> datetime.date:
+	from trader.Util import getdatetime
+	return getdatetime().date()
+
+
+# Returns the timestamp (int64 ns since epoch) of the start of the given day
+def daystart(date:datetime.date) -> int:
+	return pd.Timestamp(datetime.datetime.combine(date, datetime.time(0,0))).tz_localize(TIMEZONE).value
+
+
+# Returns the timestamps (int64 ns since epoch) of the index of a DataFrame of bars
+def frametimes(frame:pd.DataFrame) -> np.ndarray:
+	index = pd.DatetimeIndex(frame.index)
+	if index.tz is None:
+		index = index.tz_localize(TIMEZONE)
+	return index.tz_convert('UTC').tz_localize(None).values.astype('datetime64[ns]').astype(np.int64)
+
+
+# Returns a column of a DataFrame of bars as float64 (NaN if the column is missing)
+def framecolumn(frame:pd.DataFrame, col:str) -> np.ndarray:
+	if col not in frame:
+		return np.full(len(frame), np.nan)
+	return np.asarray(frame[col], dtype=np.float64)
+
+
+# Merges overlapping or adjacent (start, end) ranges
+def mergeranges(ranges:np.ndarray) -> np.ndarray:
+	if len(ranges) == 0:
+		return ranges
+	ranges = ranges[np.argsort(ranges[:,0], kind='stable')]
+	merged = [list(ranges[0])]
+	for lo, hi in ranges[1:]:
+		if lo <= merged[-1][1] + 1:
+			merged[-1][1] = max(merged[-1][1], hi)
+		else:
+			merged.append([lo, hi])
+	return np.array(merged, dtype=np.int64)
+
+
+BARSTORE = BarStore()
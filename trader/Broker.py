@@ -0,0 +1,302 @@
+import abc
+import time
+import itertools
+import datetime
+import threading
+import logging
+import numpy as np
+import pandas as pd
+from typing import *
+from trader.Setup import *
+from trader.Clock import *
+from trader.Orders import *
+from trader.BarStore import *
+
+
+# Everything that the rest of the package asks of a BROKER
+# The Broker that is used is chosen by BROKER in Setup ('alpaca' or 'sim'), or set with setbroker
+class Broker(abc.ABC):
+
+	name = ''
+
+	# Sends an order. side: 'buy' or 'sell'. ordertype: 'market', 'limit', 'stop', 'stop_limit'
+	# Returns: the order (with its id in order.id)
+	@abc.abstractmethod
+	def submit(self, stock:str, amount:int, side:str, ordertype:str='market',
+					 stop:Optional[float]=None, limit:Optional[float]=None) -> Any:
+		raise NotImplementedError
+
+	# Returns: last trade price of a stock
+	@abc.abstractmethod
+	def lastprice(self, stock:str) -> float:
+		raise NotImplementedError
+
+	# Returns: DataFrame of bars from start to end (inclusive) with open, high, low, close, volume columns
+	@abc.abstractmethod
+	def bars(self, stock:str, start:Date, end:Date, interval:str='day') -> pd.DataFrame:
+		raise NotImplementedError
+
+	# Returns: {symbol: number of shares held}
+	@abc.abstractmethod
+	def positions(self) -> Dict[str,int]:
+		raise NotImplementedError
+
+	# Returns: {"value": total portfolio value, "cash": cash}
+	@abc.abstractmethod
+	def portfoliodata(self) -> Dict[str,float]:
+		raise NotImplementedError
+
+	# Returns: list of the trading days from start to end (inclusive)
+	@abc.abstractmethod
+	def calendar(self, start:datetime.date, end:datetime.date) -> List[datetime.date]:
+		raise NotImplementedError
+
+	# Returns: source of trade updates for a FillTracker (with start() and poll(orderid))
+	@abc.abstractmethod
+	def tradestream(self, tracker:FillTracker) -> Any:
+		raise NotImplementedError
+
+
+
+class AlpacaBroker(Broker):
+
+	name = 'alpaca'
+
+	def submit(self, stock:str, amount:int, side:str, ordertype:str='market',
+					 stop:Optional[float]=None, limit:Optional[float]=None) -> Any:
+		return API.submit_order(stock, amount, side=side, type=ordertype, time_in_force='day', limit_price=limit, stop_price=stop)
+
+	def lastprice(self, stock:str) -> float:
+		for n in range(10):
+			try:
+				cost = float(API.polygon.last_trade(stock).price)
+				return cost
+			except Exception as e:
+				logging.debug(e)
+				if n == 9:
+					raise RuntimeError(e)
+				time.sleep(2**n)
+
+	def bars(self, stock:str, start:Date, end:Date, interval:str='day') -> pd.DataFrame:
+		limit = 2500 if interval=='day' else 10 # Max number of days per request
+		frames = []
+		segstart = start
+		while segstart <= end:
+			segend = min(segstart + datetime.timedelta(days=limit-1), end)
+			hist = None
+			while hist is None:
+				try:
+					hist = API.polygon.historic_agg(interval, stock, _from=segstart.strftime("%Y-%m-%d"), to=segend.strftime("%Y-%m-%d")).df
+				# Keep trying if there is a network error
+				except ValueError as err:
+					logging.warning("Trying to fetch historical data: %s", err)
+					time.sleep(5)
+			frames.append(hist)
+			segstart = segend + datetime.timedelta(days=1)
+		if len(frames) == 0:
+			return pd.DataFrame(columns=['open','high','low','close','volume'])
+		return pd.concat(frames)
+
+	def positions(self) -> Dict[str,int]:
+		positions = {}
+		API._oauth = None
+		poslist = API.list_positions()
+		for pos in poslist:
+			positions[pos.symbol] = int(pos.qty)
+		return positions
+
+	def portfoliodata(self) -> Dict[str,float]:
+		return {"value": float(ACCOUNT.portfolio_value), "cash": float(ACCOUNT.buying_power)}
+
+	def calendar(self, start:datetime.date, end:datetime.date) -> List[datetime.date]:
+		calendar = API.get_calendar(start=start.strftime("%Y-%m-%d"), end=end.strftime("%Y-%m-%d"))
+		return [todate(day.date.to_pydatetime()) for day in calendar]
+
+	def tradestream(self, tracker:FillTracker) -> Any:
+		return AlpacaTradeStream(tracker)
+
+
+
+# An order in the SimBroker
+class SimOrder(object):
+
+	def __init__(self, id:str, stock:str, amount:int, side:str, ordertype:str, stop:Optional[float], limit:Optional[float]):
+		self.id = id
+		self.stock = stock
+		self.amount = amount
+		self.side = side
+		self.ordertype = ordertype
+		self.stop = stop
+		self.limit = limit
+		self.status = 'new'
+		self.filledqty = 0
+		self.filledprice:Optional[float] = None
+
+
+
+# In-process BROKER that replays stored bars, for running the live code paths without a network
+# The current time is getdatetime(). Only the bars that have ended by then are used, and the price is the close of the last one.
+# cash: starting cash of the simulated account
+# latency: seconds (of clock time) between submitting an order and its fill (0 fills it before submit returns)
+# slippage: fraction of the price that buys pay above it and sells receive below it
+# store: BarStore of the replayed bars (by default, the local bar files, downloading from Alpaca if they are missing)
+# interval: interval of the bars used for prices ('minute' or 'day')
+# Market orders always fill. Limit and stop orders fill if they are marketable when they are filled, otherwise they expire.
+class SimBroker(Broker):
+
+	name = 'sim'
+
+	def __init__(self, cash:float=100000.0, latency:float=0.0, slippage:float=0.0,
+				 store:Optional[BarStore]=None, interval:str='minute'):
+		self.cash:float = cash
+		self.latency:float = latency
+		self.slippage:float = slippage
+		self.store:BarStore = store if store is not None else BarStore(fetch=AlpacaBroker().bars)
+		self.interval:str = interval
+		self.stocks:Dict[str,int] = {}
+		self.orders:Dict[str,SimOrder] = {}
+		self.streams:List[LocalTradeStream] = []
+		self.ids = itertools.count(1)
+		self.updated:Set[Tuple[str,datetime.date]] = set() # (stock, date) that the store has been checked for
+		self.condition = threading.Condition()
+
+
+	def submit(self, stock:str, amount:int, side:str, ordertype:str='market',
+					 stop:Optional[float]=None, limit:Optional[float]=None) -> SimOrder:
+		number = next(self.ids)
+		order = SimOrder('sim-%d' % number, stock, int(amount), side, ordertype, stop, limit)
+		with self.condition:
+			self.orders[order.id] = order
+		if self.latency <= 0:
+			self.fill(order)
+			return order
+		# Filled by the Clock after the latency (in simulated time with a SimClock)
+		getclock().schedule(self.latency, lambda: self.fill(order))
+		return order
+
+
+	def lastprice(self, stock:str) -> float:
+		now = getnow()
+		self.prepare(stock, now.date())
+		arrays = self.store.load(stock, self.interval)
+		idx = np.searchsorted(arrays['time'], (pd.Timestamp(now).tz_localize(TIMEZONE) - barlength(self.interval)).value, side='right') - 1
+		if idx < 0:
+			raise ValueError("No stored bars of %s before %s" % (stock, now))
+		return float(arrays['close'][idx])
+
+
+	# Stored bars that have ended by the current time
+	def bars(self, stock:str, start:Date, end:Date, interval:str='day') -> pd.DataFrame:
+		hist = self.store.history(stock, start, end, interval)
+		now = pd.Timestamp(getnow()).tz_localize(TIMEZONE)
+		return hist[hist.index + barlength(interval) <= now]
+
+
+	def positions(self) -> Dict[str,int]:
+		with self.condition:
+			return {stock: amount for stock, amount in self.stocks.items() if amount != 0}
+
+
+	def portfoliodata(self) -> Dict[str,float]:
+		stocks = self.positions()
+		value = self.cash + sum(amount * self.lastprice(stock) for stock, amount in stocks.items())
+		return {"value": value, "cash": self.cash}
+
+
+	# Weekdays (the stored bars don't include holidays)
+	def calendar(self, start:datetime.date, end:datetime.date) -> List[datetime.date]:
+		days = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+		return [day for day in days if day.weekday() < 5]
+
+
+	def tradestream(self, tracker:FillTracker) -> LocalTradeStream:
+		stream = LocalTradeStream(tracker)
+		with self.condition:
+			self.streams.append(stream)
+		return stream
+
+
+	### PRIVATE METHODS ###
+
+
+	# Makes sure that the store has the bars of a stock on a date
+	def prepare(self, stock:str, date:datetime.date):
+		if (stock, date) in self.updated:
+			return
+		if len(self.store.missing(stock, date, date, self.interval)) > 0:
+			self.store.update(stock, date - datetime.timedelta(days=5), date, self.interval)
+		self.updated.add((stock, date))
+
+
+	# Fills (or rejects) an order at the current price, and reports it to the trade streams
+	def fill(self, order:SimOrder):
+		try:
+			cost = self.lastprice(order.stock)
+		except Exception as err:
+			logging.error("SimBroker can't fill %s: %s", order.id, err)
+			return self.finish(order, 'rejected')
+		sign = 1 if order.side == 'buy' else -1
+		cost *= (1 + sign * self.slippage)
+		# Limit and stop orders that aren't marketable expire
+		if order.limit is not None and sign * (cost - order.limit) > 0:
+			return self.finish(order, 'expired')
+		if order.stop is not None and sign * (cost - order.stop) < 0:
+			return self.finish(order, 'expired')
+		with self.condition:
+			if order.side == 'buy' and order.amount * cost > self.cash:
+				status = 'rejected'
+			elif order.side == 'sell' and order.amount > self.stocks.get(order.stock, 0):
+				status = 'rejected'
+			else:
+				status = 'filled'
+				self.cash -= sign * order.amount * cost
+				self.stocks[order.stock] = self.stocks.get(order.stock, 0) + sign * order.amount
+				order.filledqty = order.amount
+				order.filledprice = cost
+		self.finish(order, status)
+
+
+	def finish(self, order:SimOrder, status:str):
+		order.status = status
+		fill = Fill(order.id, status, float(order.filledqty), order.filledprice)
+		for stream in list(self.streams):
+			stream.tracker.update(fill)
+
+
+
+# Returns the length of the bars of an interval
+def barlength(interval:str) -> pd.Timedelta:
+	return pd.Timedelta(minutes=1) if interval == 'minute' else pd.Timedelta(days=1)
+
+
+# Returns the current time (US/Eastern, naive)
+def getnow() -> datetime.datetime:
+	from trader.Util import getdatetime
+	return getdatetime()
+
+
+CURRENTBROKER:Optional[Broker] = None
+BROKERLOCK = threading.Lock()
+
+# Returns the Broker that is being used (creating the one chosen by BROKER the first time)
+def getbroker() -> Broker:
+	global CURRENTBROKER
+	if CURRENTBROKER is None:
+		with BROKERLOCK:
+			if CURRENTBROKER is None:
+				CURRENTBROKER = SimBroker() if BROKER == 'sim' else AlpacaBroker()
+	return CURRENTBROKER
+
+
+# Changes the Broker that is used (e.g. to a SimBroker with some latency and slippage)
+def setbroker(broker:Broker):
+	global CURRENTBROKER
+	with BROKERLOCK:
+		CURRENTBROKER = broker
+	# Forget what came from the last Broker
+	FILLS.stream = None
+	FILLS.connected = False
+	from trader.Calendar import CALENDAR
+	from trader.Util import QUOTECACHE
+	CALENDAR.clear()
+	QUOTECACHE.clear()
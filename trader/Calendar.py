@@ -0,0 +1,157 @@
+import os
+import datetime
+import threading
+import numpy as np
+from typing import *
+from trader.Setup import *
+from trader.BarStore import todate, currentdate
+
+
+# Local index of the trading days in the BROKER's calendar
+# The trading days are kept as a sorted int64 array of date ordinals with a {date ordinal: position} map,
+# so ranges of trading days and "n trading days before/after" are array lookups.
+# The array and the range of dates that it covers are saved in DATADIR/calendar/<BROKER name>, so the
+# calendar is only downloaded again when a date outside of that range is requested.
+class TradingCalendar(object):
+
+	def __init__(self, path:Optional[str]=None, fetch:Optional[Callable[[datetime.date,datetime.date],List[datetime.date]]]=None):
+		self.path:Optional[str] = path # (defaults to a folder for the BROKER that is used)
+		self.fetch = fetch # function(start, end) -> list of trading days (defaults to the BROKER's calendar)
+		self.lock = threading.RLock()
+		self.days:Optional[np.ndarray] = None # sorted date ordinals of the trading days
+		self.positions:Dict[int,int] = {} # {date ordinal: index in days}
+		self.covered:Tuple[int,int] = (0,-1) # (first, last) date ordinals that have been downloaded
+
+
+	### PUBLIC METHODS ###
+
+
+	# Returns a list of the trading days from start to end (inclusive) as datetimes
+	def between(self, start:Date, end:Date) -> List[datetime.datetime]:
+		start, end = todate(start), todate(end)
+		self.update(start, end)
+		lo = np.searchsorted(self.days, start.toordinal(), side='left')
+		hi = np.searchsorted(self.days, end.toordinal(), side='right')
+		return [todatetime(day) for day in self.days[lo:hi]]
+
+
+	# Returns the trading day that is n trading days before the last trading day on or before end
+	def before(self, n:int, end:Date) -> datetime.datetime:
+		end = todate(end)
+		span = 2*n + 10
+		while True:
+			self.update(end - datetime.timedelta(days=span), end)
+			idx = np.searchsorted(self.days, end.toordinal(), side='right') - 1 - n
+			if idx >= 0:
+				return todatetime(self.days[idx])
+			if span > 365 * 100:
+				raise IndexError("There are not %d trading days before %s" % (n, end))
+			span *= 2
+
+
+	# Returns the trading day that is n trading days after the first trading day on or after start
+	def after(self, start:Date, n:int) -> datetime.datetime:
+		start = todate(start)
+		span = 2*n + 10
+		while True:
+			self.update(start, start + datetime.timedelta(days=span))
+			idx = np.searchsorted(self.days, start.toordinal(), side='left') + n
+			if idx < len(self.days):
+				return todatetime(self.days[idx])
+			if span > 365 * 10:
+				raise IndexError("There are not %d trading days after %s in the calendar" % (n, start))
+			span *= 2
+
+
+	# Returns True if the market is open on the given date
+	def istradingday(self, date:Date) -> bool:
+		date = todate(date)
+		self.update(date, date)
+		return date.toordinal() in self.positions
+
+
+	# Downloads the calendar if the dates from start to end (inclusive) aren't covered yet
+	def update(self, start:Date, end:Date):
+		first, last = todate(start).toordinal(), todate(end).toordinal()
+		if self.days is None:
+			self.load()
+		if self.covered[0] <= first and last <= self.covered[1]:
+			return
+		with self.lock:
+			if self.covered[0] <= first and last <= self.covered[1]:
+				return
+			# Download a wide range, so that the calendar rarely needs to be downloaded again
+			today = currentdate()
+			if self.covered[0] <= self.covered[1]:
+				first, last = min(first, self.covered[0]), max(last, self.covered[1])
+			first = min(first, today.toordinal() - 3650)
+			last = max(last, today.toordinal() + 365)
+			days = np.array(sorted(day.toordinal() for day in self.download(datetime.date.fromordinal(first), datetime.date.fromordinal(last))), dtype=np.int64)
+			# Future days that aren't in the calendar yet aren't covered
+			if len(days) > 0 and last > today.toordinal():
+				last = max(int(days[-1]), today.toordinal())
+			self.save(days, (first, last))
+
+
+	# Forgets the loaded calendar (it is loaded again on the next use)
+	def clear(self):
+		with self.lock:
+			self.days = None
+			self.positions = {}
+			self.covered = (0,-1)
+
+
+	### PRIVATE METHODS ###
+
+
+	def load(self):
+		with self.lock:
+			if self.days is not None:
+				return
+			days = np.zeros(0, dtype=np.int64)
+			covered = (0,-1)
+			folder = self.folder()
+			if os.path.exists(os.path.join(folder, 'covered.npy')):
+				days = np.load(os.path.join(folder, 'days.npy'))
+				covered = tuple(int(x) for x in np.load(os.path.join(folder, 'covered.npy')))
+			self.set(days, covered)
+
+
+	# Saves the trading days and the covered range, writing temporary files and swapping them in
+	def save(self, days:np.ndarray, covered:Tuple[int,int]):
+		folder = self.folder()
+		os.makedirs(folder, exist_ok=True)
+		for name, array in [('days', days), ('covered', np.array(covered, dtype=np.int64))]:
+			tmppath = os.path.join(folder, '%s.%d.tmp.npy' % (name, os.getpid()))
+			np.save(tmppath, array)
+			os.replace(tmppath, os.path.join(folder, name + '.npy'))
+		self.set(days, covered)
+
+
+	def set(self, days:np.ndarray, covered:Tuple[int,int]):
+		self.positions = {int(day): i for i, day in enumerate(days)}
+		self.days = days
+		self.covered = covered
+
+
+	def download(self, start:datetime.date, end:datetime.date) -> List[datetime.date]:
+		if self.fetch is not None:
+			return self.fetch(start, end)
+		from trader.Broker import getbroker
+		return getbroker().calendar(start, end)
+
+
+	def folder(self) -> str:
+		if self.path is not None:
+			return self.path
+		from trader.Broker import getbroker
+		return os.path.join(DATADIR, 'calendar', getbroker().name)
+
+
+
+# Converts a date ordinal to a datetime at midnight
+def todatetime(ordinal:int) -> datetime.datetime:
+	return datetime.datetime.fromordinal(int(ordinal))
+
+
+CALENDAR = TradingCalendar()
@@ -0,0 +1,125 @@
+import os
+import datetime
+import numpy as np
+import pandas as pd
+from typing import *
+
+# Columns of the charts of the algorithms and the Manager (chartminute, chartminutetimes, chartday, chartdaytimes)
+# A column is a growable NumPy array with the interface of a list (append, len, indexing, slicing, iteration, ==).
+# Each point takes 8 bytes (a list takes 32 for a float and 56 for a datetime).
+# array() (or np.asarray(column)) is a view of the points, without a copy.
+# path: file to keep the points in (a memory map), for long live sessions that shouldn't hold their charts in memory
+
+
+EPOCH = datetime.datetime(1970,1,1)
+
+
+class Column(object):
+
+	dtype = np.float64
+
+	def __init__(self, values:Iterable=(), path:Optional[str]=None):
+		self.path:Optional[str] = path
+		self.length:int = 0
+		self.data:np.ndarray = self.allocate(16)
+		self.extend(values)
+
+	def append(self, value):
+		if self.length == len(self.data):
+			self.resize(2 * len(self.data))
+		self.data[self.length] = self.encode(value)
+		self.length += 1
+
+	def extend(self, values:Iterable):
+		values = [self.encode(value) for value in values]
+		if self.length + len(values) > len(self.data):
+			self.resize(max(2 * len(self.data), self.length + len(values)))
+		self.data[self.length:self.length+len(values)] = values
+		self.length += len(values)
+
+	def clear(self):
+		self.length = 0
+
+	# View of the points as an array
+	def array(self) -> np.ndarray:
+		return self.data[:self.length]
+
+	def __array__(self, dtype=None, copy=None):
+		return self.array() if dtype is None else self.array().astype(dtype)
+
+	def __len__(self) -> int:
+		return self.length
+
+	def __getitem__(self, key):
+		if isinstance(key, slice):
+			return [self.decode(value) for value in self.array()[key]]
+		if key < -self.length or key >= self.length:
+			raise IndexError("Column index out of range")
+		return self.decode(self.array()[key])
+
+	def __iter__(self):
+		return (self.decode(value) for value in self.array())
+
+	def __eq__(self, other) -> bool:
+		try:
+			return len(self) == len(other) and list(self) == list(other)
+		except TypeError:
+			return False
+
+	def __repr__(self) -> str:
+		return repr(list(self))
+
+	def __getstate__(self):
+		return {'path': self.path, 'values': self.array().copy()}
+
+	def __setstate__(self, state):
+		self.path = state['path']
+		self.length = len(state['values'])
+		self.data = self.allocate(max(self.length, 16))
+		self.data[:self.length] = state['values']
+
+
+	### PRIVATE METHODS ###
+
+
+	def encode(self, value):
+		return value
+
+	def decode(self, value):
+		return float(value)
+
+	def allocate(self, size:int) -> np.ndarray:
+		if self.path is None:
+			return np.zeros(size, dtype=self.dtype)
+		with open(self.path, 'ab') as file:
+			file.truncate(size * np.dtype(self.dtype).itemsize)
+		return np.memmap(self.path, dtype=self.dtype, mode='r+', shape=(size,))
+
+	def resize(self, size:int):
+		if self.path is None:
+			data = self.allocate(size)
+			data[:self.length] = self.data[:self.length]
+			self.data = data
+		else:
+			self.data.flush()
+			self.data = self.allocate(size) # The file keeps the points
+
+
+
+# Column of naive datetimes (stored as nanoseconds since 1970)
+class TimeColumn(Column):
+
+	dtype = np.int64
+
+	# View of the times as a datetime64 array
+	def array(self) -> np.ndarray:
+		return self.data[:self.length].view('datetime64[ns]')
+
+	def index(self) -> pd.DatetimeIndex:
+		return pd.DatetimeIndex(self.array())
+
+	def encode(self, value):
+		return (value - EPOCH) // datetime.timedelta(microseconds=1) * 1000
+
+	def decode(self, value):
+		return EPOCH + datetime.timedelta(microseconds=int(value.astype(np.int64)) // 1000)
@@ -0,0 +1,136 @@
+import time
+import datetime
+import threading
+import heapq
+import itertools
+from pytz import timezone
+from typing import *
+
+
+# Source of the current time for the live code (getdatetime, Manager.run, order waits)
+# The times are naive datetimes in US/Eastern. Durations are in seconds of clock time.
+class Clock(object):
+
+	speed = 1.0 # Clock seconds per real second
+	fastforward = False # True if the time only moves forward when something waits (see SimClock)
+
+	def now(self) -> datetime.datetime:
+		return datetime.datetime.now(timezone('US/Eastern')).replace(tzinfo=None)
+
+	# Blocks until event is set or seconds have passed. Returns True if the event was set
+	def wait(self, event:threading.Event, seconds:float) -> bool:
+		return event.wait(max(seconds, 0))
+
+	# Waits on a condition (that the caller holds) for at most seconds. The caller checks what it is waiting for again afterwards
+	def waitcondition(self, condition:threading.Condition, seconds:float):
+		condition.wait(max(self.realseconds(seconds), 0))
+
+	def sleep(self, seconds:float):
+		time.sleep(max(seconds, 0))
+
+	# Calls function (in another thread) after seconds of clock time
+	def schedule(self, seconds:float, function:Callable[[],Any]):
+		timer = threading.Timer(max(self.realseconds(seconds), 0), function)
+		timer.daemon = True
+		timer.start()
+
+	# Converts seconds of clock time to real seconds
+	def realseconds(self, seconds:float) -> float:
+		return seconds / self.speed
+
+	# Seconds of clock time since some fixed point (for measuring durations)
+	def monotonic(self) -> float:
+		return time.monotonic()
+
+
+
+# Simulated clock that starts at a given time
+# speed: clock seconds per real second
+# fastforward: if True, the time doesn't pass by itself. It only moves when advance is called or
+#              when something waits on the clock (the wait returns right away, at the end of the wait).
+#              Manager.run jumps straight from one event to the next with it. The functions passed to schedule
+#              are called by the wait that moves the clock past their time, with the clock at that time.
+class SimClock(Clock):
+
+	def __init__(self, start:datetime.datetime, speed:float=1.0, fastforward:bool=False):
+		self.start:datetime.datetime = start
+		self.speed:float = speed
+		self.fastforward:bool = fastforward
+		self.realstart:float = time.monotonic()
+		self.offset:datetime.timedelta = datetime.timedelta(0) # time added by advance
+		self.lock = threading.Lock()
+		self.timers:List[Tuple[datetime.datetime,int,Callable[[],Any]]] = [] # heap of (time, number, function) when fastforward
+		self.ids = itertools.count()
+
+	def now(self) -> datetime.datetime:
+		with self.lock:
+			return self.current()
+
+	def wait(self, event:threading.Event, seconds:float) -> bool:
+		if self.fastforward:
+			end = self.now() + datetime.timedelta(seconds=max(seconds, 0))
+			while not event.is_set():
+				if not self.runtimer(end):
+					self.advance(end)
+					return False
+			return True
+		return event.wait(max(self.realseconds(seconds), 0))
+
+	def waitcondition(self, condition:threading.Condition, seconds:float):
+		if self.fastforward:
+			end = self.now() + datetime.timedelta(seconds=max(seconds, 0))
+			if not self.runtimer(end):
+				self.advance(end)
+			return
+		condition.wait(max(self.realseconds(seconds), 0))
+
+	def sleep(self, seconds:float):
+		self.wait(threading.Event(), seconds)
+
+	def schedule(self, seconds:float, function:Callable[[],Any]):
+		if self.fastforward:
+			with self.lock:
+				heapq.heappush(self.timers, (self.current() + datetime.timedelta(seconds=max(seconds, 0)), next(self.ids), function))
+			return
+		Clock.schedule(self, seconds, function)
+
+	# Calls the first scheduled function if it is due by end, after moving the clock to its time
+	# Returns False if there wasn't one
+	def runtimer(self, end:datetime.datetime) -> bool:
+		with self.lock:
+			if len(self.timers) == 0 or self.timers[0][0] > end:
+				return False
+			when, number, function = heapq.heappop(self.timers)
+		self.advance(when)
+		function()
+		return True
+
+	# Moves the clock forward to a time (or by a number of seconds)
+	def advance(self, to:Union[datetime.datetime,float]):
+		with self.lock:
+			if isinstance(to, datetime.datetime):
+				self.offset += max(to - self.current(), datetime.timedelta(0))
+			else:
+				self.offset += datetime.timedelta(seconds=max(to, 0))
+
+	def monotonic(self) -> float:
+		return (self.now() - self.start).total_seconds()
+
+	def current(self) -> datetime.datetime:
+		if self.fastforward:
+			return self.start + self.offset
+		return self.start + self.offset + datetime.timedelta(seconds=(time.monotonic() - self.realstart) * self.speed)
+
+
+
+CLOCK:Clock = Clock()
+
+# Returns the Clock that is being used
+def getclock() -> Clock:
+	return CLOCK
+
+
+# Changes the Clock that is used (e.g. to a SimClock to run the live loop in simulated time)
+def setclock(clock:Clock):
+	global CLOCK
+	CLOCK = clock
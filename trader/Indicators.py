@@ -0,0 +1,320 @@
+import math
+import collections
+import numpy as np
+import pandas as pd
+from typing import *
+
+# Streaming technical indicators
+# Each indicator is updated one bar at a time in O(1):
+# update(*bar) adds a bar and returns the indicator value for it
+# peek(*bar) returns the value that update would return, without adding the bar
+# The results are the same as the ta library over all of the bars passed to update.
+
+
+# Exponential moving average. Same as pandas ewm(alpha=alpha, min_periods=minperiods).mean()
+class EMA(object):
+	def __init__(self, span:Optional[float]=None, alpha:Optional[float]=None, minperiods:int=0):
+		self.alpha:float = alpha if alpha is not None else 2.0 / (span + 1.0)
+		self.minperiods:int = minperiods
+		self.state:Tuple[float,float,int] = (0.0, 0.0, 0) # (weighted sum, sum of weights, number of values)
+
+	def step(self, x:float) -> Tuple[float,float,int]:
+		num, den, count = self.state
+		num *= (1 - self.alpha)
+		den *= (1 - self.alpha)
+		if not math.isnan(x):
+			num += x
+			den += 1
+			count += 1
+		return (num, den, count)
+
+	def value(self, state:Tuple[float,float,int]) -> float:
+		num, den, count = state
+		if count < max(self.minperiods, 1):
+			return np.nan
+		return num / den
+
+	def update(self, x:float) -> float:
+		self.state = self.step(x)
+		return self.value(self.state)
+
+	def peek(self, x:float) -> float:
+		return self.value(self.step(x))
+
+
+# Simple moving average and standard deviation (ddof=0) of the last window values
+# Same as pandas rolling(window, min_periods=0)
+class Rolling(object):
+	def __init__(self, window:int):
+		self.window:int = window
+		self.values:Deque[float] = collections.deque()
+		self.state:Tuple[float,float,int] = (0.0, 0.0, 0) # (sum, sum of squares, number of values)
+
+	def step(self, x:float) -> Tuple[float,float,int]:
+		total, squares, count = self.state
+		if len(self.values) == self.window:
+			old = self.values[0]
+			if not math.isnan(old):
+				total -= old
+				squares -= old * old
+				count -= 1
+		if not math.isnan(x):
+			total += x
+			squares += x * x
+			count += 1
+		return (total, squares, count)
+
+	def result(self, state:Tuple[float,float,int]) -> Tuple[float,float]:
+		total, squares, count = state
+		if count == 0:
+			return (np.nan, np.nan)
+		mean = total / count
+		return (mean, math.sqrt(max(squares / count - mean * mean, 0.0)))
+
+	def update(self, x:float) -> Tuple[float,float]:
+		self.state = self.step(x)
+		if len(self.values) == self.window:
+			self.values.popleft()
+		self.values.append(x)
+		return self.result(self.state)
+
+	def peek(self, x:float) -> Tuple[float,float]:
+		return self.result(self.step(x))
+
+
+# Maximum (or minimum if sign=-1) of the last window values. Same as pandas rolling(window, min_periods=0).max()
+class RollingMax(object):
+	def __init__(self, window:int, sign:int=1):
+		self.window:int = window
+		self.sign:int = sign
+		self.count:int = 0
+		self.candidates:Deque[Tuple[int,float]] = collections.deque() # (index, sign*value), decreasing values
+
+	def expire(self):
+		while len(self.candidates) > 0 and self.candidates[0][0] <= self.count - self.window:
+			self.candidates.popleft()
+
+	def update(self, x:float) -> float:
+		self.expire()
+		if not math.isnan(x):
+			while len(self.candidates) > 0 and self.candidates[-1][1] <= self.sign * x:
+				self.candidates.pop()
+			self.candidates.append((self.count, self.sign * x))
+		self.count += 1
+		if len(self.candidates) == 0:
+			return np.nan
+		return self.sign * self.candidates[0][1]
+
+	def peek(self, x:float) -> float:
+		best = np.nan if math.isnan(x) else self.sign * x
+		for index, value in self.candidates:
+			if index > self.count - self.window:
+				if math.isnan(best) or value > best:
+					best = value
+				break
+		return self.sign * best
+
+
+# MACD diff: (fast EMA - slow EMA) - signal EMA of that difference. Same as ta.trend.macd_diff
+class MACD(object):
+	def __init__(self, fast:int=12, slow:int=26, sign:int=9):
+		self.fast = EMA(span=fast, minperiods=fast)
+		self.slow = EMA(span=slow, minperiods=slow)
+		self.sign = EMA(span=sign, minperiods=sign)
+
+	def update(self, x:float) -> float:
+		macd = self.fast.update(x) - self.slow.update(x)
+		return macd - self.sign.update(macd)
+
+	def peek(self, x:float) -> float:
+		macd = self.fast.peek(x) - self.slow.peek(x)
+		return macd - self.sign.peek(macd)
+
+
+# Wilder RSI on a scale of [0,100]. Same as ta.momentum.rsi
+class RSI(object):
+	def __init__(self, window:int=14):
+		self.up = EMA(alpha=1.0/window)
+		self.down = EMA(alpha=1.0/window)
+		self.last:float = np.nan
+
+	def changes(self, x:float) -> Tuple[float,float]:
+		diff = x - self.last
+		return (max(diff, 0.0), max(-diff, 0.0)) if not math.isnan(diff) else (np.nan, np.nan)
+
+	def result(self, up:float, down:float) -> float:
+		if math.isnan(up) or up + down == 0:
+			return np.nan
+		return 100 * up / (up + down)
+
+	def update(self, x:float) -> float:
+		gain, loss = self.changes(x)
+		self.last = x
+		return self.result(self.up.update(gain), self.down.update(loss))
+
+	def peek(self, x:float) -> float:
+		gain, loss = self.changes(x)
+		return self.result(self.up.peek(gain), self.down.peek(loss))
+
+
+# Number of standard deviations from the moving average, in units of ndev. Same as Algorithm.bollinger with ta
+class Bollinger(object):
+	def __init__(self, window:int=20, ndev:float=2):
+		self.rolling = Rolling(window)
+		self.ndev = ndev
+
+	def result(self, x:float, mean:float, std:float) -> float:
+		if math.isnan(std) or std == 0:
+			return np.nan
+		return (x - mean) / (self.ndev * std)
+
+	def update(self, x:float) -> float:
+		return self.result(x, *self.rolling.update(x))
+
+	def peek(self, x:float) -> float:
+		return self.result(x, *self.rolling.peek(x))
+
+
+# Moving average. matype = 0 means simple, matype = 1 means exponential
+# Same as ta.volatility.bollinger_mavg and ta.trend.ema_indicator
+class MA(object):
+	def __init__(self, window:int=12, matype:int=0):
+		self.matype = matype
+		self.average = Rolling(window) if matype == 0 else EMA(span=window, minperiods=window)
+
+	def update(self, x:float) -> float:
+		value = self.average.update(x)
+		return value[0] if self.matype == 0 else value
+
+	def peek(self, x:float) -> float:
+		value = self.average.peek(x)
+		return value[0] if self.matype == 0 else value
+
+
+# Stochastic oscillator on a scale of [0,100]. Same as ta.momentum.stoch
+class Stoch(object):
+	def __init__(self, window:int=14):
+		self.high = RollingMax(window)
+		self.low = RollingMax(window, sign=-1)
+
+	def result(self, close:float, high:float, low:float) -> float:
+		if math.isnan(high) or math.isnan(low) or high == low:
+			return np.nan
+		return 100 * (close - low) / (high - low)
+
+	def update(self, high:float, low:float, close:float) -> float:
+		return self.result(close, self.high.update(high), self.low.update(low))
+
+	def peek(self, high:float, low:float, close:float) -> float:
+		return self.result(close, self.high.peek(high), self.low.peek(low))
+
+
+# The output series of a streaming indicator for one stock
+# The newest bar is only peeked, since it can still change (e.g. the current day in live trading).
+# It is added to the indicator once a newer bar arrives.
+class IndicatorStream(object):
+	def __init__(self, indicator:Any, name:Optional[str]=None):
+		self.indicator = indicator
+		self.name = name
+		self.times:List[pd.Timestamp] = [] # timestamps of the bars added to the indicator
+		self.values:List[float] = []
+		self.pending:Optional[Tuple[pd.Timestamp,float]] = None # (timestamp, value) of the newest bar
+		self.keep:int = 1 # number of values to keep
+
+	def __len__(self) -> int:
+		return len(self.values) + (1 if self.pending is not None else 0)
+
+	# Timestamp of the last bar that was added to the indicator
+	def lasttime(self) -> Optional[pd.Timestamp]:
+		return self.times[-1] if len(self.times) > 0 else None
+
+	# Timestamp of the newest bar
+	def newesttime(self) -> Optional[pd.Timestamp]:
+		return self.pending[0] if self.pending is not None else self.lasttime()
+
+	# Adds bars that are newer than lasttime. columns are the inputs of the indicator, aligned with times
+	def add(self, times:Sequence[pd.Timestamp], columns:Sequence[np.ndarray]):
+		lasttime = self.lasttime()
+		for i in range(len(times)):
+			if lasttime is not None and times[i] <= lasttime:
+				continue
+			bar = [column[i] for column in columns]
+			if i == len(times) - 1:
+				self.pending = (times[i], self.indicator.peek(*bar))
+			else:
+				self.times.append(times[i])
+				self.values.append(self.indicator.update(*bar))
+
+	# Returns the last length values as a Series indexed by timestamp
+	def last(self, length:int) -> pd.Series:
+		self.keep = max(self.keep, length)
+		# Drop values that will not be returned, so the stream doesn't grow forever
+		if len(self.values) > 2 * self.keep + 100:
+			del self.times[:-self.keep]
+			del self.values[:-self.keep]
+		times = self.times[-length:]
+		values = self.values[-length:]
+		if self.pending is not None:
+			times = (times + [self.pending[0]])[-length:]
+			values = (values + [self.pending[1]])[-length:]
+		return pd.Series(values, index=pd.DatetimeIndex(times), name=self.name, dtype=np.float64)
+
+
+
+# Indicators of many stocks at once (used by Algorithm.indicators)
+# Each takes a function that returns the (times x stocks) DataFrame of a field and the parameters of the
+# Algorithm method of the same name (except matype, which macd and bollinger ignore), and returns a (times x stocks)
+# DataFrame computed on all of the columns at once.
+# The results are the same as a freshly warmed-up call of the method: the streaming macd, rsi and ma (matype=1)
+# of an Algorithm depend on when their stream started, so they can differ from a stream that has run for longer.
+
+
+def macdtable(field:Callable[[str],pd.DataFrame], fastmawindow:int=12, slowmawindow:int=26, signalmawindow:int=9,
+			  datatype:str='close') -> pd.DataFrame:
+	prices = field(datatype)
+	macd = prices.ewm(span=fastmawindow, min_periods=fastmawindow).mean() - prices.ewm(span=slowmawindow, min_periods=slowmawindow).mean()
+	return macd - macd.ewm(span=signalmawindow, min_periods=signalmawindow).mean()
+
+
+def bollingertable(field:Callable[[str],pd.DataFrame], mawindow:int=20, ndev:float=2, datatype:str='close') -> pd.DataFrame:
+	prices = field(datatype)
+	rolling = prices.rolling(mawindow, min_periods=1)
+	std = rolling.std(ddof=0)
+	return ((prices - rolling.mean()) / (ndev * std)).where(std > 0)
+
+
+# On a scale of [-1,1] like Algorithm.rsi
+def rsitable(field:Callable[[str],pd.DataFrame], window:int=20, datatype:str='close') -> pd.DataFrame:
+	diff = field(datatype).diff()
+	up = diff.clip(lower=0).ewm(alpha=1.0/window).mean()
+	down = (-diff).clip(lower=0).ewm(alpha=1.0/window).mean()
+	return ((100 * up / (up + down)).where(up + down != 0) - 50) / 50
+
+
+def matable(field:Callable[[str],pd.DataFrame], mawindow:int=12, matype:int=0, datatype:str='close') -> pd.DataFrame:
+	prices = field(datatype)
+	if matype == 0:
+		return prices.rolling(mawindow, min_periods=1).mean()
+	return prices.ewm(span=mawindow, min_periods=mawindow).mean()
+
+
+# On a scale of [-1,1] like Algorithm.stoch
+def stochtable(field:Callable[[str],pd.DataFrame], window:int=14) -> pd.DataFrame:
+	high = field('high').rolling(window, min_periods=1).max()
+	low = field('low').rolling(window, min_periods=1).min()
+	return ((100 * (field('close') - low) / (high - low)).where(high != low) - 50) / 50
+
+
+def fractionchangetable(field:Callable[[str],pd.DataFrame], datatype:str='close') -> pd.DataFrame:
+	return field(datatype).pct_change(fill_method=None)
+
+
+# {name: (table function, number of extra bars that it needs before the first value)}
+TABLES:Dict[str,Tuple[Callable[...,pd.DataFrame],Callable[...,int]]] = {
+	'macd': (macdtable, lambda slowmawindow=26, signalmawindow=9, **params: slowmawindow+signalmawindow),
+	'bollinger': (bollingertable, lambda mawindow=20, **params: mawindow),
+	'rsi': (rsitable, lambda window=20, **params: window+1),
+	'ma': (matable, lambda mawindow=12, **params: mawindow),
+	'stoch': (stochtable, lambda window=14, **params: window),
+	'fractionchange': (fractionchangetable, lambda **params: 1),
+}
@@ -0,0 +1,103 @@
+import math
+import collections
+import numpy as np
+from typing import *
+
+# Online risk metrics of a portfolio
+# Each daily value is added in O(1) (O(window) for the drawdown of a rolling window).
+# The results are the same as empyrical over the daily returns:
+# alpha_beta (against the benchmark's daily returns), sharpe_ratio, annual_volatility and max_drawdown
+
+
+DAYSPERYEAR = 252
+
+
+# Running sums of some values, optionally over the last window values only
+class Sums(object):
+	def __init__(self, size:int, window:Optional[int]=None):
+		self.window:Optional[int] = window
+		self.values:Deque[Tuple[float,...]] = collections.deque()
+		self.sums:List[float] = [0.0] * size
+		self.count:int = 0
+
+	def add(self, *values:float):
+		for i, value in enumerate(values):
+			self.sums[i] += value
+		self.count += 1
+		if self.window is not None:
+			self.values.append(values)
+			if len(self.values) > self.window:
+				for i, value in enumerate(self.values.popleft()):
+					self.sums[i] -= value
+				self.count -= 1
+
+	def means(self) -> List[float]:
+		return [total / self.count for total in self.sums]
+
+
+# Metrics of the daily values of a portfolio
+# window: number of days of the rolling window that the metrics are over (None for all of the days)
+# update(value, benchmark) adds the value at the end of a day (benchmark is the daily return of the benchmark,
+# or None if it isn't known, in which case the day is left out of alpha and beta)
+class RiskMetrics(object):
+	def __init__(self, window:Optional[int]=None):
+		self.window:Optional[int] = window
+		self.count:int = 0 # number of values added
+		self.last:float = np.nan
+		self.returns = Sums(2, window) # (return, return^2)
+		self.pairs = Sums(4, window) # (return, benchmark return, benchmark return^2, return * benchmark return)
+		self.peak:float = np.nan
+		self.drawdown:float = 0.0
+		self.recent:Deque[float] = collections.deque(maxlen=window+1 if window is not None else 1) # values of the window
+
+	def update(self, value:float, benchmark:Optional[float]=None):
+		self.count += 1
+		if not math.isnan(self.last) and self.last != 0:
+			change = value / self.last - 1
+			self.returns.add(change, change * change)
+			if benchmark is not None and not math.isnan(benchmark):
+				self.pairs.add(change, benchmark, benchmark * benchmark, change * benchmark)
+		self.last = value
+		self.recent.append(value)
+		if self.window is None:
+			self.peak = value if math.isnan(self.peak) else max(self.peak, value)
+			if self.peak != 0:
+				self.drawdown = min(self.drawdown, (value - self.peak) / self.peak)
+
+	# Returns (alpha, beta) (annualized alpha)
+	def alphabeta(self) -> Tuple[float,float]:
+		if self.pairs.count == 0:
+			return (np.nan, np.nan)
+		change, benchmark, benchmarksquared, product = self.pairs.means()
+		variance = benchmarksquared - benchmark * benchmark
+		if variance <= 0:
+			return (np.nan, np.nan)
+		beta = (product - change * benchmark) / variance
+		return ((change - beta * benchmark + 1) ** DAYSPERYEAR - 1, beta)
+
+	# Standard deviation (ddof=1) of the daily returns
+	def deviation(self) -> float:
+		if self.returns.count < 2:
+			return np.nan
+		total, squares = self.returns.sums
+		count = self.returns.count
+		return math.sqrt(max((squares - total * total / count) / (count - 1), 0.0))
+
+	def sharpe(self) -> float:
+		deviation = self.deviation()
+		if math.isnan(deviation) or deviation == 0:
+			return np.nan
+		return self.returns.means()[0] / deviation * math.sqrt(DAYSPERYEAR)
+
+	def volatility(self) -> float:
+		return self.deviation() * math.sqrt(DAYSPERYEAR)
+
+	# Largest fall from a peak, as a (negative) fraction of the peak
+	def maxdrawdown(self) -> float:
+		if self.window is None:
+			return self.drawdown
+		values = np.asarray(self.recent, dtype=np.float64)
+		peaks = np.maximum.accumulate(values)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			drawdowns = (values - peaks) / peaks
+		return float(min(np.nanmin(drawdowns), 0.0)) if len(values) > 0 else 0.0
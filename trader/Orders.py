@@ -0,0 +1,192 @@
+import asyncio
+import threading
+import logging
+import concurrent.futures
+from typing import *
+from trader.Setup import *
+from trader.Clock import *
+
+
+# The state of an order after a trade update
+class Fill(object):
+
+	done = {'filled', 'canceled', 'expired', 'rejected', 'done_for_day', 'replaced'} # Statuses after which an order won't fill any more
+
+	def __init__(self, orderid:str, status:str, filledqty:float=0.0, filledprice:Optional[float]=None):
+		self.orderid:str = orderid
+		self.status:str = status
+		self.filledqty:float = filledqty # Total number of shares filled so far
+		self.filledprice:Optional[float] = filledprice # Average price of the filled shares
+
+	def isdone(self) -> bool:
+		return self.status in Fill.done
+
+	def __repr__(self):
+		return "Fill(%s, %s, %s @ %s)" % (self.orderid, self.status, self.filledqty, self.filledprice)
+
+
+# Tracks the fills of orders from a stream of trade updates, and wakes up the threads waiting for them
+# stream: source of trade updates with start() and poll(orderid) (from the BROKER by default, LocalTradeStream in tests)
+# Waiting threads also poll the order: right away (it can fill before the stream has subscribed), and then every
+# pollinterval seconds if the stream isn't connected, or every streampollinterval seconds in case it missed an update
+class FillTracker(object):
+
+	def __init__(self, stream:Optional[Any]=None):
+		self.stream = stream
+		self.connected:bool = False
+		self.condition = threading.Condition()
+		self.fills:Dict[str,Fill] = {} # {order id: latest fill}
+		self.pollinterval:float = 1.0
+		self.streampollinterval:float = 5.0
+
+	# Starts the trade update stream of the BROKER (if it isn't running yet)
+	def start(self):
+		with self.condition:
+			if self.stream is None:
+				from trader.Broker import getbroker
+				self.stream = getbroker().tradestream(self)
+			stream = self.stream
+		if stream is not None and not self.connected:
+			stream.start()
+
+	# Called by the stream for every trade update
+	def update(self, fill:Fill):
+		with self.condition:
+			self.fills.pop(fill.orderid, None)
+			self.fills[fill.orderid] = fill
+			# Forget the oldest orders
+			while len(self.fills) > 1000:
+				del self.fills[next(iter(self.fills))]
+			self.condition.notify_all()
+
+	# Blocks until the order is done (or has any fill if partial=True), or until timeout seconds (of clock time) have passed
+	# The time is measured and waited on with the Clock, so a fastforward SimClock jumps to the fill (or the timeout)
+	# Returns the latest Fill of the order (None if there was no update)
+	def wait(self, orderid:str, timeout:float=60, partial:bool=False) -> Optional[Fill]:
+		clock = getclock()
+		deadline = clock.monotonic() + timeout
+		nextpoll = clock.monotonic()
+		with self.condition:
+			while True:
+				fill = self.fills.get(orderid)
+				if fill is not None and (fill.isdone() or (partial and fill.filledqty > 0)):
+					return fill
+				now = clock.monotonic()
+				if now >= deadline:
+					break
+				if now >= nextpoll:
+					nextpoll = now + (self.streampollinterval if self.connected else self.pollinterval)
+					self.condition.release()
+					try:
+						self.poll(orderid)
+					finally:
+						self.condition.acquire()
+					continue
+				clock.waitcondition(self.condition, min(deadline, nextpoll) - now)
+		# Check BROKER once more in case the update was missed
+		self.poll(orderid)
+		return self.fills.get(orderid)
+
+	# Gets the state of an order from the stream's BROKER
+	def poll(self, orderid:str):
+		if self.stream is not None:
+			self.stream.poll(orderid)
+
+
+# Receives trade updates from the Alpaca websocket in a background thread
+class AlpacaTradeStream(object):
+
+	def __init__(self, tracker:FillTracker):
+		self.tracker = tracker
+		self.thread:Optional[threading.Thread] = None
+
+	def start(self):
+		if self.thread is not None and self.thread.is_alive():
+			return
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+
+	def run(self):
+		import alpaca_trade_api as tradeapi
+		asyncio.set_event_loop(asyncio.new_event_loop())
+		try:
+			alpacaid, alpacakey = alpacakeys()
+			# The tracker is connected once the stream has subscribed to trade_updates (its 'listening' message)
+			if hasattr(tradeapi, 'StreamConn'):
+				conn = tradeapi.StreamConn(alpacaid, alpacakey, base_url=ALPACA_URL)
+				conn.on(r'^trade_updates$')(self.ontradeupdate)
+				conn.on(r'^listening$')(self.onlistening)
+				conn.run(['trade_updates'])
+			else:
+				conn = tradeapi.Stream(alpacaid, alpacakey, base_url=ALPACA_URL)
+				conn.subscribe_trade_updates(self.ontradeupdate)
+				# Stream only passes trade_updates to handlers, so its other messages are looked at before they are dispatched
+				trading = conn._trading_ws
+				dispatch = trading._dispatch
+				async def ondispatch(msg):
+					if msg.get('stream') == 'listening':
+						await self.onlistening(msg.get('data') or {})
+					await dispatch(msg)
+				trading._dispatch = ondispatch
+				conn.run()
+		except Exception as err:
+			logging.error("Trade update stream stopped: %s", err)
+		finally:
+			self.tracker.connected = False
+
+	def poll(self, orderid:str):
+		try:
+			order = API.get_order(orderid)
+			self.tracker.update(Fill(order.id, order.status, float(order.filled_qty or 0),
+									 float(order.filled_avg_price) if order.filled_avg_price else None))
+		except Exception as err:
+			logging.debug(err)
+
+	# Handler for the reply to the subscription (the last argument is its data: {'streams': [...]})
+	async def onlistening(self, *args):
+		data = args[-1]
+		streams = data.get('streams', []) if isinstance(data, dict) else getattr(data, 'streams', [])
+		if 'trade_updates' in streams:
+			self.tracker.connected = True
+
+	# Handler for trade_updates (the last argument is the update)
+	async def ontradeupdate(self, *args):
+		order = args[-1].order
+		filledprice = order.get('filled_avg_price')
+		self.tracker.update(Fill(order['id'], order['status'], float(order.get('filled_qty') or 0),
+								 float(filledprice) if filledprice else None))
+
+
+# Trade update stream that is driven by hand, for tests and simulations
+class LocalTradeStream(object):
+
+	def __init__(self, tracker:FillTracker):
+		self.tracker = tracker
+		tracker.stream = self
+
+	def start(self):
+		self.tracker.connected = True
+
+	def poll(self, orderid:str):
+		pass
+
+	# Fills qty shares of an order (in total so far) at an average price
+	def fill(self, orderid:str, qty:float, price:float, partial:bool=False):
+		self.tracker.update(Fill(orderid, 'partially_filled' if partial else 'filled', qty, price))
+
+	def cancel(self, orderid:str):
+		fill = self.tracker.fills.get(orderid)
+		self.tracker.update(Fill(orderid, 'canceled', fill.filledqty if fill else 0.0, fill.filledprice if fill else None))
+
+
+# Returns a future that is already done with the given result
+def donefuture(result:Any=None) -> concurrent.futures.Future:
+	future:concurrent.futures.Future = concurrent.futures.Future()
+	future.set_result(result)
+	return future
+
+
+FILLS = FillTracker()
+
+# Threads that wait for the fills of asynchronous orders
+ORDERPOOL = concurrent.futures.ThreadPoolExecutor(max_workers=20)
@@ -1,59 +1,138 @@
+import os
 import datetime
-import pkg_resources
 import json
-from pytrends.request import TrendReq # Google Searches
-import alpaca_trade_api as tradeapi
+import threading
 import logging
 from typing import *
 Date = Union[datetime.datetime, datetime.date] # Datetime Type
 
 PAPERTRADE = True
-BROKER = "alpaca"
+BROKER = "alpaca" # "alpaca", or "sim" to replay stored bars in a simulated account (see Broker.SimBroker)
+DATADIR = os.path.join(os.path.expanduser("~"), ".desktoptrader") # Local storage for historical data
+QUOTETTL = 1.0 # Seconds that a price is reused by all algorithms before it is requested again
+ALPACA_URL = 'https://api.alpaca.markets' if not PAPERTRADE else 'https://paper-api.alpaca.markets'
+
+# Nothing below runs on import. The credentials, BROKER clients and log handlers are
+# set up the first time that they are used, so backtests and tools start without any network access.
+
+
+# Stands in for an object that is only created when it is first used
+# make: function that creates the object
+class Lazy(object):
+
+	def __init__(self, make:Callable[[],Any]):
+		object.__setattr__(self, 'make', make)
+		object.__setattr__(self, 'lock', threading.Lock())
+		object.__setattr__(self, 'obj', None)
+
+	# Returns the object (creating it if this is the first use)
+	def get(self) -> Any:
+		obj = object.__getattribute__(self, 'obj')
+		if obj is None:
+			with object.__getattribute__(self, 'lock'):
+				obj = object.__getattribute__(self, 'obj')
+				if obj is None:
+					setuplogging()
+					obj = object.__getattribute__(self, 'make')()
+					object.__setattr__(self, 'obj', obj)
+		return obj
+
+	def __getattr__(self, name:str) -> Any:
+		return getattr(self.get(), name)
+
+	def __setattr__(self, name:str, value:Any):
+		setattr(self.get(), name, value)
+
+	def __getitem__(self, key:Any) -> Any:
+		return self.get()[key]
+
+	def __setitem__(self, key:Any, value:Any):
+		self.get()[key] = value
+
+	def __contains__(self, key:Any) -> bool:
+		return key in self.get()
+
+	def __iter__(self) -> Iterator:
+		return iter(self.get())
+
+	def __len__(self) -> int:
+		return len(self.get())
+
+	def __repr__(self) -> str:
+		return repr(self.get())
+
 
 # Get Credentials
-CREDS:Dict[str,str] = {}
-credential_file = pkg_resources.resource_filename(__name__, "creds.txt")
-try:
-	with open(credential_file, "r") as f:
-		CREDS = json.load(f)
-except IOError:
-	CREDS['Email Address'] = input('Email Address: ')
-	CREDS['Email Password'] = input('Email Password: ')
-	if BROKER == 'alpaca':
-		CREDS['Alpaca ID'] = input('Alpaca ID: ')
-		CREDS['Alpaca Secret Key'] = input('Alpaca Secret Key: ')
-		CREDS['Alpaca Paper ID'] = input('Alpaca ID: ')
-		CREDS['Alpaca Paper Secret Key'] = input('Alpaca Secret Key: ')
-	with open(credential_file, "w") as f:
-		json.dump(CREDS,f)
-except PermissionError:
-	logging.error("Inadequate permissions to read credentials file.")
-	exit(-1)
+def loadcreds() -> Dict[str,str]:
+	creds:Dict[str,str] = {}
+	credential_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "creds.txt")
+	try:
+		with open(credential_file, "r") as f:
+			creds = json.load(f)
+	except IOError:
+		creds['Email Address'] = input('Email Address: ')
+		creds['Email Password'] = input('Email Password: ')
+		if BROKER == 'alpaca':
+			creds['Alpaca ID'] = input('Alpaca ID: ')
+			creds['Alpaca Secret Key'] = input('Alpaca Secret Key: ')
+			creds['Alpaca Paper ID'] = input('Alpaca ID: ')
+			creds['Alpaca Paper Secret Key'] = input('Alpaca Secret Key: ')
+		with open(credential_file, "w") as f:
+			json.dump(creds,f)
+	except PermissionError:
+		logging.error("Inadequate permissions to read credentials file.")
+		exit(-1)
+	return creds
+
+
+# Returns the (ID, secret key) of the Alpaca account that is being traded
+def alpacakeys() -> Tuple[str,str]:
+	if not PAPERTRADE:
+		return (CREDS['Alpaca ID'], CREDS['Alpaca Secret Key'])
+	return (CREDS['Alpaca Paper ID'], CREDS['Alpaca Paper Secret Key'])
+
 
 # Set Up Alpaca API
-if BROKER == 'alpaca':
-	API = tradeapi.REST(CREDS['Alpaca ID'] if not PAPERTRADE else CREDS['Alpaca Paper ID'], 
-						CREDS['Alpaca Secret Key'] if not PAPERTRADE else CREDS['Alpaca Paper Secret Key'],
-						base_url='https://api.alpaca.markets' if not PAPERTRADE else 'https://paper-api.alpaca.markets', 
-						api_version='v2')
-	ACCOUNT = API.get_account()
+def makeapi() -> Any:
+	import alpaca_trade_api as tradeapi
+	alpacaid, alpacakey = alpacakeys()
+	return tradeapi.REST(alpacaid, alpacakey, base_url=ALPACA_URL, api_version='v2')
+
 
 # Google Trends API
-PYTRENDS = TrendReq(hl='en-US', tz=360)
+def makepytrends() -> Any:
+	from pytrends.request import TrendReq # Google Searches
+	return TrendReq(hl='en-US', tz=360)
+
+
+LOGGINGLOCK = threading.Lock()
+LOGGINGSET = False
+
+# Set Up Logging (only the first call does anything)
+def setuplogging():
+	global LOGGINGSET
+	with LOGGINGLOCK:
+		if LOGGINGSET:
+			return
+		LOGGINGSET = True
+		logging.basicConfig(format='%(levelname)-7s: %(asctime)-s | %(message)s',
+							datefmt='%d-%m-%Y %I:%M:%S %p',
+							level=logging.DEBUG,
+							handlers=[])
+		fmt = logging.Formatter('%(levelname)-7s: %(asctime)-s | %(message)s')
+
+		logs = logging.FileHandler('logs.log')
+		logs.setFormatter(fmt)
+		logs.setLevel(logging.INFO)
 
-# Set Up Logging
-logging.basicConfig(format='%(levelname)-7s: %(asctime)-s | %(message)s', 
-					datefmt='%d-%m-%Y %I:%M:%S %p',
-					level=logging.DEBUG,
-					handlers=[])
-fmt = logging.Formatter('%(levelname)-7s: %(asctime)-s | %(message)s')
+		console = logging.StreamHandler()
+		console.setLevel(logging.INFO)
 
-logs = logging.FileHandler('logs.log')
-logs.setFormatter(fmt)
-logs.setLevel(logging.INFO)
+		logging.getLogger('').addHandler(console)
+		logging.getLogger('').addHandler(logs)
 
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
 
-logging.getLogger('').addHandler(console)
-logging.getLogger('').addHandler(logs)
\ No newline at end of file
+CREDS = Lazy(loadcreds) # Dict[str,str]
+API = Lazy(makeapi)
+ACCOUNT = Lazy(lambda: API.get_account())
+PYTRENDS = Lazy(makepytrends)
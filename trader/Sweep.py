@@ -0,0 +1,72 @@
+import sys, os
+import traceback
+import itertools
+import multiprocessing
+import datetime
+import logging
+import pandas as pd
+from typing import *
+from trader.Algorithm import *
+from trader.Setup import *
+from trader.Util import *
+from trader.BarStore import *
+
+
+# Backtests algoclass once for every combination of parameters in grid, each in a separate worker process
+# grid: {attribute name: list of values}. The attributes are set after the algorithm's initialize()
+# schedule: schedule passed to algoclass (uses the algorithm's default if None)
+# universe: stocks that the algorithm trades. Their bars (and the benchmark's) are downloaded to the BarStore
+#           before the workers start, so every worker reads the same stored files (memory-mapped). Bars that a worker
+#           needs outside of that window are downloaded by the worker, under the BarStore's file lock.
+# processes: number of worker processes (defaults to the number of cores)
+# warmup: number of days of bars before start to download for indicators
+# Returns a DataFrame with one row per combination: the parameters, value, sharpe, alpha, beta, volatility and maxdrawdown
+def sweep(algoclass:Type[Algorithm], grid:Dict[str,Sequence[Any]],
+		  start:Union[Date,Sequence[int],str], end:Union[Date,Sequence[int],str],
+		  capital:float=10000.0, benchmark:Union[str,List[str]]='SPY', schedule:Optional[Union[str,List[str]]]=None,
+		  universe:Optional[List[str]]=None, logging:str='day', engine:str='loop',
+		  processes:Optional[int]=None, warmup:int=365) -> pd.DataFrame:
+	start = parsedate(start)
+	end = parsedate(end, datetime.time(23,59))
+	# Download the shared data once
+	stocks = list(universe or []) + ([benchmark] if isinstance(benchmark,str) else list(benchmark))
+	lastday = min(todate(end), getdatetime().date())
+	for stock in stocks:
+		BARSTORE.update(stock, todate(start) - datetime.timedelta(days=warmup), lastday, interval='day')
+		if logging == 'minute':
+			BARSTORE.update(stock, todate(start) - datetime.timedelta(days=7), lastday, interval='minute')
+	# Run the backtests
+	combinations = [dict(zip(grid.keys(), values)) for values in itertools.product(*grid.values())]
+	jobs = [(algoclass, params, start, end, capital, benchmark, schedule, universe, logging, engine) for params in combinations]
+	if 'fork' in multiprocessing.get_all_start_methods():
+		context = multiprocessing.get_context('fork')
+	else:
+		context = multiprocessing.get_context()
+	with context.Pool(processes) as pool:
+		results = pool.map(sweepjob, jobs, chunksize=1)
+	return pd.DataFrame(results, columns=list(grid.keys()) + sweepmetrics)
+
+
+sweepmetrics = ['value', 'sharpe', 'alpha', 'beta', 'volatility', 'maxdrawdown']
+
+
+# Runs one backtest of a sweep (in a worker process)
+def sweepjob(job:Tuple) -> Dict[str,Any]:
+	algoclass, params, start, end, capital, benchmark, schedule, universe, loglevel, engine = job
+	result = dict(params)
+	try:
+		algo = algoclass(schedule) if schedule is not None else algoclass()
+		for name, value in params.items():
+			setattr(algo, name, value)
+		algoback = backtester(algo, capital=capital, benchmark=benchmark)
+		algoback.backtest(start=start, end=end, logging=loglevel, engine=engine, universe=universe)
+		for metric in sweepmetrics:
+			result[metric] = getattr(algoback, metric)
+	except Exception as err:
+		exc_type, exc_obj, exc_tb = sys.exc_info()
+		fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
+		stacktrace = traceback.format_tb(exc_tb)
+		logging.error('%s %s in file %s (params %s):\n%s', exc_type.__name__, err, fname, params, ''.join(stacktrace))
+		for metric in sweepmetrics:
+			result.setdefault(metric, None)
+	return result
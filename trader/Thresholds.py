@@ -0,0 +1,100 @@
+import collections.abc
+import numpy as np
+from typing import *
+
+# Stop and limit orders of an algorithm (stoplosses, stopgains, limitlow, limithigh), kept in one structured array
+# Each stock has a row with a (level, fraction) for each kind of threshold (the level is NaN if it isn't set),
+# so all of the thresholds of all of the stocks are checked against the prices with one comparison.
+
+
+# (name, price that crosses it: 'low' if it is crossed from above, 'high' if it is crossed from below,
+#  True if it only applies to held stocks) in the order that they are checked. Only the first kind that a stock crosses is executed.
+KINDS:List[Tuple[str,str,bool]] = [('stoplosses', 'low', True), ('stopgains', 'high', True), ('limitlow', 'low', False), ('limithigh', 'high', False)]
+
+
+class ThresholdTable(object):
+
+	def __init__(self):
+		self.rows:Dict[str,int] = {} # {stock: row}
+		self.data:np.ndarray = self.allocate(16)
+
+	# Dict-like view ({stock: (level, fraction)}) of one kind of threshold
+	def kind(self, name:str) -> 'Thresholds':
+		return Thresholds(self, [kind[0] for kind in KINDS].index(name))
+
+	def __contains__(self, stock:str) -> bool:
+		return stock in self.rows and bool((~np.isnan(self.data['level'][self.rows[stock]])).any())
+
+	# Finds the thresholds that are crossed by the prices of some stocks (low and high are aligned with stocks)
+	# held: which of the stocks are held (all of them if None)
+	# Returns: list of (stock, kind index) with the first kind that each stock crosses
+	def triggered(self, stocks:Sequence[str], low:Sequence[float], high:Sequence[float],
+					    held:Optional[Sequence[bool]]=None) -> List[Tuple[str,int]]:
+		rows = np.array([self.rows.get(stock, -1) for stock in stocks], dtype=np.int64)
+		known = rows >= 0
+		if not known.any():
+			return []
+		levels = self.data['level'][rows[known]]
+		low = np.asarray(low, dtype=np.float64)[known][:,None]
+		high = np.asarray(high, dtype=np.float64)[known][:,None]
+		fromabove = np.array([side == 'low' for kind, side, holding in KINDS])
+		hit = np.where(fromabove, low <= levels, high >= levels)
+		if held is not None:
+			holding = np.array([holding for kind, side, holding in KINDS])
+			hit &= ~holding | np.asarray(held, dtype=bool)[known][:,None]
+		first = np.argmax(hit, axis=1)
+		names = np.asarray(stocks, dtype=object)[known]
+		return [(names[i], int(first[i])) for i in np.nonzero(hit.any(axis=1))[0]]
+
+
+	### PRIVATE METHODS ###
+
+
+	def allocate(self, size:int) -> np.ndarray:
+		data = np.zeros(size, dtype=[('level', np.float64, len(KINDS)), ('fraction', np.float64, len(KINDS))])
+		data['level'] = np.nan
+		return data
+
+	# Returns the row of a stock (adding one if it doesn't have one)
+	def row(self, stock:str) -> int:
+		if stock not in self.rows:
+			if len(self.rows) == len(self.data):
+				data = self.allocate(2 * len(self.data))
+				data[:len(self.rows)] = self.data
+				self.data = data
+			self.rows[stock] = len(self.rows)
+		return self.rows[stock]
+
+
+
+# {stock: (level, fraction)} of one kind of threshold in a ThresholdTable
+class Thresholds(collections.abc.MutableMapping):
+
+	def __init__(self, table:ThresholdTable, kind:int):
+		self.table = table
+		self.kind = kind
+
+	def __getitem__(self, stock:str) -> Tuple[float,float]:
+		row = self.table.rows.get(stock)
+		if row is None or np.isnan(self.table.data['level'][row, self.kind]):
+			raise KeyError(stock)
+		return (float(self.table.data['level'][row, self.kind]), float(self.table.data['fraction'][row, self.kind]))
+
+	def __setitem__(self, stock:str, threshold:Tuple[float,float]):
+		row = self.table.row(stock)
+		self.table.data['level'][row, self.kind] = threshold[0]
+		self.table.data['fraction'][row, self.kind] = threshold[1]
+
+	def __delitem__(self, stock:str):
+		self[stock] # KeyError if it isn't set
+		self.table.data['level'][self.table.rows[stock], self.kind] = np.nan
+
+	def __iter__(self) -> Iterator[str]:
+		levels = self.table.data['level'][:len(self.table.rows), self.kind]
+		return iter([stock for stock, row in self.table.rows.items() if not np.isnan(levels[row])])
+
+	def __len__(self) -> int:
+		return int((~np.isnan(self.table.data['level'][:len(self.table.rows), self.kind])).sum())
+
+	def __repr__(self) -> str:
+		return repr(dict(self.items()))
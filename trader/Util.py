@@ -1,9 +1,19 @@
 import pickle
 import shelve
 import datetime
+import threading
+import concurrent.futures
+import numpy as np
+import pandas as pd
 from typing import *
 from trader.Setup import *
-from trader.Algorithm import *
+from trader.Clock import *
+from trader.Orders import *
+from trader.Calendar import *
+from trader.Broker import *
+
+# Threads for concurrent BROKER requests (they share the API's pooled connections)
+REQUESTPOOL = concurrent.futures.ThreadPoolExecutor(max_workers=10)
 
 
 def savestate(local={}, path='savestate'):
@@ -42,13 +52,15 @@ def loadstate(path='savestate'):
 	logging.info('Successfully Loaded State')
 	return local
 
+# Returns the current time in US/Eastern (from the Clock that is being used, see setclock)
 def getdatetime() -> datetime.datetime:
-	return datetime.datetime.now(timezone('US/Eastern')).replace(tzinfo=None)
+	return getclock().now()
 
 
-# If start and end are both dates, it returns a list of trading days from the start date to the end date (not including end date)
+# If start and end are both dates, it returns a list of trading days from the start date to the end date (including end date)
 # If start is a date and end is an int, it returns the date that is end days after start
 # If start is an int and end is a date, it returns the date that is start days before end
+# Uses the local trading calendar (CALENDAR), which is only downloaded when it doesn't cover the dates
 def tradingdays(start:Union[Date,Sequence[int],str,int]=getdatetime(), 
 				end:Union[Date,Sequence[int],str,int]=1):
 
@@ -69,24 +81,25 @@ def tradingdays(start:Union[Date,Sequence[int],str,int]=getdatetime(),
 
 	# Range of Dates
 	if isdate(start) and isdate(end):
-		datelist = [day.date.to_pydatetime() for day in API.get_calendar(start = start.strftime("%Y-%m-%d"), end = end.strftime("%Y-%m-%d"))]
-		return datelist
+		return CALENDAR.between(start, end)
 
 	# n Days Before End
 	if isinstance(start,int) and isdate(end):
-		n = start
-		start = end - datetime.timedelta(days=2*n)
-		datelist = API.get_calendar(start = start.strftime("%Y-%m-%d"), end = end.strftime("%Y-%m-%d"))
-		date = datelist[-n-1].date.to_pydatetime()
-		return date
+		return CALENDAR.before(start, end)
 
 	# n Days After Start
 	if isdate(start) and isinstance(end,int):
-		n = end
-		end = start + datetime.timedelta(days=2*n+5)
-		datelist = API.get_calendar(start = start.strftime("%Y-%m-%d"), end = end.strftime("%Y-%m-%d"))
-		date = datelist[n].date.to_pydatetime()
-		return date
+		return CALENDAR.after(start, end)
+
+
+# Converts a date given as a datetime, date, (year,month,day) tuple or "year-month-day" string to a datetime
+# time: time of day used when the date doesn't include one
+def parsedate(date:Union[Date,Sequence[int],str], time:datetime.time=datetime.time(0,0)) -> Date:
+	if isinstance(date, str):
+		date = tuple([int(x) for x in date.split("-")])
+	if isinstance(date,list) or isinstance(date,tuple):
+		date = datetime.datetime.combine(datetime.date(date[0], date[1], date[2]), time)
+	return cast(Date, date)
 
 
 # Determines if variable is a datetime.datetime or datetime.date object
@@ -147,11 +160,42 @@ def dateidxs(arr:Union[pd.DataFrame,pd.Series]):
 		return [pd.to_datetime(item[0]).replace(tzinfo=None).to_pydatetime() for item in arr.iteritems()]
 
 
+# Returns the datetimes associated with the entries of a pandas dataframe as a sorted int64 array
+# (nanoseconds since epoch of the local time, with the timezone removed like in dateidxs)
+def dateidxarray(arr:Union[pd.DataFrame,pd.Series]) -> np.ndarray:
+	index = pd.DatetimeIndex(arr.index)
+	if index.tz is not None:
+		index = index.tz_localize(None)
+	return index.values.astype('datetime64[ns]').view(np.int64)
+
+
+# Converts a date or datetime to the int64 representation used by dateidxarray
+def datetoint(date:Date) -> int:
+	timestamp = pd.Timestamp(date)
+	if timestamp.tzinfo is not None:
+		timestamp = timestamp.tz_localize(None)
+	return timestamp.value
+
+
 # Returns the index of the nearest element in dateidxs that occured before (or at the same time) as time.
+# If dateidx is an array from dateidxarray, it uses a binary search. If lastchecked>=0, it first checks
+# the few entries after lastchecked, so stepping forward through time is O(1).
+# Otherwise:
 # If lastchecked==None: Searches backward from the most recent entries
 # If lastchecked>=0: Searches forward starting at lastchecked
 # If lastchecked<0: Searches backward starting at -lastchecked
-def nearestidx(startdate:Date, dateidx:List[Date], lastchecked:Optional[int]=None):
+def nearestidx(startdate:Date, dateidx:Union[List[Date],np.ndarray], lastchecked:Optional[int]=None):
+	if isinstance(dateidx, np.ndarray):
+		time = datetoint(startdate)
+		if lastchecked is not None and 0 <= lastchecked < len(dateidx) and dateidx[lastchecked] <= time:
+			for index in range(lastchecked, min(lastchecked+8, len(dateidx))):
+				if index+1 == len(dateidx) or dateidx[index+1] > time:
+					return index
+		index = int(np.searchsorted(dateidx, time, side='right')) - 1
+		if index >= 0:
+			return index
+		logging.error("Datetime %s not found in historical data.", startdate)
+		return None
 	if lastchecked is None:
 		for i in range(len(dateidx)):
 			index = len(dateidx) - i - 1
@@ -175,9 +219,9 @@ def nearestidx(startdate:Date, dateidx:List[Date], lastchecked:Optional[int]=Non
 # startdate: datetime in the past
 # currentdateidx: idx of current date in dateidxs (datetime also accepted) (If None given, it will default to the last value)
 # dateidx: list of datetimes (original pandas dataframe also accepted)
-def datetolength(startdate:Date, dateidx:Union[List[Date],pd.DataFrame,pd.Series], currentdateidx:Optional[Union[Date,int]]=None):
+def datetolength(startdate:Date, dateidx:Union[List[Date],np.ndarray,pd.DataFrame,pd.Series], currentdateidx:Optional[Union[Date,int]]=None):
 	if isinstance(dateidx,pd.DataFrame) or isinstance(dateidx,pd.Series):
-		dateidx = dateidxs(dateidx)
+		dateidx = dateidxarray(dateidx)
 	if isdate(currentdateidx):
 		currentdateidx = cast(Date, currentdateidx)
 		currentdateidx = nearestidx(currentdateidx, dateidx)
@@ -207,57 +251,120 @@ def dict2string(dictionary:Dict[Any,Any], spaces:int=0):
 
 # Input: stock symbol as a string, number of shares as an int
 # ordertype: "market", "limit", "stop", "stop_limit"
+# block: wait up to 60 seconds for the order to fill and return its Fill (otherwise, returns the order)
 def buy(stock:str, amount:int, ordertype:str='market', stop:Optional[float]=None, limit:Optional[float]=None, block:bool=True):
-	if BROKER == 'alpaca':
-		order = API.submit_order(stock, amount, side='buy', type=ordertype, time_in_force='day', limit_price=limit, stop_price=stop)
-		if block:
-			starttime = getdatetime()
-			while (order.filled_at is None) and ((getdatetime()-starttime).seconds < 60):
-				order = API.get_order(order.id)
-				time.sleep(0.1)
-		return order
+	FILLS.start()
+	order = getbroker().submit(stock, amount, 'buy', ordertype=ordertype, stop=stop, limit=limit)
+	if block:
+		return FILLS.wait(order.id, timeout=60)
+	return order
 
 
 # Input: stock symbol as a string, number of shares as an int
 # ordertype: "market", "limit", "stop", "stop_limit"
+# block: wait up to 60 seconds for the order to fill and return its Fill (otherwise, returns the order)
 def sell(stock:str, amount:int, ordertype:str='market', stop:Optional[float]=None, limit:Optional[float]=None, block:bool=True):
-	if BROKER == 'alpaca':
-		order = API.submit_order(stock, amount, side='sell', type=ordertype, time_in_force='day', limit_price=limit, stop_price=stop)
-		if block:
-			starttime = datetime.datetime.now()
-			while (order.filled_at is None) and ((datetime.datetime.now()-starttime).seconds < 60):
-				order = API.get_order(order.id)
-				time.sleep(0.1)
-		return order
+	FILLS.start()
+	order = getbroker().submit(stock, amount, 'sell', ordertype=ordertype, stop=stop, limit=limit)
+	if block:
+		return FILLS.wait(order.id, timeout=60)
+	return order
 
 
 # Input: stock symbol as a string
 # Returns: share price as a float
+# Prices are shared through QUOTECACHE, so a price requested in the last QUOTETTL seconds is reused
 def price(stock:str):
-	if BROKER == 'alpaca':
-		for n in range(10):
+	return QUOTECACHE.get(stock)
+
+
+# Input: stock symbol as a string
+# Returns: share price from BROKER as a float (not cached)
+def lastprice(stock:str):
+	return getbroker().lastprice(stock)
+
+
+# Input: list of stock symbols
+# Returns: dict of {symbol: share price as a float}
+# The prices that aren't cached are requested concurrently, so this takes about as long as a single price()
+def quotes(stocks:Iterable[str]) -> Dict[str,float]:
+	return QUOTECACHE.getmany(stocks)
+
+
+# Process-wide cache of prices, shared by every algorithm
+# A price is reused for ttl seconds. If a price is already being requested,
+# other threads asking for the same stock wait for that request instead of sending their own.
+class QuoteCache(object):
+	def __init__(self, ttl:float=QUOTETTL, fetch:Callable[[str],float]=lastprice):
+		self.ttl:float = ttl
+		self.fetch = fetch
+		self.lock = threading.Lock()
+		self.prices:Dict[str,Tuple[float,float]] = {} # {symbol: (price, clock monotonic() when received)}
+		self.requests:Dict[str,concurrent.futures.Future] = {} # {symbol: future of the request in flight}
+
+	# Returns the price of a stock
+	def get(self, stock:str) -> float:
+		with self.lock:
+			cached = self.prices.get(stock)
+			if cached is not None and getclock().monotonic() - cached[1] < self.ttl:
+				return cached[0]
+			request = self.requests.get(stock)
+			sender = request is None
+			if sender:
+				request = concurrent.futures.Future()
+				self.requests[stock] = request
+		if sender:
 			try:
-				cost = float(API.polygon.last_trade(stock).price)
-				return cost
-			except Exception as e:
-				logging.debug(e)
-				if n == 9:
-					raise RuntimeError(e)
-				time.sleep(2**n)
+				cost = self.fetch(stock)
+				with self.lock:
+					self.prices[stock] = (cost, getclock().monotonic())
+				request.set_result(cost)
+			except Exception as err:
+				request.set_exception(err)
+			finally:
+				with self.lock:
+					del self.requests[stock]
+		return request.result()
+
+	# Returns a dict of {symbol: price}, requesting the prices that aren't cached concurrently
+	def getmany(self, stocks:Iterable[str]) -> Dict[str,float]:
+		stocks = list(dict.fromkeys(stocks))
+		prices = {}
+		now = getclock().monotonic()
+		with self.lock:
+			for stock in stocks:
+				cached = self.prices.get(stock)
+				if cached is not None and now - cached[1] < self.ttl:
+					prices[stock] = cached[0]
+		missing = [stock for stock in stocks if stock not in prices]
+		if len(missing) == 1:
+			prices[missing[0]] = self.get(missing[0])
+		elif len(missing) > 1:
+			prices.update(zip(missing, REQUESTPOOL.map(self.get, missing)))
+		return {stock: prices[stock] for stock in stocks}
+
+	# Forgets cached prices (of one stock, or all if stock is None)
+	def clear(self, stock:Optional[str]=None):
+		with self.lock:
+			if stock is None:
+				self.prices.clear()
+			else:
+				self.prices.pop(stock, None)
+
 
+QUOTECACHE = QuoteCache()
 
-# Returns: list of ("symbol",amount)
+
+# Downloads historical bars from BROKER
+# Input: stock symbol as a string, first and last dates (inclusive), interval 'day' or 'minute'
+# Returns: DataFrame with open, high, low, close, volume columns indexed by timestamp
+def bars(stock:str, start:Date, end:Date, interval:str='day'):
+	return getbroker().bars(stock, start, end, interval)
+
+
+# Returns: dict of {"symbol": amount}
 def positions():
-	
-	positions = {}
-	
-	if BROKER == 'alpaca':
-		API._oauth = None
-		poslist = API.list_positions()
-		for pos in poslist:
-			positions[pos.symbol] = int(pos.qty)
-	
-	return positions
+	return getbroker().positions()
 
 
 # Returns dictionary of
@@ -265,13 +372,7 @@ def positions():
 	# "cash": portfolio cash as a float
 	# "daychange": current day's fraction portfolio value change as a float
 def portfoliodata():
-	
-	portfolio = {}
-
-	if BROKER == 'alpaca':
-		portfolio["value"] = float(ACCOUNT.portfolio_value)
-		portfolio["cash"] = float(ACCOUNT.buying_power)
-	
+	portfolio = getbroker().portfoliodata()
 	portfolio["value"] = round(portfolio["value"],2)
 	portfolio["cash"] = round(portfolio["cash"],2)
 	return portfolio